@@ -6,6 +6,7 @@ setup(
     author='Scott Hamilton',
     author_email='mcleopold@gmail.com',
     packages=['skills',
+              'skills.benchmark',
               'skills.trueskill',
               'skills.testsuite',
               'skills.testsuite.trueskill'
@@ -1,17 +1,40 @@
 """Ranking calculators implementing the Elo, Glicko and TrueSkill algorithms."""
 
+import sys
 from math import sqrt
-from collections import Sequence
+from collections import OrderedDict, Sequence
+from contextlib import contextmanager
+from threading import local
 from skills.numerics import Gaussian
 
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
 
 WIN = 0
 DRAW = 1
 LOSE = 2
 
+# Team keeps its players in insertion order, so calculators sum over them
+# in the same order however the Player objects hash
+if sys.version_info >= (3, 7):
+    TeamDict = dict
+else:
+    TeamDict = OrderedDict
+
 
 class Calculator(object):
-    '''Base class for all skill calculator implementations.'''
+    '''
+    Base class for all skill calculator implementations.
+
+    rating_class is the rating type the calculator turns plain rating
+    values (a mean or a tuple) into, the calculator itself holds no state
+    shared with other calculators so instances can be used from any thread.
+    '''
+
+    rating_class = None
 
     def __init__(self, total_teams_allowed, players_per_team_allowed,
                  allow_partial_play=False, allow_partial_update=False):
@@ -26,6 +49,30 @@ class Calculator(object):
     def match_quality(self, game_info, match):
         raise NotImplementedError
 
+    def ensure_ratings(self, match):
+        '''
+        Returns the match with rating values in its teams as rating objects
+
+        Teams built outside a rating_context keep ratings given as values,
+        these are converted by the calculator's rating_class into a copy of
+        the match, so the caller's teams are left as they are.  A match
+        with nothing to convert is returned itself.
+        '''
+        teams = [team.ensure_ratings(self.rating_class) for team in match]
+        if all(team is original for team, original in zip(teams, match)):
+            return match
+        return Match(teams, None if match.rank is None else list(match.rank))
+
+    def rating_context(self):
+        '''
+        Returns a context in which teams convert rating values to this
+        calculator's rating_class as they are built
+
+            with calculator.rating_context():
+                teams = Match([{1: (25.0, 8.3)}, {2: (27.0, 8.3)}], [1, 2])
+        '''
+        return RatingFactory.context(self.rating_class)
+
     def validate_team_and_player_counts(self, match):
         if len(match) not in self.total_teams_allowed:
             raise ValueError("team count is not in {0}"
@@ -35,11 +82,36 @@ class Calculator(object):
             raise ValueError("player count is not in {0}"
                              .format(self.players_per_team_allowed))
 
+    def validate_batch_team_sizes(self, team_sizes):
+        '''
+        Checks the per team player counts of a batch of matches
+
+        Allowed counts are a Range, so only the extremes need checking.
+        '''
+        if len(team_sizes) == 0:
+            return
+        if hasattr(team_sizes, 'min'):
+            smallest, largest = team_sizes.min(), team_sizes.max()
+        else:
+            smallest, largest = min(team_sizes), max(team_sizes)
+        if (smallest not in self.players_per_team_allowed or
+                largest not in self.players_per_team_allowed):
+            raise ValueError("player count is not in {0}"
+                             .format(self.players_per_team_allowed))
+
 
 class Match(list):
-    '''Match is a list of Team objects'''
+    '''
+    Match is a list of Team objects
+
+    team_index maps player ids to their team for the by_id lookups.  It is
+    updated as teams are added and checked against the team's own index, so
+    players added to or removed from a team after it joined the match are
+    still found.
+    '''
 
     def __init__(self, teams=None, rank=None):
+        self.team_index = {}
         if teams is not None:
             for team in teams:
                 self.append(Team.ensure_team(team))
@@ -51,40 +123,155 @@ class Match(list):
         else:
             return "Match(%s)" % str(list(self))
 
+    def __reduce__(self):
+        return (self.__class__, (list(self), self.rank))
+
+    def append(self, team):
+        list.append(self, team)
+        self.index_team(team)
+
+    def extend(self, teams):
+        for team in teams:
+            self.append(team)
+
+    def __iadd__(self, teams):
+        self.extend(teams)
+        return self
+
+    def insert(self, position, team):
+        list.insert(self, position, team)
+        self.reindex()
+
+    def __setitem__(self, key, value):
+        list.__setitem__(self, key, value)
+        self.reindex()
+
+    def __delitem__(self, key):
+        list.__delitem__(self, key)
+        self.reindex()
+
+    def pop(self, *position):
+        team = list.pop(self, *position)
+        self.reindex()
+        return team
+
+    def remove(self, team):
+        list.remove(self, team)
+        self.reindex()
+
+    def index_team(self, team):
+        index = self.team_index
+        for player_id in team.player_ids:
+            if player_id not in index:
+                index[player_id] = team
+
+    def reindex(self):
+        self.team_index = {}
+        for team in self:
+            self.index_team(team)
+
     def add_team(self, team):
         self.append(Team.ensure_team(team))
 
-    def player_by_id(self, player_id):
+    @classmethod
+    def from_arrays(cls, player_ids, means, stdevs, team_offsets, rank=None,
+                    partial_play_percentages=None, rating_class=None):
+        '''
+        Builds a match from trusted arrays without checking or converting
+
+        Team k holds the players from team_offsets[k] up to
+        team_offsets[k + 1], means, stdevs and partial_play_percentages are
+        indexed like player_ids.  The Match, Team, Player and rating objects
+        are the same as the constructors build, with ratings of rating_class
+        (GaussianRating by default, stdevs may be None for a class without
+        one).  Values are used as given, so they must already be floats in
+        range, arrays are turned into lists.  Only GaussianRating skips its
+        constructor, other rating classes are built with
+        rating_class(mean, stdev), or rating_class(mean) without stdevs.
+        '''
+        if rating_class is None:
+            rating_class = GaussianRating
+        fast_rating = rating_class is GaussianRating
+        player_ids = player_ids.tolist() if hasattr(player_ids, 'tolist') else player_ids
+        means = means.tolist() if hasattr(means, 'tolist') else means
+        if stdevs is not None and hasattr(stdevs, 'tolist'):
+            stdevs = stdevs.tolist()
+        if partial_play_percentages is not None and hasattr(partial_play_percentages, 'tolist'):
+            partial_play_percentages = partial_play_percentages.tolist()
+        team_offsets = team_offsets.tolist() if hasattr(team_offsets, 'tolist') else team_offsets
+
+        new_object = object.__new__
+        new_team = dict.__new__ if TeamDict is dict else empty_team
+        set_rating = TeamDict.__setitem__
+        full_play = Player.DEFAULT_PARTIAL_PLAY_PERCENTAGE
+        full_update = Player.DEFAULT_PARTIAL_UPDATE_PERCENTAGE
+
+        match = list.__new__(cls)
+        match.team_index = index = {}
+        match.rank = list(rank) if rank is not None else None
+        for k in range(len(team_offsets) - 1):
+            team = new_team(Team)
+            team.player_ids = team_player_ids = {}
+            for i in range(team_offsets[k], team_offsets[k + 1]):
+                player_id = player_ids[i]
+                player = new_object(Player)
+                player.player_id = player_id
+                player.partial_play_percentage = (full_play if partial_play_percentages is None
+                                                  else partial_play_percentages[i])
+                player.partial_update_percentage = full_update
+                if fast_rating:
+                    rating = new_object(rating_class)
+                    rating.mean = means[i]
+                    rating.stdev = stdevs[i]
+                elif stdevs is None:
+                    rating = rating_class(means[i])
+                else:
+                    rating = rating_class(means[i], stdevs[i])
+                set_rating(team, player, rating)
+                team_player_ids[player_id] = player
+                if player_id not in index:
+                    index[player_id] = team
+            list.append(match, team)
+        return match
+
+    def team_by_id(self, player_id):
+        team = self.team_index.get(player_id)
+        if team is not None and player_id in team.player_ids:
+            return team
         for team in self:
-            for player in team.players():
-                if player.player_id == player_id:
-                    return player
+            if player_id in team.player_ids:
+                self.team_index[player_id] = team
+                return team
+
+    def player_by_id(self, player_id):
+        team = self.team_by_id(player_id)
+        if team is not None:
+            return team.player_ids[player_id]
 
     def rating_by_id(self, player_id):
-        for team in self:
-            for player, rating in team.player_rating():
-                if player.player_id == player_id:
-                    return rating
+        team = self.team_by_id(player_id)
+        if team is not None:
+            return team[team.player_ids[player_id]]
 
     def player_rating_by_id(self, player_id):
-        for team in self:
-            for player, rating in team.player_rating():
-                if player.player_id == player_id:
-                    return player, rating
+        team = self.team_by_id(player_id)
+        if team is not None:
+            player = team.player_ids[player_id]
+            return player, team[player]
 
     def players(self):
         for team in self:
-            for players in team.players():
-                yield players
+            for player in team:
+                yield player
 
     def ratings(self):
         for team in self:
-            for ratings in team.ratings():
-                yield ratings
+            for rating in team.values():
+                yield rating
 
     def player_rating(self):
         for team in self:
-            for player_rating in team.player_rating():
+            for player_rating in team.items():
                 yield player_rating
 
     def sort(self):
@@ -97,9 +284,9 @@ class Match(list):
         rank_sorted, teams_sorted = map(list, zip(*sorted(zip(self.rank, self), key=lambda x: x[0])))
 
         if rank_sorted != self.rank:
-            # in-place update part
+            # in-place update part, the same teams so the index holds
             for i, v in enumerate(teams_sorted):
-                self[i] = v
+                list.__setitem__(self, i, v)
             for i, v in enumerate(rank_sorted):
                 self.rank[i] = v
 
@@ -170,9 +357,13 @@ class Player(object):
             return player
 
 
-class Team(dict):
+class Team(TeamDict):
     '''
     Team maps player objects to rating objects
+
+    player_ids indexes the players by player id and is kept up to date as
+    players are added and removed.  Players are kept in the order they were
+    added.
     '''
 
     def __init__(self, players=None):
@@ -192,6 +383,8 @@ class Team(dict):
             # or 1 list of player, rating tuples
             team = Team([(player1, rating1), (player2, rating2)])
         '''
+        TeamDict.__init__(self)
+        self.player_ids = {}
         if players is not None:
             try:
                 player_rating_tuples = players.items()
@@ -204,33 +397,100 @@ class Team(dict):
             except (TypeError, ValueError):
                 raise TypeError("Improper player dict or list")
 
-    def players(self):
-        return list(self.keys())
+    def __reduce__(self):
+        return (self.__class__, (list(self.items()),))
 
-    def ratings(self):
-        return list(self.values())
-
-    def player_rating(self):
-        return list(self.items())
+    def __repr__(self):
+        return "{%s}" % ", ".join("%r: %r" % item for item in self.items())
+
+    def __setitem__(self, player, rating):
+        TeamDict.__setitem__(self, player, rating)
+        self.player_ids[player.player_id] = player
+
+    def __delitem__(self, player):
+        TeamDict.__delitem__(self, player)
+        self.unindex(player)
+
+    def pop(self, player, *default):
+        if player not in self:
+            return TeamDict.pop(self, player, *default)
+        rating = TeamDict.pop(self, player)
+        self.unindex(player)
+        return rating
+
+    def popitem(self):
+        player, rating = TeamDict.popitem(self)
+        self.unindex(player)
+        return player, rating
+
+    def clear(self):
+        TeamDict.clear(self)
+        self.player_ids.clear()
+
+    def update(self, *players, **kwargs):
+        for player, rating in dict(*players, **kwargs).items():
+            self[player] = rating
+
+    def setdefault(self, player, rating=None):
+        if player not in self:
+            self[player] = rating
+        return TeamDict.__getitem__(self, player)
+
+    def unindex(self, player):
+        player_id = player.player_id
+        if self.player_ids.get(player_id) is player:
+            del self.player_ids[player_id]
+            for other in self:
+                if other.player_id == player_id:
+                    self.player_ids[player_id] = other
+                    break
+
+    # views of the players and ratings, which Python 2 dicts only have as
+    # viewkeys, viewvalues and viewitems
+    if hasattr(TeamDict, 'viewkeys'):
+        def players(self):
+            return self.viewkeys()
+
+        def ratings(self):
+            return self.viewvalues()
+
+        def player_rating(self):
+            return self.viewitems()
+    else:
+        def players(self):
+            return self.keys()
+
+        def ratings(self):
+            return self.values()
+
+        def player_rating(self):
+            return self.items()
 
     def add_player(self, player, rating):
         self[Player.ensure_player(player)] = RatingFactory.ensure_rating(rating)
         return self
 
+    def ensure_ratings(self, rating_class):
+        '''
+        Returns the team with ratings given as values converted to
+        rating_class, a new team if any needed converting
+        '''
+        if all(hasattr(rating, 'mean') for rating in self.values()):
+            return self
+        return Team([(player, rating_class.ensure_rating(rating)) for player, rating in self.items()])
+
     def player_by_id(self, player_id):
-        for player in self.keys():
-            if player.player_id == player_id:
-                return player
+        return self.player_ids.get(player_id)
 
     def rating_by_id(self, player_id):
-        for player, rating in self.items():
-            if player.player_id == player_id:
-                return rating
+        player = self.player_ids.get(player_id)
+        if player is not None:
+            return self[player]
 
     def player_rating_by_id(self, player_id):
-        for player, rating in self.items():
-            if player.player_id == player_id:
-                return player, rating
+        player = self.player_ids.get(player_id)
+        if player is not None:
+            return player, self[player]
 
     @staticmethod
     def ensure_team(team):
@@ -249,6 +509,15 @@ class Team(dict):
         return frozenset(self.items()) < frozenset(other.items())
 
 
+def empty_team(cls):
+    '''
+    Returns an empty team of cls without running Team.__init__
+    '''
+    team = TeamDict.__new__(cls)
+    TeamDict.__init__(team)
+    return team
+
+
 class Rating(object):
     '''
     Rating contains just a value
@@ -279,19 +548,57 @@ class Rating(object):
 
 class RatingFactory(object):
     '''
-    Factory to generation the correct rating type depending on the calculator
-    
-    Creating an instance of a calculator will set this automatically
+    Factory to generate the rating type of the current context
+
+    The rating class is set for a thread or async task with
+    RatingFactory.context(rating_class), or Calculator.rating_context.
+    Outside of a context rating_class is used, it defaults to None and
+    ratings given as values are then kept as they are for the calculator to
+    convert, while RatingFactory(...) builds a plain Rating.
     '''
 
-    rating_class = Rating
+    rating_class = None
+
+    if ContextVar is not None:
+        current_class = ContextVar('rating_class', default=None)
+    else:
+        current_class = local()
 
-    def __new__(self):
-        return RatingFactory.rating_class()
+    def __new__(self, *args, **kwargs):
+        rating_class = RatingFactory.current()
+        return (Rating if rating_class is None else rating_class)(*args, **kwargs)
+
+    @staticmethod
+    def current():
+        if ContextVar is not None:
+            rating_class = RatingFactory.current_class.get()
+        else:
+            rating_class = getattr(RatingFactory.current_class, 'rating_class', None)
+        return RatingFactory.rating_class if rating_class is None else rating_class
+
+    @staticmethod
+    @contextmanager
+    def context(rating_class):
+        if ContextVar is not None:
+            token = RatingFactory.current_class.set(rating_class)
+            try:
+                yield rating_class
+            finally:
+                RatingFactory.current_class.reset(token)
+        else:
+            previous = getattr(RatingFactory.current_class, 'rating_class', None)
+            RatingFactory.current_class.rating_class = rating_class
+            try:
+                yield rating_class
+            finally:
+                RatingFactory.current_class.rating_class = previous
 
     @staticmethod
     def ensure_rating(rating):
-        return RatingFactory.rating_class.ensure_rating(rating)
+        rating_class = RatingFactory.current()
+        if rating_class is None:
+            return rating
+        return rating_class.ensure_rating(rating)
 
 
 class GaussianRating(Rating):
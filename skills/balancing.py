@@ -0,0 +1,230 @@
+'''
+Balancing a pool of players into two teams by TrueSkill match quality
+'''
+
+from __future__ import division
+from bisect import bisect_left
+from itertools import combinations
+from math import exp, sqrt
+
+from skills import GaussianRating, Match, Team
+from skills.numerics import numpy
+from skills.trueskill import TrueSkillGameInfo
+
+
+# pools up to this size are split exactly, larger ones heuristically
+EXACT_LIMIT = 32
+
+
+def two_team_quality(mean_difference, variance_sum, total_players, beta_squared):
+    '''
+    Match quality of two teams as in TwoTeamTrueSkillCalculator.match_quality
+
+    mean_difference is the difference of the team mean sums and
+    variance_sum the sum of every player's variance.
+    '''
+    denominator = total_players * beta_squared + variance_sum
+    return (sqrt(total_players * beta_squared / denominator) *
+            exp(-1.0 * mean_difference ** 2.0 / (2.0 * denominator)))
+
+
+def subset_sums(means):
+    '''
+    Returns the sums and sizes of every subset of means, indexed by the
+    subset's bit mask, as arrays with NumPy and lists otherwise
+    '''
+    if numpy is not None:
+        sums = numpy.zeros(1)
+        sizes = numpy.zeros(1, dtype=numpy.intp)
+        for mean in means:
+            sums = numpy.concatenate((sums, sums + mean))
+            sizes = numpy.concatenate((sizes, sizes + 1))
+        return sums, sizes
+
+    sums = [0.0]
+    sizes = [0]
+    for mean in means:
+        sums.extend([subset_sum + mean for subset_sum in sums])
+        sizes.extend([size + 1 for size in sizes])
+    return sums, sizes
+
+
+def masks_by_size(sizes, total_sizes, sort_key=None):
+    '''
+    Groups subset masks by subset size, sorting each group by sort_key
+    '''
+    if numpy is not None:
+        groups = [numpy.flatnonzero(sizes == size) for size in range(total_sizes)]
+        if sort_key is not None:
+            groups = [group[numpy.argsort(sort_key[group], kind='stable')] for group in groups]
+        return groups
+
+    groups = [[] for size in range(total_sizes)]
+    for mask, size in enumerate(sizes):
+        groups[size].append(mask)
+    if sort_key is not None:
+        for group in groups:
+            group.sort(key=sort_key.__getitem__)
+    return groups
+
+
+def closest_pair(left_sums, right_sums, target):
+    '''
+    Returns (distance, left index, right index) of the left and right sums
+    whose total is closest to target, right_sums being sorted
+    '''
+    if numpy is not None:
+        wanted = target - left_sums
+        positions = numpy.searchsorted(right_sums, wanted)
+        below = numpy.clip(positions - 1, 0, len(right_sums) - 1)
+        above = numpy.clip(positions, 0, len(right_sums) - 1)
+        below_distance = numpy.abs(wanted - right_sums[below])
+        above_distance = numpy.abs(wanted - right_sums[above])
+        right = numpy.where(below_distance <= above_distance, below, above)
+        distances = numpy.minimum(below_distance, above_distance)
+        left = int(numpy.argmin(distances))
+        return float(distances[left]), left, int(right[left])
+
+    best = (float('inf'), 0, 0)
+    last = len(right_sums) - 1
+    for left, left_sum in enumerate(left_sums):
+        wanted = target - left_sum
+        position = bisect_left(right_sums, wanted)
+        for right in (position - 1, position):
+            if 0 <= right <= last:
+                distance = abs(wanted - right_sums[right])
+                if distance < best[0]:
+                    best = (distance, left, right)
+                    if distance == 0.0:
+                        return best
+    return best
+
+
+def exact_split(means, team_size, target=None):
+    '''
+    Meet in the middle search for the team of team_size with the sum closest
+    to target, half the total by default, returns the bit mask of the team
+
+    The subset sums of both halves of the pool are grouped by size and
+    sorted, so for every left subset the best right subset of the remaining
+    size is found by binary search.
+    '''
+    total_players = len(means)
+    if target is None:
+        target = sum(means) / 2.0
+        if 2 * team_size == total_players:
+            # fixing the first player in the team skips the mirrored splits
+            return exact_split(means[1:], team_size - 1, target - means[0]) << 1 | 1
+    half = total_players // 2
+    left_sums, left_sizes = subset_sums(means[:half])
+    right_sums, right_sizes = subset_sums(means[half:])
+    left_groups = masks_by_size(left_sizes, half + 1, left_sums)
+    right_groups = masks_by_size(right_sizes, total_players - half + 1, right_sums)
+
+    best = None
+    for left_size in range(max(0, team_size - (total_players - half)), min(team_size, half) + 1):
+        left_masks = left_groups[left_size]
+        right_masks = right_groups[team_size - left_size]
+        if numpy is not None:
+            distance, left, right = closest_pair(left_sums[left_masks], right_sums[right_masks], target)
+        else:
+            distance, left, right = closest_pair([left_sums[mask] for mask in left_masks],
+                                                 [right_sums[mask] for mask in right_masks], target)
+        if best is None or distance < best[0]:
+            best = (distance, int(left_masks[left]) | (int(right_masks[right]) << half))
+            if distance == 0.0:
+                break
+    return best[1]
+
+
+def greedy_split(means, team_size):
+    '''
+    Largest first to the team with the lower sum, then improving swaps,
+    returns the bit mask of the first team
+    '''
+    players = range(len(means))
+    first, second = [], []
+    sums = [0.0, 0.0]
+    for i in sorted(players, key=lambda i: -means[i]):
+        if len(first) == team_size:
+            side = 1
+        elif len(second) == len(means) - team_size:
+            side = 0
+        else:
+            side = 0 if sums[0] <= sums[1] else 1
+        (first, second)[side].append(i)
+        sums[side] += means[i]
+
+    improved = True
+    while improved:
+        improved = False
+        difference = sums[0] - sums[1]
+        for a in range(len(first)):
+            for b in range(len(second)):
+                change = 2.0 * (means[second[b]] - means[first[a]])
+                if abs(difference + change) < abs(difference) - 1e-12:
+                    sums[0] += change / 2.0
+                    sums[1] -= change / 2.0
+                    first[a], second[b] = second[b], first[a]
+                    improved = True
+                    break
+            if improved:
+                break
+    mask = 0
+    for i in first:
+        mask |= 1 << i
+    return mask
+
+
+def balanced_split(means, team_size=None, exact_limit=EXACT_LIMIT):
+    '''
+    Splits players into a team of team_size (half by default) and the rest
+    with the closest mean sums, which for a fixed pool gives the best two
+    team match quality.  Returns the player indexes of both teams.
+
+    Pools of up to exact_limit players are split exactly by a meet in the
+    middle search over the subset sums of both halves of the pool, larger
+    ones by a greedy split improved by swaps.
+    '''
+    total_players = len(means)
+    if team_size is None:
+        team_size = total_players // 2
+    if not 0 < team_size < total_players:
+        raise ValueError("team_size must leave players in both teams")
+    means = [float(mean) for mean in means]
+
+    if total_players <= 12:
+        total = sum(means)
+        best = None
+        for team in combinations(range(total_players), team_size):
+            difference = abs(total - 2.0 * sum(means[i] for i in team))
+            if best is None or difference < best[0]:
+                best = (difference, team)
+        first = set(best[1])
+        return ([i for i in range(total_players) if i in first],
+                [i for i in range(total_players) if i not in first])
+
+    if total_players <= exact_limit:
+        mask = exact_split(means, team_size)
+    else:
+        mask = greedy_split(means, team_size)
+    return ([i for i in range(total_players) if mask >> i & 1],
+            [i for i in range(total_players) if not mask >> i & 1])
+
+
+def balance_teams(players, team_size=None, game_info=None, exact_limit=EXACT_LIMIT):
+    '''
+    Splits a pool of players into the two teams with the best match quality
+
+    players maps players to ratings like a Team, ratings given as values
+    are converted to GaussianRating.  Returns the match quality and a Match
+    of the two teams.
+    '''
+    game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+    pool = list(Team.ensure_team(players).ensure_ratings(GaussianRating).items())
+    first, second = balanced_split([rating.mean for player, rating in pool], team_size, exact_limit)
+    difference = (sum(pool[i][1].mean for i in first) -
+                  sum(pool[i][1].mean for i in second))
+    quality = two_team_quality(difference, sum(rating.stdev ** 2.0 for player, rating in pool),
+                               len(pool), game_info.beta ** 2.0)
+    return quality, Match([Team([pool[i] for i in first]), Team([pool[i] for i in second])])
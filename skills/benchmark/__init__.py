@@ -0,0 +1,279 @@
+'''
+Benchmarks of the calculators over common match shapes
+
+Every case times new_ratings or match_quality of one calculator on one
+match shape, call by call, and reports the throughput, latency percentiles
+and the memory allocated by a call.  Results are plain dictionaries with a
+stable key, calculator/shape/operation/numpy or pure, so runs saved as JSON
+can be compared with compare.
+
+Run all cases with and without NumPy with
+
+    python -m skills.benchmark --output results.json
+'''
+
+from __future__ import division
+import gc
+import json
+import platform
+import random
+import sys
+import time
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from skills import (
+    GaussianRating,
+    Match,
+    Player,
+    Team,
+    )
+from skills.elo import EloCalculator, EloGameInfo, EloRating
+from skills.glicko import GlickoCalculator, GlickoGameInfo, GlickoRating
+from skills.numerics import numpy
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    TwoPlayerTrueSkillCalculator,
+    TwoTeamTrueSkillCalculator,
+    )
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    clock = time.time
+
+
+# name: (teams, players per team, partial play percentage of every other player)
+SHAPES = OrderedDict([
+    ('1v1', (2, 1, 1.0)),
+    ('5v5', (2, 5, 1.0)),
+    ('ffa8', (8, 1, 1.0)),
+    ('16x4', (16, 4, 1.0)),
+    ('partial', (2, 4, 0.5)),
+    ])
+
+OPERATIONS = ['new_ratings', 'match_quality']
+
+DEFAULT_ITERATIONS = 1000
+DEFAULT_WARMUP = 50
+DEFAULT_SEED = 1
+MATCH_POOL_SIZE = 100
+
+
+def elo_rating(generator):
+    return EloRating(generator.gauss(1500.0, 200.0))
+
+
+def glicko_rating(generator):
+    return GlickoRating(generator.gauss(1500.0, 200.0), generator.uniform(30.0, 350.0))
+
+
+def trueskill_rating(generator):
+    return GaussianRating(generator.gauss(25.0, 5.0), generator.uniform(1.0, 25.0 / 3))
+
+
+def rate_period(calculator, match, game_info):
+    return calculator.new_ratings([match], 1, game_info)
+
+
+# name: (calculator factory, game info factory, rating factory, new_ratings call)
+CALCULATORS = OrderedDict([
+    ('Elo', (EloCalculator, EloGameInfo, elo_rating, None)),
+    ('Glicko', (GlickoCalculator, GlickoGameInfo, glicko_rating, rate_period)),
+    ('TwoPlayer', (TwoPlayerTrueSkillCalculator, TrueSkillGameInfo, trueskill_rating, None)),
+    ('TwoTeam', (TwoTeamTrueSkillCalculator, TrueSkillGameInfo, trueskill_rating, None)),
+    ('FactorGraph', (FactorGraphTrueSkillCalculator, TrueSkillGameInfo, trueskill_rating, None)),
+    ('FactorGraphArrays', (lambda: FactorGraphTrueSkillCalculator(FactorGraphTrueSkillCalculator.ARRAY_BACKEND),
+                           TrueSkillGameInfo, trueskill_rating, None)),
+    ])
+
+
+def supports(calculator, shape):
+    teams, players, partial_play = SHAPES[shape]
+    return (teams in calculator.total_teams_allowed and
+            players in calculator.players_per_team_allowed and
+            (partial_play == 1.0 or calculator.allow_partial_play))
+
+
+def create_matches(shape, rating, generator, count=MATCH_POOL_SIZE):
+    teams, players, partial_play = SHAPES[shape]
+    matches = []
+    for m in range(count):
+        rank = list(range(1, teams + 1))
+        generator.shuffle(rank)
+        match = Match(rank=rank)
+        for t in range(teams):
+            match.append(Team([(Player(t * players + p, partial_play if p % 2 else 1.0), rating(generator))
+                               for p in range(players)]))
+        matches.append(match)
+    return matches
+
+
+def percentile(ordered, fraction):
+    '''
+    Returns the value at fraction of the sorted values, interpolating
+    '''
+    if not ordered:
+        return float('nan')
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def time_calls(call, matches, iterations):
+    latencies = []
+    total = len(matches)
+    for i in range(iterations):
+        match = matches[i % total]
+        start = clock()
+        call(match)
+        latencies.append(clock() - start)
+    return latencies
+
+
+def measure_allocations(call, matches, iterations):
+    '''
+    Returns the peak and retained bytes per call as seen by tracemalloc
+    '''
+    if tracemalloc is None:
+        return None
+    total = len(matches)
+    results = []
+    for i in range(iterations):
+        match = matches[i % total]
+        # starting afresh for every call counts only the call's memory
+        tracemalloc.start()
+        try:
+            result = call(match)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results.append((peak, current))
+        del result
+    return {'peak_bytes': sum(peak for peak, retained in results) / len(results),
+            'retained_bytes': sum(retained for peak, retained in results) / len(results)}
+
+
+def case_key(calculator_name, shape, operation, with_numpy):
+    return '/'.join([calculator_name, shape, operation, 'numpy' if with_numpy else 'pure'])
+
+
+def run_case(calculator_name, shape, operation, iterations=DEFAULT_ITERATIONS,
+             warmup=DEFAULT_WARMUP, seed=DEFAULT_SEED, allocation_iterations=None):
+    '''
+    Benchmarks one calculator, shape and operation, returns a result
+    dictionary or None when the calculator does not support the shape
+    '''
+    create_calculator, create_game_info, rating, rate = CALCULATORS[calculator_name]
+    calculator = create_calculator()
+    if not supports(calculator, shape):
+        return None
+    game_info = create_game_info()
+    with calculator.rating_context():
+        matches = create_matches(shape, rating, random.Random(seed))
+
+    if operation == 'new_ratings':
+        if rate is None:
+            call = lambda match: calculator.new_ratings(match, game_info)
+        else:
+            call = lambda match: rate(calculator, match, game_info)
+    else:
+        call = lambda match: calculator.match_quality(match, game_info)
+
+    time_calls(call, matches, warmup)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        latencies = time_calls(call, matches, iterations)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    allocations = measure_allocations(call, matches,
+                                      allocation_iterations or min(iterations, MATCH_POOL_SIZE))
+
+    latencies.sort()
+    total_time = sum(latencies)
+    return {'key': case_key(calculator_name, shape, operation, numpy is not None),
+            'calculator': calculator_name,
+            'shape': shape,
+            'operation': operation,
+            'numpy': numpy is not None,
+            'iterations': iterations,
+            'throughput': iterations / total_time if total_time > 0 else float('inf'),
+            'latency_us': {'mean': 1e6 * total_time / iterations,
+                           'min': 1e6 * latencies[0],
+                           'p50': 1e6 * percentile(latencies, 0.50),
+                           'p90': 1e6 * percentile(latencies, 0.90),
+                           'p99': 1e6 * percentile(latencies, 0.99),
+                           'max': 1e6 * latencies[-1]},
+            'allocations': allocations}
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'numpy': numpy.__version__ if numpy is not None else None}
+
+
+def run(calculators=None, shapes=None, operations=None, iterations=DEFAULT_ITERATIONS,
+        warmup=DEFAULT_WARMUP, seed=DEFAULT_SEED, progress=None):
+    '''
+    Runs every supported case of the calculators, shapes and operations with
+    the NumPy setting of this process, returns the results in case order
+    '''
+    results = []
+    for calculator_name in calculators or CALCULATORS:
+        for shape in shapes or SHAPES:
+            for operation in operations or OPERATIONS:
+                result = run_case(calculator_name, shape, operation, iterations, warmup, seed)
+                if result is not None:
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+    return results
+
+
+def report(results, environments):
+    return {'format': 1,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'environments': environments,
+            'results': sorted(results, key=lambda result: result['key'])}
+
+
+def dump(data, output):
+    json.dump(data, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+def compare(baseline, current):
+    '''
+    Compares two reports, returns (key, baseline throughput, current
+    throughput, ratio) for every case in both, ratio above 1 being faster
+    '''
+    baseline_results = dict((result['key'], result) for result in baseline['results'])
+    comparison = []
+    for result in current['results']:
+        previous = baseline_results.get(result['key'])
+        if previous is not None:
+            comparison.append((result['key'], previous['throughput'], result['throughput'],
+                               result['throughput'] / previous['throughput']))
+    return comparison
+
+
+def format_result(result):
+    return "%-44s %12.1f/s  p50 %9.1fus  p99 %9.1fus" % (
+        result['key'], result['throughput'],
+        result['latency_us']['p50'], result['latency_us']['p99'])
+
+
+def write_progress(result):
+    sys.stderr.write(format_result(result) + '\n')
+    sys.stderr.flush()
@@ -0,0 +1,96 @@
+'''
+Command line entry point, see python -m skills.benchmark --help
+'''
+
+import argparse
+import json
+import subprocess
+import sys
+
+from skills import benchmark
+
+
+# runs the benchmarks in a child process where numpy cannot be imported
+PURE_PYTHON = ("import sys, runpy; sys.modules['numpy'] = None; sys.argv[0] = 'skills.benchmark'; "
+               "runpy.run_module('skills.benchmark', run_name='__main__', alter_sys=True)")
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(prog='python -m skills.benchmark',
+                                     description='Benchmarks new_ratings and match_quality of the calculators')
+    parser.add_argument('--calculator', action='append', choices=list(benchmark.CALCULATORS),
+                        help='calculator to run, may be repeated, defaults to all')
+    parser.add_argument('--shape', action='append', choices=list(benchmark.SHAPES),
+                        help='match shape to run, may be repeated, defaults to all')
+    parser.add_argument('--operation', action='append', choices=benchmark.OPERATIONS,
+                        help='operation to time, may be repeated, defaults to both')
+    parser.add_argument('--numpy', choices=['on', 'off', 'both'], default='both',
+                        help='run with NumPy, without it or both (default)')
+    parser.add_argument('--iterations', type=int, default=benchmark.DEFAULT_ITERATIONS,
+                        help='timed calls per case')
+    parser.add_argument('--warmup', type=int, default=benchmark.DEFAULT_WARMUP,
+                        help='untimed calls per case before timing')
+    parser.add_argument('--seed', type=int, default=benchmark.DEFAULT_SEED,
+                        help='seed of the generated ratings')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare throughput with')
+    parser.add_argument('--quiet', action='store_true', help='do not print results as they finish')
+    return parser.parse_args(arguments)
+
+
+def child_arguments(options):
+    arguments = ['--numpy', 'off', '--iterations', str(options.iterations),
+                 '--warmup', str(options.warmup), '--seed', str(options.seed), '--quiet']
+    for name in ('calculator', 'shape', 'operation'):
+        for value in getattr(options, name) or []:
+            arguments.extend(['--' + name, value])
+    return arguments
+
+
+def run_pure_python(options):
+    output = subprocess.check_output([sys.executable, '-c', PURE_PYTHON] + child_arguments(options))
+    return json.loads(output.decode('utf-8'))
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    progress = None if options.quiet else benchmark.write_progress
+
+    results = []
+    environments = []
+    if options.numpy in ('on', 'both') and benchmark.numpy is not None:
+        environments.append(benchmark.environment())
+        results.extend(benchmark.run(options.calculator, options.shape, options.operation,
+                                     options.iterations, options.warmup, options.seed, progress))
+    if options.numpy == 'off' and benchmark.numpy is None:
+        environments.append(benchmark.environment())
+        results.extend(benchmark.run(options.calculator, options.shape, options.operation,
+                                     options.iterations, options.warmup, options.seed, progress))
+    elif options.numpy in ('off', 'both'):
+        pure = run_pure_python(options)
+        environments.extend(pure['environments'])
+        results.extend(pure['results'])
+        if progress is not None:
+            for result in pure['results']:
+                progress(result)
+    if not environments:
+        sys.stderr.write("NumPy is not installed\n")
+        return 1
+
+    data = benchmark.report(results, environments)
+    if options.output:
+        with open(options.output, 'w') as output:
+            benchmark.dump(data, output)
+    else:
+        benchmark.dump(data, sys.stdout)
+
+    if options.compare:
+        with open(options.compare) as baseline:
+            comparison = benchmark.compare(json.load(baseline), data)
+        for key, previous, current, ratio in comparison:
+            sys.stderr.write("%-44s %12.1f/s -> %12.1f/s  x%.2f\n" % (key, previous, current, ratio))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,22 @@
 from collections import Sequence
+from itertools import repeat
 
 from skills import (
     Calculator,
     Match,
     Team,
     Rating,
-    RatingFactory,
     WIN,
     LOSE,
     DRAW,
     )
 
-from skills.numerics import Range
+from skills.numerics import (
+    Range,
+    float_array,
+    index_array,
+    numpy,
+    )
 
 class EloGameInfo(object):
     '''Parameters about the game used for calculating new skills'''
@@ -93,20 +98,22 @@ class EloCalculator(Calculator):
              LOSE: 0.0,
              DRAW: 0.5}
 
+    rating_class = EloRating
+
     def __init__(self, k_factor=DEFAULT_K_FACTOR):
         Calculator.__init__(self, Range.exactly(2), Range.exactly(1))
         self.k_factor = k_factor
-        RatingFactory.rating_class = EloRating
 
     def new_ratings(self, teams, game_info=None):
         game_info = EloGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         # ensure sorted by rank
         teams.sort()
 
-        winner, winner_rating = teams[0].player_rating()[0]
-        loser, loser_rating = teams[1].player_rating()[0]
+        winner, winner_rating = next(iter(teams[0].items()))
+        loser, loser_rating = next(iter(teams[1].items()))
 
         return Match([Team({winner: self.new_rating(winner_rating,
                                                     loser_rating,
@@ -130,6 +137,104 @@ class EloCalculator(Calculator):
                 new_rating = self_rating.rating_floor
         return EloRating(new_rating, k)
 
+    def new_ratings_batch(self, ratings, player_a, player_b, outcome,
+                          k_factor=None, game_info=None, deltas=False,
+                          vectorize=False):
+        '''
+        Replays many one-on-one games in order over a dense rating array
+
+        ratings holds the mean of every player indexed by player number,
+        player_a and player_b hold the player numbers of each game and
+        outcome holds WIN, DRAW or LOSE from player_a's point of view, a
+        player cannot play themselves.  k_factor may be an array with one value per game, a single value or
+        None to use the calculator's k_factor.
+
+        Returns the final ratings array, or a (ratings, deltas) tuple when
+        deltas is True, deltas being player_a's rating change for each game.
+        player_b's change is the negation.
+
+        With vectorize=True and NumPy available, the games are grouped into
+        waves in which no player appears twice and each wave is updated at
+        once.  Every player's games keep their order so the result is the
+        same as the sequential replay.
+        '''
+        game_info = EloGameInfo.ensure_game_info(game_info)
+        if not (len(player_a) == len(player_b) == len(outcome)):
+            raise ValueError("player_a, player_b and outcome must have the same length")
+        if k_factor is None:
+            k_factor = self.k_factor
+        if vectorize and numpy is not None:
+            return self.new_ratings_waves(ratings, player_a, player_b, outcome,
+                                          k_factor, game_info, deltas)
+
+        scale = 1.0 / (2.0 * game_info.beta)
+        scores = [EloCalculator.score[WIN], EloCalculator.score[DRAW], EloCalculator.score[LOSE]]
+        k_factors = k_factor if hasattr(k_factor, '__len__') else repeat(float(k_factor))
+        values = list(ratings)
+        game_deltas = []
+
+        for a, b, result, k in zip(player_a, player_b, outcome, k_factors):
+            if a == b:
+                raise ValueError("player %s cannot play against themselves" % a)
+            rating_a = values[a]
+            rating_b = values[b]
+            expected = 1.0 / (1.0 + 10.0 ** ((rating_b - rating_a) * scale))
+            delta = k * (scores[result] - expected)
+            values[a] = rating_a + delta
+            values[b] = rating_b - delta
+            if deltas:
+                game_deltas.append(delta)
+
+        if deltas:
+            return float_array(values), float_array(game_deltas)
+        return float_array(values)
+
+    def new_ratings_waves(self, ratings, player_a, player_b, outcome,
+                          k_factor, game_info, deltas):
+        '''
+        NumPy implementation of new_ratings_batch over player disjoint waves
+        '''
+        player_a = index_array(player_a)
+        player_b = index_array(player_b)
+        outcome = index_array(outcome)
+        values = numpy.array(ratings, dtype=float)
+        total_games = len(player_a)
+        same = numpy.flatnonzero(player_a == player_b)
+        if len(same):
+            raise ValueError("player %s cannot play against themselves" % player_a[same[0]])
+
+        # a game goes in the wave after the latest wave of either player
+        last_wave = [-1] * len(values)
+        waves = numpy.empty(total_games, dtype=numpy.intp)
+        for i, (a, b) in enumerate(zip(player_a.tolist(), player_b.tolist())):
+            wave = max(last_wave[a], last_wave[b]) + 1
+            last_wave[a] = last_wave[b] = wave
+            waves[i] = wave
+
+        order = numpy.argsort(waves, kind='stable')
+        boundaries = numpy.searchsorted(waves[order], numpy.arange(waves.max() + 2 if total_games else 1))
+
+        scale = 1.0 / (2.0 * game_info.beta)
+        scores = numpy.array([EloCalculator.score[WIN], EloCalculator.score[DRAW], EloCalculator.score[LOSE]])
+        k_factors = numpy.broadcast_to(numpy.asarray(k_factor, dtype=float), (total_games,))
+        game_deltas = numpy.zeros(total_games)
+
+        for start, end in zip(boundaries[:-1], boundaries[1:]):
+            games = order[start:end]
+            a = player_a[games]
+            b = player_b[games]
+            rating_a = values[a]
+            rating_b = values[b]
+            expected = 1.0 / (1.0 + 10.0 ** ((rating_b - rating_a) * scale))
+            delta = k_factors[games] * (scores[outcome[games]] - expected)
+            values[a] = rating_a + delta
+            values[b] = rating_b - delta
+            game_deltas[games] = delta
+
+        if deltas:
+            return values, game_deltas
+        return values
+
     def expected_score(self, self_rating, opponent_rating, game_info):
         return (1.0 /
                 (1.0 + 10.0 ** ((opponent_rating - self_rating) /
@@ -138,13 +243,14 @@ class EloCalculator(Calculator):
     def match_quality(self, teams, game_info=None):
         game_info = EloGameInfo.ensure_game_info(game_info)        
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         teams.sort()
 
         # The TrueSkill paper mentions that they used s1 - s2 (rating difference) to
         # determine match quality. Moser converts that to a percentage as a delta from 50%
         # using the cumulative density function of the specific curve being used
-        expected_score = self.expected_score(teams[0].ratings()[0].mean,
-                                             teams[1].ratings()[0].mean,
+        expected_score = self.expected_score(next(iter(teams[0].values())).mean,
+                                             next(iter(teams[1].values())).mean,
                                              game_info)
         return (0.5 - abs(expected_score - 0.5)) / 0.5
@@ -1,10 +1,64 @@
-class Factor(object):
+from copy import copy
 
-    def __init__(self, name):
+
+# names of graph objects are formatted when first used unless eager names are on
+EAGER_NAMES = False
+
+
+def set_eager_names(enabled=True):
+    '''
+    Formats every factor, variable, message and schedule name as the graph
+    is built instead of when the name is first used, for debugging
+    '''
+    global EAGER_NAMES
+    EAGER_NAMES = enabled
+
+
+class Named(object):
+    '''
+    Graph object with a lazily formatted name
+
+    The name is given as a format string (or a function) and its arguments
+    and is only formatted the first time it is used, so building a graph
+    does no string work unless eager names are on.
+    '''
+
+    def set_name(self, name_format, *name_args):
+        if name_args and not EAGER_NAMES:
+            self._name = None
+            self._name_format = name_format
+            self._name_args = name_args
+        else:
+            self.name = Named.format_name(name_format, name_args)
+
+    @staticmethod
+    def format_name(name_format, name_args):
+        if not name_args:
+            return name_format
+        if callable(name_format):
+            return name_format(*name_args)
+        return name_format % name_args
+
+    @property
+    def name(self):
+        if self._name is None and self._name_args is not None:
+            self._name = Named.format_name(self._name_format, self._name_args)
+            self._name_format = self._name_args = None
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+        self._name_format = self._name_args = None
+
+
+class Factor(Named):
+
+    def __init__(self, name, *name_args):
         self.messages = []
         self.variables = []
 
-        self.name = name
+        self.set_name(name, *name_args)
         self.message_to_variable_binding = {}
 
     def __str__(self):
@@ -39,6 +93,12 @@ class Factor(object):
         except IndexError:
             raise IndexError("message_index is an invalid index")
 
+    def reset_messages(self):
+        for message in self.messages:
+            message.reset()
+        for variable in self.variables:
+            variable.reset_to_prior()
+
     def create_variable_to_message_binding_with_message(self, variable, message):
         self.messages.append(message)
         self.variables.append(variable)
@@ -63,8 +123,8 @@ class FactorGraphLayer(object):
     def local_factors(self):
         return self._local_factors
 
-    def schedule_sequence(self, items_to_sequence, name):
-        return ScheduleSequence(name, items_to_sequence)
+    def schedule_sequence(self, items_to_sequence, name, *name_args):
+        return ScheduleSequence(name, items_to_sequence, *name_args)
 
     def add_layer_factor(self, factor):
         self._local_factors.append(factor)
@@ -100,20 +160,25 @@ class FactorList(list):
         return sum_log_z + sum_log_s
 
 
-class Message(object):
+class Message(Named):
 
-    def __init__(self, value=None, name=None):
-        self.name = name
+    def __init__(self, value=None, name=None, *name_args):
+        self.set_name(name, *name_args)
         self.value = value
+        self.initial_value = copy(value)
+
+    def reset(self):
+        # factors update message values in place, never hand out the initial value
+        self.value = copy(self.initial_value)
 
     def __str__(self):
         return self.name
 
 
-class Schedule(object):
+class Schedule(Named):
 
-    def __init__(self, name):
-        self.name = name
+    def __init__(self, name, *name_args):
+        self.set_name(name, *name_args)
 
     def __str__(self):
         return self.name
@@ -121,11 +186,14 @@ class Schedule(object):
     def visit(self, depth= -1, max_depth=0):
         raise NotImplementedError
 
+    def compile(self, operations):
+        raise NotImplementedError
+
 
 class ScheduleStep(Schedule):
 
-    def __init__(self, name, factor, index):
-        Schedule.__init__(self, name)
+    def __init__(self, name, factor, index, *name_args):
+        Schedule.__init__(self, name, *name_args)
         self.factor = factor
         self.index = index
 
@@ -133,11 +201,14 @@ class ScheduleStep(Schedule):
         delta = self.factor.update_message_index(self.index)
         return delta
 
+    def compile(self, operations):
+        operations.append((CompiledSchedule.STEP, self.factor.update_message_index, self.index))
+
 
 class ScheduleSequence(Schedule):
 
-    def __init__(self, name, schedules):
-        Schedule.__init__(self, name)
+    def __init__(self, name, schedules, *name_args):
+        Schedule.__init__(self, name, *name_args)
         self.schedules = schedules
 
     def visit(self, depth= -1, max_depth=0):
@@ -147,11 +218,15 @@ class ScheduleSequence(Schedule):
             max_delta = max(current_visit, max_delta)
         return max_delta
 
+    def compile(self, operations):
+        for schedule in self.schedules:
+            schedule.compile(operations)
+
 
 class ScheduleLoop(Schedule):
 
-    def __init__(self, name, schedule_to_loop, max_delta):
-        Schedule.__init__(self, name)
+    def __init__(self, name, schedule_to_loop, max_delta, *name_args):
+        Schedule.__init__(self, name, *name_args)
         self.schedule_to_loop = schedule_to_loop
         self.max_delta = max_delta
 
@@ -163,19 +238,88 @@ class ScheduleLoop(Schedule):
             total_iterations += 1
         return delta
 
+    def compile(self, operations):
+        loop_start = len(operations)
+        operations.append((CompiledSchedule.LOOP_START,))
+        self.schedule_to_loop.compile(operations)
+        operations.append((CompiledSchedule.LOOP_END, loop_start, self.max_delta))
 
-class Variable(object):
 
-    def __init__(self, name, prior):
-        self.name = "Variable[%s]" % name
+class CompiledSchedule(object):
+    '''
+    Schedule tree lowered into a flat list of operations
+
+    Steps are stored with the bound update method of their factor, loops
+    are a LOOP_START marker and a LOOP_END that jumps back while the largest
+    delta of the loop body is above the loop's max_delta.  Running gives the
+    same updates and result as visiting the schedule tree.
+    '''
+
+    STEP = 0
+    LOOP_START = 1
+    LOOP_END = 2
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.operations = []
+        schedule.compile(self.operations)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def name(self):
+        return self.schedule.name
+
+    def run(self):
+        operations = self.operations
+        total_operations = len(operations)
+        STEP = CompiledSchedule.STEP
+        LOOP_START = CompiledSchedule.LOOP_START
+
+        # largest delta of every open loop body, the outermost being the whole schedule
+        max_deltas = [0.0]
+        position = 0
+        while position < total_operations:
+            operation = operations[position]
+            kind = operation[0]
+            if kind == STEP:
+                delta = operation[1](operation[2])
+                if delta > max_deltas[-1]:
+                    max_deltas[-1] = delta
+            elif kind == LOOP_START:
+                max_deltas.append(0.0)
+            else:
+                delta = max_deltas[-1]
+                if delta > operation[2]:
+                    max_deltas[-1] = 0.0
+                    position = operation[1] + 1
+                    continue
+                max_deltas.pop()
+                if delta > max_deltas[-1]:
+                    max_deltas[-1] = delta
+            position += 1
+
+        return max_deltas[0]
+
+
+class Variable(Named):
+
+    def __init__(self, name, prior, *name_args):
+        self.set_name(Variable.create_name, name, name_args)
         self.prior = prior
         self.reset_to_prior()
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def create_name(name, name_args):
+        return "Variable[%s]" % Named.format_name(name, name_args)
+
     def reset_to_prior(self):
-        self.value = self.prior
+        # factors update marginals in place, never hand out the prior itself
+        self.value = copy(self.prior)
 
 
 class DefaultVariable(Variable):
@@ -192,8 +336,8 @@ class DefaultVariable(Variable):
 
 class KeyedVariable(Variable):
 
-    def __init__(self, key, name, prior):
-        Variable.__init__(self, name, prior)
+    def __init__(self, key, name, prior, *name_args):
+        Variable.__init__(self, name, prior, *name_args)
         self.key = key
 
 
@@ -202,8 +346,8 @@ class VariableFactory(object):
     def __init__(self, variable_prior_initializer):
         self.variable_prior_initializer = variable_prior_initializer
 
-    def create_basic_variable(self, name):
-        return Variable(name, self.variable_prior_initializer())
+    def create_basic_variable(self, name, *name_args):
+        return Variable(name, self.variable_prior_initializer(), *name_args)
 
-    def create_keyed_variable(self, key, name):
-        return KeyedVariable(key, name, self.variable_prior_initializer())
+    def create_keyed_variable(self, key, name, *name_args):
+        return KeyedVariable(key, name, self.variable_prior_initializer(), *name_args)
@@ -1,18 +1,23 @@
-from collections import Sequence, defaultdict
-from math import sqrt, log, pi
+from array import array
+from collections import Sequence
+from math import sqrt, log, pi, exp
 
 from skills import (
     GaussianRating,
     Calculator,
     Match,
-    RatingFactory,
     Team,
     WIN,
     LOSE,
     DRAW,
     )
 
-from skills.numerics import Range
+from skills.numerics import (
+    Range,
+    float_array,
+    index_array,
+    numpy,
+    )
 
 
 class GlickoGameInfo(object):
@@ -20,6 +25,7 @@ class GlickoGameInfo(object):
 
     DEFAULT_INITIAL_MEAN = 1500.0
     DEFAULT_BETA = 200.0
+    DEFAULT_INITIAL_STANDARD_DEVIATION = 350.0
 
     def __init__(self, initial_mean=DEFAULT_INITIAL_MEAN,
                        beta=DEFAULT_BETA):
@@ -31,7 +37,7 @@ class GlickoGameInfo(object):
             raise ValueError("GlickoGameInfo arguments must be numeric")
 
     def default_rating(self):
-        return GlickoRating(self.initial_mean)
+        return GlickoRating(self.initial_mean, GlickoGameInfo.DEFAULT_INITIAL_STANDARD_DEVIATION)
 
     @staticmethod
     def ensure_game_info(game_info):
@@ -96,87 +102,197 @@ class GlickoCalculator(Calculator):
              LOSE: 0.0,
              DRAW: 0.5}
 
+    rating_class = GlickoRating
+
     def __init__(self, c_factor=None):
         Calculator.__init__(self, Range .exactly(2), Range.exactly(1))
         self.c_factor = c_factor
-        RatingFactory.rating_class = GlickoRating
 
     def new_ratings(self, matches, rating_period=None, game_info=None):
         game_info = GlickoGameInfo.ensure_game_info(game_info)
-        # get unique list of players and ensure ratings are consistant
+        players, ratings, player_a, player_b, outcome = self.rating_period_arrays(
+            matches, rating_period, self.c_factor is not None)
+
+        new_means, new_stdevs = self.new_ratings_batch(
+            [rating.mean for rating in ratings],
+            [rating.stdev for rating in ratings],
+            player_a, player_b, outcome,
+            [rating.last_rating_period for rating in ratings],
+            rating_period, game_info)
+
+        new_ratings = Match()
+        for player, index in players.items():
+            new_ratings.append(Team({player: GlickoRating(float(new_means[index]),
+                                                          float(new_stdevs[index]),
+                                                          rating_period)}))
+
+        return new_ratings
+
+    def rating_period_arrays(self, matches, rating_period, check_rating_period):
+        '''
+        Lays out the matches of a rating period as player and game arrays
+
+        Returns a dictionary of player to player number, the ratings indexed
+        by player number and the player_a, player_b and outcome game columns.
+        '''
+        # get unique list of players and ensure ratings are consistant,
+        # comparing the ratings as given and converting each player's once
         players = {}
-        opponents = defaultdict(list)
-        player_RD = {}
+        given = []
+        ratings = []
+        player_a = []
+        player_b = []
+        outcome = []
 
-        # Step 1: calculate r and RD for onset of rating period
-        # also cache values of g(RDj) and E(s|r, rj, RDj) for each player
         for match in matches:
             # ensure winning team is team 0
             match.sort()
             for player, rating in match.player_rating():
                 if player in players:
-                    if rating != players[player]:
-                        raise ValueError("Inconsistant ratings: player %s has rating %s and rating %s" % (player, rating, players[player]))
+                    if rating != given[players[player]]:
+                        raise ValueError("Inconsistant ratings: player %s has rating %s and rating %s" % (player, rating, given[players[player]]))
                 else:
-                    # calc new RD from old RD
-                    if (self.c_factor is None or
-                            rating.last_rating_period is None or
-                            rating_period is None):
-                        player_RD[player] = rating.stdev
-                    else:
-                        t = rating_period - rating.last_rating_period
-                        if t <= 0:
-                            raise ValueError("Player %s has a last_rating_period equal to the current rating_period" % (player))
-                        player_RD[player] = min(game_info.beta, sqrt(rating.stdev ** 2 + self.c_factor * t))
-                    players[player] = rating
-
-            # create opponent lists of players and outcomes
-            player1 = match[0].players()[0]
-            player2 = match[1].players()[0]
-            opponents[player1].append((player2, GlickoCalculator.score[match.comparison(0, 1)]))
-            opponents[player2].append((player1, GlickoCalculator.score[match.comparison(1, 0)]))
-
-
-        # Step 2: carry out the update calculations for each player separately
+                    given.append(rating)
+                    rating = self.rating_class.ensure_rating(rating)
+                    if (check_rating_period and
+                            rating.last_rating_period is not None and
+                            rating_period is not None and
+                            rating_period - rating.last_rating_period <= 0):
+                        raise ValueError("Player %s has a last_rating_period equal to the current rating_period" % (player))
+                    players[player] = len(ratings)
+                    ratings.append(rating)
+
+            player_a.append(players[next(iter(match[0]))])
+            player_b.append(players[next(iter(match[1]))])
+            outcome.append(match.comparison(0, 1))
+
+        return players, ratings, player_a, player_b, outcome
+
+    def new_ratings_batch(self, means, stdevs, player_a, player_b, outcome,
+                          last_rating_periods=None, rating_period=None,
+                          game_info=None):
+        '''
+        Updates the ratings of every player for one rating period at once
+
+        means, stdevs and last_rating_periods hold the ratings of every player
+        indexed by player number (last_rating_periods entries may be None).
+        player_a, player_b and outcome describe each game with WIN, DRAW or
+        LOSE from player_a's point of view.
+
+        Returns (new_means, new_stdevs) arrays.  Players without a game keep
+        their mean and get the rating deviation for the onset of the period.
+        '''
+        game_info = GlickoGameInfo.ensure_game_info(game_info)
+
+        # Step 1: calculate RD for onset of rating period
+        deviations = self.onset_deviations(stdevs, last_rating_periods, rating_period, game_info)
+
+        # Step 2: carry out the update calculations for each player
+        d2_sums, rating_sums, played = self.game_sums(means, deviations, player_a, player_b, outcome)
         q = log(10.0) / 400.0
-        def g(RD):
-            return 1.0 / sqrt(1.0 + 3.0 * q ** 2.0 * (RD ** 2.0) / pi ** 2.0)
 
-        def E(r, rj, RDj):
-            return 1.0 / (1.0 + pow(10.0, -g(RDj) * (r - rj) / 400.0))
+        if numpy is not None:
+            means = float_array(means)
+            deviations = float_array(deviations)
+            RD2_d2 = 1.0 / deviations ** 2.0 + q ** 2.0 * d2_sums
+            new_means = numpy.where(played, means + q / RD2_d2 * rating_sums, means)
+            new_stdevs = numpy.where(played, numpy.sqrt(1.0 / RD2_d2), deviations)
+            return new_means, new_stdevs
+
+        new_means = array('d')
+        new_stdevs = array('d')
+        for mean, deviation, d2_sum, rating_sum, has_played in zip(means, deviations, d2_sums, rating_sums, played):
+            if has_played:
+                # cache value, this form used twice in the paper
+                RD2_d2 = 1.0 / deviation ** 2.0 + q ** 2.0 * d2_sum
+                new_means.append(mean + q / RD2_d2 * rating_sum)
+                new_stdevs.append(sqrt(1.0 / RD2_d2))
+            else:
+                new_means.append(mean)
+                new_stdevs.append(deviation)
+        return new_means, new_stdevs
 
-        def d2(g_RD, E_sr_r_RD):
-            return pow(q ** 2.0 * sum(
-                g_RD[j] ** 2.0 * E_sr_r_RD[j] * (1.0 - E_sr_r_RD[j])
-                for j in range(len(g_RD))
-            ), -1.0)
+    def game_sums(self, means, deviations, player_a, player_b, outcome):
+        '''
+        Sums the contribution of every game to both of its players
 
-        new_ratings = Match()
-        for player, rating in players.items():
-            # cache values of g(RDj) and E(s|r, r, RDj) for each opponent
-            opponent_g_RD = []
-            opponent_E_sr_r_RD = []
-            opponent_s = []
-            for opponent, score in opponents[player]:
-                opponent_g_RD.append(g(player_RD[opponent]))
-                opponent_E_sr_r_RD.append(E(rating.mean, players[opponent].mean, player_RD[opponent]))
-                opponent_s.append(score)
-
-            # cache value, this form used twice in the paper 
-            RD2_d2 = (1.0 / player_RD[player] ** 2.0 +
-                      1.0 / d2(opponent_g_RD, opponent_E_sr_r_RD))
-
-            # new rating value
-            r_new = (rating.mean + q / RD2_d2 * sum(
-                opponent_g_RD[j] * (opponent_s[j] - opponent_E_sr_r_RD[j])
-                for j in range(len(opponent_s))
-            ))
-            # new rating deviation value
-            RD_new = sqrt(pow(RD2_d2, -1))
-
-            new_ratings.append(Team({player: GlickoRating(r_new, RD_new, rating_period)}))
+        Each game adds g(RDj)^2 E (1 - E) to the d^2 sum and g(RDj) (s - E)
+        to the rating change sum of both players.  Returns the d2_sums,
+        rating_sums and played arrays indexed by player number.
+        '''
+        if not (len(player_a) == len(player_b) == len(outcome)):
+            raise ValueError("player_a, player_b and outcome must have the same length")
 
-        return new_ratings
+        q = log(10.0) / 400.0
+        g_factor = 3.0 * q ** 2.0 / pi ** 2.0
+        total_players = len(means)
+
+        if numpy is not None:
+            means = float_array(means)
+            deviations = float_array(deviations)
+            player_a = index_array(player_a)
+            player_b = index_array(player_b)
+            scores = numpy.array([GlickoCalculator.score[WIN],
+                                  GlickoCalculator.score[DRAW],
+                                  GlickoCalculator.score[LOSE]])[index_array(outcome)]
+            g_RD = 1.0 / numpy.sqrt(1.0 + g_factor * deviations ** 2.0)
+
+            source = numpy.concatenate((player_a, player_b))
+            opponent = numpy.concatenate((player_b, player_a))
+            source_scores = numpy.concatenate((scores, 1.0 - scores))
+
+            opponent_g_RD = g_RD[opponent]
+            E_sr_r_RD = 1.0 / (1.0 + 10.0 ** (-opponent_g_RD * (means[source] - means[opponent]) / 400.0))
+
+            d2_sums = numpy.bincount(source, opponent_g_RD ** 2.0 * E_sr_r_RD * (1.0 - E_sr_r_RD), total_players)
+            rating_sums = numpy.bincount(source, opponent_g_RD * (source_scores - E_sr_r_RD), total_players)
+            played = numpy.bincount(source, minlength=total_players) > 0
+            return d2_sums, rating_sums, played
+
+        means = list(means)
+        g_RD = [1.0 / sqrt(1.0 + g_factor * deviation ** 2.0) for deviation in deviations]
+        scores = [GlickoCalculator.score[WIN], GlickoCalculator.score[DRAW], GlickoCalculator.score[LOSE]]
+        d2_sums = [0.0] * total_players
+        rating_sums = [0.0] * total_players
+        played = [False] * total_players
+
+        for a, b, result in zip(player_a, player_b, outcome):
+            score = scores[result]
+            mean_difference = means[a] - means[b]
+
+            g_b = g_RD[b]
+            E_a = 1.0 / (1.0 + 10.0 ** (-g_b * mean_difference / 400.0))
+            d2_sums[a] += g_b ** 2.0 * E_a * (1.0 - E_a)
+            rating_sums[a] += g_b * (score - E_a)
+
+            g_a = g_RD[a]
+            E_b = 1.0 / (1.0 + 10.0 ** (g_a * mean_difference / 400.0))
+            d2_sums[b] += g_a ** 2.0 * E_b * (1.0 - E_b)
+            rating_sums[b] += g_a * ((1.0 - score) - E_b)
+
+            played[a] = played[b] = True
+
+        return d2_sums, rating_sums, played
+
+    def onset_deviations(self, stdevs, last_rating_periods, rating_period, game_info):
+        '''
+        Calculates the rating deviation of every player at the onset of the rating period
+        '''
+        if (self.c_factor is None or
+                last_rating_periods is None or
+                rating_period is None):
+            return stdevs
+
+        deviations = []
+        for player, (stdev, last_rating_period) in enumerate(zip(stdevs, last_rating_periods)):
+            if last_rating_period is None:
+                deviations.append(stdev)
+            else:
+                t = rating_period - last_rating_period
+                if t <= 0:
+                    raise ValueError("Player %s has a last_rating_period equal to the current rating_period" % (player))
+                deviations.append(min(game_info.beta, sqrt(stdev ** 2 + self.c_factor * t)))
+        return deviations
 
     def expected_score(self, self_rating, opponent_rating, game_info):
         return (1.0 /
@@ -186,13 +302,305 @@ class GlickoCalculator(Calculator):
     def match_quality(self, teams, game_info=None):
         game_info = GlickoGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         teams.sort()
 
         # The TrueSkill paper mentions that they used s1 - s2 (rating difference) to
         # determine match quality. Moser converts that to a percentage as a delta from 50%
         # using the cumulative density function of the specific curve being used
-        expected_score = self.expected_score(teams[0].ratings()[0].mean,
-                                             teams[1].ratings()[0].mean,
+        expected_score = self.expected_score(next(iter(teams[0].values())).mean,
+                                             next(iter(teams[1].values())).mean,
                                              game_info)
         return (0.5 - abs(expected_score - 0.5)) / 0.5
+
+
+class Glicko2GameInfo(GlickoGameInfo):
+    '''Parameters about the game used for calculating new Glicko-2 skills'''
+
+    DEFAULT_INITIAL_STANDARD_DEVIATION = 350.0
+    DEFAULT_INITIAL_VOLATILITY = 0.06
+    DEFAULT_TAU = 0.5
+    DEFAULT_CONVERGENCE_TOLERANCE = 0.000001
+
+    def __init__(self, initial_mean=GlickoGameInfo.DEFAULT_INITIAL_MEAN,
+                       beta=GlickoGameInfo.DEFAULT_BETA,
+                       initial_stdev=DEFAULT_INITIAL_STANDARD_DEVIATION,
+                       initial_volatility=DEFAULT_INITIAL_VOLATILITY,
+                       tau=DEFAULT_TAU,
+                       convergence_tolerance=DEFAULT_CONVERGENCE_TOLERANCE):
+        GlickoGameInfo.__init__(self, initial_mean, beta)
+        try:
+            self.initial_stdev = float(initial_stdev)
+            self.initial_volatility = float(initial_volatility)
+            self.tau = float(tau)
+            self.convergence_tolerance = float(convergence_tolerance)
+        except ValueError:
+            raise ValueError("Glicko2GameInfo arguments must be numeric")
+
+    def default_rating(self):
+        return Glicko2Rating(self.initial_mean, self.initial_stdev, volatility=self.initial_volatility)
+
+    @staticmethod
+    def ensure_game_info(game_info):
+        if game_info is None:
+            return Glicko2GameInfo()
+        elif (not hasattr(game_info, 'initial_mean') or
+                not hasattr(game_info, 'beta') or
+                not hasattr(game_info, 'initial_stdev') or
+                not hasattr(game_info, 'initial_volatility') or
+                not hasattr(game_info, 'tau') or
+                not hasattr(game_info, 'convergence_tolerance')):
+            if isinstance(game_info, Sequence):
+                try:
+                    return Glicko2GameInfo(*game_info)
+                except TypeError:
+                    raise TypeError("game_info must be a sequence of length 0 to 6 or a Glicko2GameInfo object")
+            else:
+                try:
+                    return Glicko2GameInfo(game_info)
+                except TypeError:
+                    raise TypeError("game_info was passed the wrong number of arguments")
+        else:
+            return game_info
+
+
+class Glicko2Rating(GlickoRating):
+    '''Rating that includes a mean, standard deviation, last update period and volatility'''
+
+    def __init__(self, mean, stdev, last_rating_period=None,
+                 volatility=Glicko2GameInfo.DEFAULT_INITIAL_VOLATILITY):
+        GlickoRating.__init__(self, mean, stdev, last_rating_period)
+        try:
+            self.volatility = float(volatility)
+        except ValueError:
+            raise ValueError("Glicko2Rating volatility value must be numeric")
+
+    def __repr__(self):
+        return "Glicko2Rating(%s, %s, %s, %s)" % (self.mean, self.stdev, self.last_rating_period, self.volatility)
+
+    def __str__(self):
+        return "mean=%.4f, stdev=%.4f, last_rating_period=%s, volatility=%.6f" % (self.mean, self.stdev, self.last_rating_period, self.volatility)
+
+    @staticmethod
+    def ensure_rating(rating):
+        if (not hasattr(rating, 'mean') or
+                not hasattr(rating, 'stdev') or
+                not hasattr(rating, 'volatility') or
+                not hasattr(rating, 'last_rating_period')):
+            if isinstance(rating, Sequence):
+                try:
+                    return Glicko2Rating(*rating)
+                except TypeError:
+                    raise TypeError("Glicko2Rating must be a sequence of length 2 to 4 or a Glicko2Rating object")
+            else:
+                try:
+                    return Glicko2Rating(rating)
+                except TypeError:
+                    raise TypeError("Glicko2Rating was passed the wrong number of arguments")
+        else:
+            return rating
+
+
+class Glicko2Calculator(GlickoCalculator):
+    '''
+    Implements Glicko-2 calculator
+
+    See http://www.glicko.net/glicko/glicko2.pdf for details
+
+    Ratings stay on the Glicko scale, the Glicko-2 scale conversion of
+    mu = (r - 1500) / 173.7178 and phi = RD / 173.7178 makes g(phi) and
+    E(mu, muj, phij) identical to the Glicko g(RD) and E(r, rj, RDj), so the
+    per game sums of GlickoCalculator.game_sums are reused as they are.
+    '''
+
+    SCALE = 400.0 / log(10.0)
+
+    rating_class = Glicko2Rating
+
+    def __init__(self):
+        Calculator.__init__(self, Range.exactly(2), Range.exactly(1))
+        self.c_factor = None
+
+    def new_ratings(self, matches, rating_period=None, game_info=None):
+        game_info = Glicko2GameInfo.ensure_game_info(game_info)
+        players, ratings, player_a, player_b, outcome = self.rating_period_arrays(
+            matches, rating_period, True)
+
+        new_means, new_stdevs, new_volatilities = self.new_ratings_batch(
+            [rating.mean for rating in ratings],
+            [rating.stdev for rating in ratings],
+            [rating.volatility for rating in ratings],
+            player_a, player_b, outcome,
+            [rating.last_rating_period for rating in ratings],
+            rating_period, game_info)
+
+        new_ratings = Match()
+        for player, index in players.items():
+            new_ratings.append(Team({player: Glicko2Rating(float(new_means[index]),
+                                                           float(new_stdevs[index]),
+                                                           rating_period,
+                                                           float(new_volatilities[index]))}))
+
+        return new_ratings
+
+    def new_ratings_batch(self, means, stdevs, volatilities, player_a, player_b, outcome,
+                          last_rating_periods=None, rating_period=None,
+                          game_info=None):
+        '''
+        Updates the ratings of every player for one rating period at once
+
+        means, stdevs, volatilities and last_rating_periods hold the ratings
+        of every player indexed by player number (last_rating_periods entries
+        may be None).  player_a, player_b and outcome describe each game with
+        WIN, DRAW or LOSE from player_a's point of view.  A player last rated
+        t periods ago has the deviation of the t - 1 periods without games
+        added before the update.
+
+        Returns (new_means, new_stdevs, new_volatilities) arrays.  Players
+        without a game keep their mean and volatility and only see their
+        deviation grow.
+        '''
+        game_info = Glicko2GameInfo.ensure_game_info(game_info)
+
+        # Step 2: convert deviations to the Glicko-2 scale
+        phi_squared = []
+        for player, (stdev, volatility) in enumerate(zip(stdevs, volatilities)):
+            phi2 = (stdev / Glicko2Calculator.SCALE) ** 2.0
+            if (last_rating_periods is not None and
+                    rating_period is not None and
+                    last_rating_periods[player] is not None):
+                t = rating_period - last_rating_periods[player]
+                if t <= 0:
+                    raise ValueError("Player %s has a last_rating_period equal to the current rating_period" % (player))
+                phi2 += (t - 1) * volatility ** 2.0
+            phi_squared.append(phi2)
+
+        # Steps 3 and 4: estimated variance v and improvement delta
+        d2_sums, rating_sums, played = self.game_sums(
+            means, [sqrt(phi2) * Glicko2Calculator.SCALE for phi2 in phi_squared],
+            player_a, player_b, outcome)
+
+        if numpy is not None:
+            means = float_array(means)
+            volatilities = float_array(volatilities)
+            phi_squared = float_array(phi_squared)
+            # players without a game are given a neutral v, their results are replaced below
+            v = 1.0 / numpy.where(played, d2_sums, 1.0)
+            delta = v * rating_sums
+
+            # Step 5: new volatility
+            new_volatilities = volatilities.copy()
+            players = numpy.flatnonzero(played)
+            new_volatilities[players] = self.volatility_batch(delta[players], phi_squared[players],
+                                                              v[players], volatilities[players],
+                                                              game_info)
+
+            # Steps 6 and 7: new deviation and mean
+            new_phi_squared = 1.0 / (1.0 / (phi_squared + new_volatilities ** 2.0) + 1.0 / v)
+            new_means = numpy.where(played,
+                                    means + Glicko2Calculator.SCALE * new_phi_squared * rating_sums,
+                                    means)
+            new_stdevs = Glicko2Calculator.SCALE * numpy.sqrt(
+                numpy.where(played, new_phi_squared, phi_squared + volatilities ** 2.0))
+            return new_means, new_stdevs, new_volatilities
+
+        new_means = array('d')
+        new_stdevs = array('d')
+        new_volatilities = array('d')
+        for mean, phi2, volatility, d2_sum, rating_sum, has_played in zip(
+                means, phi_squared, volatilities, d2_sums, rating_sums, played):
+            if has_played:
+                v = 1.0 / d2_sum
+                delta = v * rating_sum
+                new_volatility = self.volatility(delta, phi2, v, volatility, game_info)
+                new_phi2 = 1.0 / (1.0 / (phi2 + new_volatility ** 2.0) + 1.0 / v)
+                new_means.append(mean + Glicko2Calculator.SCALE * new_phi2 * rating_sum)
+                new_stdevs.append(Glicko2Calculator.SCALE * sqrt(new_phi2))
+                new_volatilities.append(new_volatility)
+            else:
+                new_means.append(mean)
+                new_stdevs.append(Glicko2Calculator.SCALE * sqrt(phi2 + volatility ** 2.0))
+                new_volatilities.append(volatility)
+        return new_means, new_stdevs, new_volatilities
+
+    def volatility(self, delta, phi_squared, v, volatility, game_info):
+        '''
+        Finds the new volatility with the Illinois algorithm (step 5 of the paper)
+        '''
+        tau_squared = game_info.tau ** 2.0
+        a = log(volatility ** 2.0)
+        delta_squared = delta ** 2.0
+
+        def f(x):
+            exp_x = exp(x)
+            return (exp_x * (delta_squared - phi_squared - v - exp_x) /
+                    (2.0 * (phi_squared + v + exp_x) ** 2.0) - (x - a) / tau_squared)
+
+        A = a
+        if delta_squared > phi_squared + v:
+            B = log(delta_squared - phi_squared - v)
+        else:
+            k = 1
+            while f(a - k * game_info.tau) < 0.0:
+                k += 1
+            B = a - k * game_info.tau
+
+        f_A = f(A)
+        f_B = f(B)
+        while abs(B - A) > game_info.convergence_tolerance:
+            C = A + (A - B) * f_A / (f_B - f_A)
+            f_C = f(C)
+            if f_C * f_B <= 0.0:
+                A = B
+                f_A = f_B
+            else:
+                f_A = f_A / 2.0
+            B = C
+            f_B = f_C
+
+        return exp(A / 2.0)
+
+    def volatility_batch(self, delta, phi_squared, v, volatility, game_info):
+        '''
+        NumPy version of volatility running the Illinois iterations of every
+        player in lockstep, players drop out as they converge
+        '''
+        tau = game_info.tau
+        tau_squared = tau ** 2.0
+        a = numpy.log(volatility ** 2.0)
+        delta_squared = delta ** 2.0
+        phi_v = phi_squared + v
+
+        def f(x, players):
+            exp_x = numpy.exp(x)
+            return (exp_x * (delta_squared[players] - phi_v[players] - exp_x) /
+                    (2.0 * (phi_v[players] + exp_x) ** 2.0) - (x - a[players]) / tau_squared)
+
+        everyone = numpy.arange(len(a))
+        A = a.copy()
+        large_delta = delta_squared > phi_v
+        B = numpy.where(large_delta, numpy.log(numpy.where(large_delta, delta_squared - phi_v, 1.0)), a - tau)
+
+        # bracket the root for the players with a small improvement
+        players = everyone[~large_delta]
+        players = players[f(B[players], players) < 0.0]
+        while len(players):
+            B[players] -= tau
+            players = players[f(B[players], players) < 0.0]
+
+        f_A = f(A, everyone)
+        f_B = f(B, everyone)
+        players = everyone[numpy.abs(B - A) > game_info.convergence_tolerance]
+        while len(players):
+            A_p, B_p, f_A_p, f_B_p = A[players], B[players], f_A[players], f_B[players]
+            C = A_p + (A_p - B_p) * f_A_p / (f_B_p - f_A_p)
+            f_C = f(C, players)
+            swap = f_C * f_B_p <= 0.0
+            A[players] = numpy.where(swap, B_p, A_p)
+            f_A[players] = numpy.where(swap, f_B_p, f_A_p / 2.0)
+            B[players] = C
+            f_B[players] = f_C
+            players = players[numpy.abs(C - A[players]) > game_info.convergence_tolerance]
+
+        return numpy.exp(A / 2.0)
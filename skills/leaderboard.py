@@ -0,0 +1,311 @@
+'''
+Leaderboards kept ordered as ratings change
+'''
+
+from __future__ import division
+from bisect import bisect_left, insort
+from collections import namedtuple
+from itertools import count, islice
+from math import isnan
+
+from skills.trueskill import TrueSkillGameInfo
+
+
+Standing = namedtuple('Standing', ['rank', 'player_id', 'score'])
+
+
+class RankIndex(object):
+    '''
+    Sorted keys with positional access, an order statistics index
+
+    Keys are kept in sorted blocks of load to 2 * load keys like the leaves
+    of a B-tree, with the last key of every block for the search and a
+    Fenwick tree of the block sizes for positions.  Finding the rank of a
+    key or the key at a position takes a binary search of the blocks, one
+    of a block and a walk of the tree, all O(log n).  Inserting or removing
+    moves at most 2 * load keys within a block, splitting and merging blocks
+    rebuilds the tree, which happens once every load changes at most.
+    '''
+
+    DEFAULT_LOAD = 256
+
+    def __init__(self, keys=(), load=DEFAULT_LOAD):
+        self.load = max(int(load), 2)
+        self.blocks = []
+        self.maxes = []
+        self.tree = []
+        self.size = 0
+        keys = sorted(keys)
+        if keys:
+            self.blocks = [keys[start:start + self.load] for start in range(0, len(keys), self.load)]
+            self.maxes = [block[-1] for block in self.blocks]
+            self.size = len(keys)
+            self.rebuild()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for block in self.blocks:
+            for key in block:
+                yield key
+
+    def __contains__(self, key):
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return False
+        block = self.blocks[i]
+        j = bisect_left(block, key)
+        return block[j] == key
+
+    def rebuild(self):
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add_size(self, i, change):
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += change
+            i += i & -i
+
+    def prefix_size(self, i):
+        '''
+        Number of keys in the blocks before block i
+        '''
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def locate(self, position):
+        '''
+        Returns the block and the offset in it of the key at position
+        '''
+        tree = self.tree
+        i = 0
+        step = 1
+        while step * 2 < len(tree):
+            step *= 2
+        while step:
+            if i + step < len(tree) and tree[i + step] <= position:
+                i += step
+                position -= tree[i]
+            step //= 2
+        return i, position
+
+    def insert(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            self.size = 1
+            self.rebuild()
+            return
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            i -= 1
+            self.maxes[i] = key
+        block = self.blocks[i]
+        insort(block, key)
+        self.size += 1
+        if len(block) > 2 * self.load:
+            self.blocks[i:i + 1] = [block[:self.load], block[self.load:]]
+            self.maxes[i:i + 1] = [block[self.load - 1], block[-1]]
+            self.rebuild()
+        else:
+            self.add_size(i, 1)
+
+    def remove(self, key):
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            raise KeyError(key)
+        block = self.blocks[i]
+        j = bisect_left(block, key)
+        if block[j] != key:
+            raise KeyError(key)
+        del block[j]
+        self.size -= 1
+        if len(block) < self.load // 2 and len(self.blocks) > 1:
+            # merge with a neighbour, splitting again if that is too large
+            if i == len(self.blocks) - 1:
+                i -= 1
+            block = self.blocks[i] + self.blocks[i + 1]
+            if len(block) > 2 * self.load:
+                half = len(block) // 2
+                self.blocks[i:i + 2] = [block[:half], block[half:]]
+                self.maxes[i:i + 2] = [block[half - 1], block[-1]]
+            else:
+                self.blocks[i:i + 2] = [block]
+                self.maxes[i:i + 2] = [block[-1]]
+            self.rebuild()
+        elif not block:
+            del self.blocks[i]
+            del self.maxes[i]
+            self.rebuild()
+        else:
+            self.maxes[i] = block[-1]
+            self.add_size(i, -1)
+
+    def rank(self, key):
+        '''
+        Returns the number of keys less than key
+        '''
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return self.size
+        return self.prefix_size(i) + bisect_left(self.blocks[i], key)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError("RankIndex position out of range")
+        i, offset = self.locate(position)
+        return self.blocks[i][offset]
+
+    def iterate(self, start=0):
+        '''
+        Yields the keys from position start on
+        '''
+        if start >= self.size:
+            return
+        i, offset = self.locate(max(start, 0))
+        for key in islice(self.blocks[i], offset, None):
+            yield key
+        for block in islice(self.blocks, i + 1, None):
+            for key in block:
+                yield key
+
+
+class Leaderboard(object):
+    '''
+    Players ordered by a score of their ratings, best first
+
+    The score is the conservative rating, mean - conservative_stdev_multiplier
+    * stdev of game_info, of ratings with a stdev and the mean of those
+    without, like Elo ratings, unless a score function of a rating is given.
+    Players are kept in a RankIndex by (-score, order added), so rank,
+    top and page queries take O(log n) and players with equal scores rank
+    in the order they were added.
+
+    update_ratings takes the new ratings returned by any calculator's
+    new_ratings and moves only the players in them.
+    '''
+
+    def __init__(self, game_info=None, score=None, load=RankIndex.DEFAULT_LOAD):
+        if score is None:
+            multiplier = TrueSkillGameInfo.ensure_game_info(game_info).conservative_stdev_multiplier
+            score = lambda rating: conservative_score(rating, multiplier)
+        self.score = score
+        self.index = RankIndex(load=load)
+        # player_id: (key, rating)
+        self.entries = {}
+        self.order = count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, player_id):
+        return player_id in self.entries
+
+    def __iter__(self):
+        for key in self.index:
+            yield key[2]
+
+    def __getitem__(self, player_id):
+        return self.entries[player_id][1]
+
+    def __setitem__(self, player_id, rating):
+        self.update(player_id, rating)
+
+    def __delitem__(self, player_id):
+        self.remove(player_id)
+
+    def update(self, player_id, rating):
+        '''
+        Adds a player or moves them to the score of a new rating
+        '''
+        score = float(self.score(rating))
+        if isnan(score):
+            raise ValueError("score of player %s is not a number" % (player_id,))
+        entry = self.entries.get(player_id)
+        if entry is None:
+            key = (-score, next(self.order), player_id)
+            self.index.insert(key)
+        elif entry[0][0] != -score:
+            self.index.remove(entry[0])
+            key = (-score, entry[0][1], player_id)
+            self.index.insert(key)
+        else:
+            key = entry[0]
+        self.entries[player_id] = (key, rating)
+
+    def update_ratings(self, new_ratings):
+        '''
+        Updates the players of a calculator's new ratings, a Match, or of a
+        mapping of player ids to ratings
+        '''
+        if hasattr(new_ratings, 'player_rating'):
+            player_ratings = new_ratings.player_rating()
+        else:
+            player_ratings = new_ratings.items()
+        for player, rating in player_ratings:
+            self.update(getattr(player, 'player_id', player), rating)
+
+    def remove(self, player_id):
+        key, rating = self.entries.pop(player_id)
+        self.index.remove(key)
+
+    def rank(self, player_id):
+        '''
+        Returns the rank of a player, 1 being the best
+        '''
+        return self.index.rank(self.entries[player_id][0]) + 1
+
+    def standing(self, player_id):
+        key = self.entries[player_id][0]
+        return Standing(self.index.rank(key) + 1, player_id, -key[0])
+
+    def at(self, rank):
+        '''
+        Returns the Standing at a rank
+        '''
+        if rank < 1:
+            raise IndexError("ranks start at 1")
+        key = self.index[rank - 1]
+        return Standing(rank, key[2], -key[0])
+
+    def standings(self, start_rank=1, total=None):
+        '''
+        Returns the Standings of total players, all by default, from
+        start_rank on
+        '''
+        start = max(start_rank, 1) - 1
+        keys = self.index.iterate(start)
+        if total is not None:
+            keys = islice(keys, max(total, 0))
+        return [Standing(start + i + 1, key[2], -key[0]) for i, key in enumerate(keys)]
+
+    def top(self, k):
+        return self.standings(1, k)
+
+    def page(self, number, page_size):
+        '''
+        Returns the Standings of page number, starting at 1
+        '''
+        if number < 1 or page_size < 1:
+            raise ValueError("page number and size must be at least 1")
+        return self.standings((number - 1) * page_size + 1, page_size)
+
+
+def conservative_score(rating, multiplier):
+    stdev = getattr(rating, 'stdev', None)
+    if stdev is None or isnan(stdev):
+        return rating.mean
+    return rating.mean - multiplier * stdev
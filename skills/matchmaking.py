@@ -0,0 +1,220 @@
+'''
+Matchmaking of queued players into lobbies by TrueSkill match quality
+'''
+
+from __future__ import division
+import heapq
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import count
+from math import exp, sqrt
+
+from skills import GaussianRating, Match
+from skills.balancing import balanced_split, two_team_quality
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    )
+
+
+# teams is a list of teams, each a list of player ids
+Lobby = namedtuple('Lobby', ['quality', 'teams'])
+
+
+class Bucket(object):
+    '''
+    Players with stdev in [low, high) sorted by mean
+    '''
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.means = []
+        self.player_ids = []
+
+    def __len__(self):
+        return len(self.means)
+
+    def add(self, player_id, mean):
+        position = bisect_left(self.means, mean)
+        self.means.insert(position, mean)
+        self.player_ids.insert(position, player_id)
+
+    def remove(self, player_id, mean):
+        position = bisect_left(self.means, mean)
+        while self.player_ids[position] != player_id:
+            position += 1
+        del self.means[position]
+        del self.player_ids[position]
+
+
+class Matchmaker(object):
+    '''
+    Queue of players that finds the best lobbies for a player
+
+    Queued players are kept in buckets of stdev_bucket_width (beta / 4 by
+    default), each sorted by mean.  The two player match quality
+
+        sqrt(2 beta^2 / c) exp(-(mean_a - mean_b)^2 / (2 c))
+
+    with c = 2 beta^2 + stdev_a^2 + stdev_b^2 is bounded for a bucket by
+    its lowest stdev in the sqrt term and highest in the exp term.  Searches
+    walk each bucket outwards from the player's mean and stop once the
+    bound is below the quality still needed, so only the players that could
+    make the result are looked at.
+
+    Lobbies of more players are formed from the pool of the best opponents
+    by this measure, every window of pool players adjacent in mean that
+    includes the player is split into teams and scored with the TrueSkill
+    match quality.  Two teams are split for the closest mean sums, more
+    teams in a snake draft.
+    '''
+
+    DEFAULT_POOL_FACTOR = 4
+
+    def __init__(self, game_info=None, stdev_bucket_width=None, pool_factor=DEFAULT_POOL_FACTOR):
+        self.game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        self.beta_squared = self.game_info.beta ** 2.0
+        self.stdev_bucket_width = (self.game_info.beta / 4.0 if stdev_bucket_width is None
+                                   else float(stdev_bucket_width))
+        self.pool_factor = pool_factor
+        self.calculator = FactorGraphTrueSkillCalculator()
+        self.players = {}
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.players)
+
+    def __contains__(self, player_id):
+        return player_id in self.players
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def add(self, player_id, rating):
+        '''
+        Queues a player with a rating, replacing a queued player's rating
+
+        A rating given as a (mean, stdev) value is converted to GaussianRating.
+        '''
+        if player_id in self.players:
+            self.remove(player_id)
+        rating = GaussianRating.ensure_rating(rating)
+        mean = float(rating.mean)
+        stdev = float(rating.stdev)
+        number = int(stdev // self.stdev_bucket_width)
+        bucket = self.buckets.get(number)
+        if bucket is None:
+            bucket = self.buckets[number] = Bucket(number * self.stdev_bucket_width,
+                                                   (number + 1) * self.stdev_bucket_width)
+        bucket.add(player_id, mean)
+        self.players[player_id] = (mean, stdev, number)
+
+    def remove(self, player_id):
+        mean, stdev, number = self.players.pop(player_id)
+        bucket = self.buckets[number]
+        bucket.remove(player_id, mean)
+        if not bucket:
+            del self.buckets[number]
+
+    def opponents(self, player_id, k, min_quality=0.0):
+        '''
+        Returns the k queued players with the best two player match quality
+        against player_id, at least min_quality, as (quality, player_id)
+        pairs best first
+        '''
+        mean, stdev, number = self.players[player_id]
+        two_beta_squared = 2.0 * self.beta_squared
+        variance = stdev * stdev
+        best = []
+        order = count()
+
+        def needed():
+            if len(best) < k:
+                return min_quality
+            return max(min_quality, best[0][0])
+
+        buckets = sorted(self.buckets.values(), key=lambda bucket: bucket.low)
+        for bucket in buckets:
+            sqrt_bound = sqrt(two_beta_squared / (two_beta_squared + variance + bucket.low ** 2.0))
+            if k == 0 or sqrt_bound < needed():
+                continue
+            exp_denominator = 2.0 * (two_beta_squared + variance + bucket.high ** 2.0)
+            means = bucket.means
+            start = bisect_left(means, mean)
+            for step, position in ((1, start), (-1, start - 1)):
+                while 0 <= position < len(means):
+                    difference = means[position] - mean
+                    if sqrt_bound * exp(-difference * difference / exp_denominator) < needed():
+                        break
+                    opponent = bucket.player_ids[position]
+                    position += step
+                    if opponent == player_id:
+                        continue
+                    opponent_stdev = self.players[opponent][1]
+                    quality = two_team_quality(difference, variance + opponent_stdev ** 2.0,
+                                               2, self.beta_squared)
+                    if quality < needed():
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (quality, next(order), opponent))
+                    else:
+                        heapq.heapreplace(best, (quality, next(order), opponent))
+
+        return [(quality, opponent) for quality, order_number, opponent in sorted(best, reverse=True)]
+
+    def find(self, player_id, teams=2, team_size=1, k=1, min_quality=0.0):
+        '''
+        Returns up to k lobbies of teams teams of team_size players that
+        include player_id, best match quality first
+
+        teams=2, team_size=1 is one on one, teams=2 with a larger team_size
+        is team against team and more teams of one a free for all.
+        '''
+        if teams < 2 or team_size < 1:
+            raise ValueError("a lobby needs at least 2 teams of at least 1 player")
+        if teams == 2 and team_size == 1:
+            return [Lobby(quality, [[player_id], [opponent]])
+                    for quality, opponent in self.opponents(player_id, k, min_quality)]
+
+        size = teams * team_size
+        pool = [player_id] + [opponent for quality, opponent in
+                              self.opponents(player_id, self.pool_factor * size - 1, min_quality)]
+        if len(pool) < size:
+            return []
+        pool.sort(key=lambda pool_player: self.players[pool_player][0])
+        anchor = pool.index(player_id)
+
+        lobbies = []
+        for start in range(max(0, anchor - size + 1), min(anchor, len(pool) - size) + 1):
+            lobby = self.score(pool[start:start + size], teams, team_size)
+            if lobby.quality >= min_quality:
+                lobbies.append(lobby)
+        lobbies.sort(key=lambda lobby: -lobby.quality)
+        return lobbies[:k]
+
+    def score(self, player_ids, teams, team_size):
+        '''
+        Splits players into teams and returns the Lobby with its quality
+        '''
+        means = [self.players[player_id][0] for player_id in player_ids]
+        stdevs = [self.players[player_id][1] for player_id in player_ids]
+        if teams == 2:
+            first, second = balanced_split(means, team_size)
+            quality = two_team_quality(sum(means[i] for i in first) - sum(means[i] for i in second),
+                                       sum(stdev * stdev for stdev in stdevs),
+                                       len(player_ids), self.beta_squared)
+            return Lobby(quality, [[player_ids[i] for i in first], [player_ids[i] for i in second]])
+
+        # snake draft in mean order
+        lobby_teams = [[] for team in range(teams)]
+        for position, i in enumerate(sorted(range(len(player_ids)), key=lambda i: -means[i])):
+            turn, offset = divmod(position, teams)
+            lobby_teams[offset if turn % 2 == 0 else teams - 1 - offset].append(i)
+        order = [i for team in lobby_teams for i in team]
+        match = Match.from_arrays([player_ids[i] for i in order],
+                                  [means[i] for i in order],
+                                  [stdevs[i] for i in order],
+                                  range(0, len(order) + 1, team_size))
+        quality = self.calculator.match_quality(match, self.game_info)
+        return Lobby(quality, [[player_ids[i] for i in team] for team in lobby_teams])
@@ -1,8 +1,116 @@
+from __future__ import division
+
+
 class MatrixError(Exception):
     pass
 
 
+class LUDecomposition(object):
+    '''
+    LU decomposition with partial pivoting of a square matrix
+
+    L (unit lower triangular) and U are packed into a single table and the
+    row permutation is kept so that the determinant, the inverse and any
+    number of linear solves reuse one O(n^3) factorization.
+    '''
+
+    def __init__(self, matrix):
+        if not matrix.is_square():
+            raise MatrixError("Matrix is not square")
+
+        size = matrix.shape[0]
+        lu = [[float(value) for value in row] for row in matrix]
+        permutation = list(range(size))
+        sign = 1.0
+
+        for k in range(size):
+            pivot_row = k
+            pivot_value = abs(lu[k][k])
+            for row in range(k + 1, size):
+                if abs(lu[row][k]) > pivot_value:
+                    pivot_row = row
+                    pivot_value = abs(lu[row][k])
+
+            if pivot_value == 0.0:
+                # singular, nothing to eliminate in this column
+                continue
+
+            if pivot_row != k:
+                lu[k], lu[pivot_row] = lu[pivot_row], lu[k]
+                permutation[k], permutation[pivot_row] = permutation[pivot_row], permutation[k]
+                sign = -sign
+
+            row_k = lu[k]
+            pivot = row_k[k]
+            for row in range(k + 1, size):
+                row_r = lu[row]
+                factor = row_r[k] / pivot
+                row_r[k] = factor
+                if factor != 0.0:
+                    for col in range(k + 1, size):
+                        row_r[col] -= factor * row_k[col]
+
+        self.size = size
+        self.lu = lu
+        self.permutation = permutation
+        self.sign = sign
+
+    def is_singular(self):
+        return any(self.lu[i][i] == 0.0 for i in range(self.size))
+
+    def determinant(self):
+        result = self.sign
+        for i in range(self.size):
+            result *= self.lu[i][i]
+        return result
+
+    def solve(self, other):
+        '''
+        Solve A * X = B for X where B is a matrix (or vector) with as many rows as A
+        '''
+        if other.shape[0] != self.size:
+            raise MatrixError("The height of the right hand side must match the matrix size")
+        if self.is_singular():
+            raise MatrixError("Matrix is singular")
+
+        size = self.size
+        lu = self.lu
+        result = []
+        for row in self.permutation:
+            result.append([float(value) for value in other[row]])
+
+        for col in range(other.shape[1]):
+            # forward substitution with the unit lower triangle
+            for i in range(size):
+                value = result[i][col]
+                row_i = lu[i]
+                for j in range(i):
+                    value -= row_i[j] * result[j][col]
+                result[i][col] = value
+            # back substitution with the upper triangle
+            for i in reversed(range(size)):
+                value = result[i][col]
+                row_i = lu[i]
+                for j in range(i + 1, size):
+                    value -= row_i[j] * result[j][col]
+                result[i][col] = value / row_i[i]
+
+        return Matrix(result)
+
+    def inverse(self):
+        identity = [[0.0] * self.size for _ in range(self.size)]
+        for i in range(self.size):
+            identity[i][i] = 1.0
+        return self.solve(Matrix(identity))
+
+
 class Matrix(list):
+    '''
+    Pure python matrix used when NumPy is not available
+
+    Matrices are treated as immutable once constructed, the LU decomposition
+    backing determinant, inverse and solve is computed once and cached.
+    '''
 
     ERROR_TOLERANCE = 0.00000000000001
 
@@ -10,6 +118,7 @@ class Matrix(list):
         rows = len(data)
         cols = len(data[0]) if rows > 0 else 0
         self.shape = rows, cols
+        self._lu_decomposition = None
         for row in data:
             self.append(row[:])
 
@@ -19,6 +128,11 @@ class Matrix(list):
     def is_square(self):
         return self.shape[0] == self.shape[1] and self.shape[0] > 0
 
+    def lu_decomposition(self):
+        if self._lu_decomposition is None:
+            self._lu_decomposition = LUDecomposition(self)
+        return self._lu_decomposition
+
     def determinant(self):
         if not self.is_square():
             raise MatrixError("Matrix is not square")
@@ -27,14 +141,7 @@ class Matrix(list):
         elif self.shape == (2, 2):
             return self[0][0] * self[1][1] - self[0][1] * self[1][0]
         else:
-            result = 0.0
-            for current_column in range(self.shape[1]):
-                first_row_col_value = self[0][current_column]
-                cofactor = self.cofactor(0, current_column)
-                item_to_add = first_row_col_value * cofactor
-                result += item_to_add
-
-        return result
+            return self.lu_decomposition().determinant()
 
     def adjugate(self):
         if not self.is_square():
@@ -42,20 +149,29 @@ class Matrix(list):
 
         if self.shape == (2, 2):
             return Matrix([[self[1][1], -self[0][1]], [-self[1][0], self[0][0]]])
-        else:
-            result = []
-            for col in range(self.shape[1]):
-                result.append([])
-                for row in range(self.shape[0]):
-                    result[col].append(self.cofactor(row, col))
+
+        decomposition = self.lu_decomposition()
+        if not decomposition.is_singular():
+            return decomposition.determinant() * decomposition.inverse()
+
+        # the adjugate of a singular matrix can not be derived from the inverse
+        result = []
+        for col in range(self.shape[1]):
+            result.append([])
+            for row in range(self.shape[0]):
+                result[col].append(self.cofactor(row, col))
         return Matrix(result)
 
     def inverse(self):
         if self.shape == (1, 1):
             return Matrix([[1.0 / self[0][0]]])
-        determinant_inverse = 1.0 / self.determinant()
-        adjugate = self.adjugate()
-        return determinant_inverse * adjugate
+        return self.lu_decomposition().inverse()
+
+    def solve(self, other):
+        '''
+        Solve self * X = other for X, other being a matrix or vector
+        '''
+        return self.lu_decomposition().solve(other)
 
     def __add__(self, other):
         if self.shape != other.shape:
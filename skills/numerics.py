@@ -1,10 +1,17 @@
 from __future__ import division, absolute_import
+from array import array
 from math import sqrt, pi, log, exp
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 try:
     from numpy import matrix as Matrix, linalg
     Matrix.determinant = lambda m: linalg.det(m)
     Matrix.inverse = lambda m: m.I
+    Matrix.solve = lambda m, other: Matrix(linalg.solve(m, other))
 except ImportError:
     from .matrix import Matrix
 
@@ -13,6 +20,37 @@ SQRT_2_PI = sqrt(2.0 * pi)
 LOG_SQRT_2_PI = log(sqrt(2.0 * pi))
 INV_SQRT_2 = -1.0 / sqrt(2.0)
 
+# Chebyshev coefficients of the complementary error function approximation
+ERROR_FUNCTION_COEFFICIENTS = [-1.3026537197817094,
+                               6.4196979235649026e-1,
+                               1.9476473204185836e-2,
+                               - 9.561514786808631e-3,
+                               - 9.46595344482036e-4,
+                               3.66839497852761e-4,
+                               4.2523324806907e-5,
+                               - 2.0278578112534e-5,
+                               - 1.624290004647e-6,
+                               1.303655835580e-6,
+                               1.5626441722e-8,
+                               - 8.5238095915e-8,
+                               6.529054439e-9,
+                               5.059343495e-9,
+                               - 9.91364156e-10,
+                               - 2.27365122e-10,
+                               9.6467911e-11,
+                               2.394038e-12,
+                               - 6.886027e-12,
+                               8.94487e-13,
+                               3.13092e-13,
+                               - 1.12708e-13,
+                               3.81e-16,
+                               7.106e-15,
+                               - 1.523e-15,
+                               - 9.4e-17,
+                               1.21e-16,
+                               - 2.8e-17]
+ERROR_FUNCTION_COEFFICIENTS_REVERSED = list(reversed(ERROR_FUNCTION_COEFFICIENTS[1:]))
+
 
 class Vector(Matrix):
 
@@ -33,6 +71,44 @@ def IdentityMatrix(rows):
     return DiagonalMatrix([1] * rows)
 
 
+def float_array(values):
+    '''
+    Converts a sequence to a float array, a NumPy array when available
+    and an array.array otherwise
+    '''
+    if numpy is not None:
+        return numpy.asarray(values, dtype=float)
+    if isinstance(values, array) and values.typecode == 'd':
+        return values
+    return array('d', values)
+
+
+def index_array(values):
+    '''
+    Converts a sequence to an integer array, a NumPy array when available
+    and an array.array otherwise
+    '''
+    if numpy is not None:
+        return numpy.asarray(values, dtype=numpy.intp)
+    if isinstance(values, array) and values.typecode == 'l':
+        return values
+    return array('l', values)
+
+
+def segment_sums(values, offsets):
+    '''
+    Sums values[offsets[k]:offsets[k + 1]] for every segment k
+
+    Segments must not be empty and offsets[-1] must be len(values).
+    '''
+    if numpy is not None:
+        if len(offsets) < 2:
+            return numpy.zeros(0)
+        return numpy.add.reduceat(values, offsets[:-1])
+    return array('d', [sum(values[offsets[k]:offsets[k + 1]])
+                       for k in range(len(offsets) - 1)])
+
+
 class Range(object):
 
     def __init__(self, minimum, maximum):
@@ -62,32 +138,83 @@ class Range(object):
 
 
 class Gaussian(object):
+    '''
+    Gaussian distribution stored as its natural parameters
 
-    def __init__(self, mean=0.0, stdev=1.0):
-        self.mean = mean
-        self.stdev = stdev
-        self.variance = stdev ** 2.0
+    Only precision and precision_mean are stored, mean, stdev and variance
+    are derived from them when read and recompute them when set.  The
+    operators return new Gaussians, multiply, divide and update change a
+    Gaussian in place so message passing loops do not allocate a Gaussian
+    for every product.  A Gaussian built with stdev 0 is a point mass of
+    infinite precision, it also keeps its mean in point_mean until it is
+    updated to or combined with another infinite precision.  point_mean is
+    only read while the precision is infinite.
+    '''
+
+    __slots__ = ('precision', 'precision_mean', 'point_mean')
 
-        if self.variance != 0.0:
-            self.precision = 1.0 / self.variance
-            self.precision_mean = self.precision * self.mean
+    def __init__(self, mean=0.0, stdev=1.0):
+        self.reset(mean, stdev ** 2.0)
+
+    def reset(self, mean, variance):
+        '''
+        Sets the natural parameters from a mean and variance
+        '''
+        if variance != 0.0:
+            self.precision = 1.0 / variance
+            self.precision_mean = self.precision * mean
         else:
             self.precision = float("inf")
-            if self.mean == 0.0:
+            self.point_mean = mean
+            if mean == 0.0:
                 self.precision_mean = 0.0
             else:
                 self.precision_mean = float("inf")
 
+    def forget_point_mean(self):
+        try:
+            del self.point_mean
+        except AttributeError:
+            pass
+
+    @property
+    def mean(self):
+        if self.precision == float("inf"):
+            # inf / inf, a point mass built with a mean keeps it
+            return getattr(self, 'point_mean', self.precision_mean / self.precision)
+        if self.precision != 0.0:
+            return self.precision_mean / self.precision
+        return float("inf")
+
+    @mean.setter
+    def mean(self, mean):
+        self.reset(mean, self.variance)
+
+    @property
+    def variance(self):
+        if self.precision != 0.0:
+            return 1.0 / self.precision
+        return float("inf")
+
+    @variance.setter
+    def variance(self, variance):
+        self.reset(self.mean, variance)
+
+    @property
+    def stdev(self):
+        return sqrt(self.variance)
+
+    @stdev.setter
+    def stdev(self, stdev):
+        self.reset(self.mean, stdev ** 2.0)
+
     def __str__(self):
         return "mean=%.4f stdev=%.4f" % (self.mean, self.stdev)
 
     def __copy__(self):
-        result = Gaussian()
-        result.mean = self.mean
-        result.stdev = self.stdev
-        result.variance = self.variance
-        result.precision = self.precision
-        result.precision_mean = self.precision_mean
+        result = Gaussian.from_precision_mean(self.precision_mean, self.precision)
+        if hasattr(self, 'point_mean'):
+            result.point_mean = self.point_mean
         return result
 
     def normalization_constant(self):
@@ -95,21 +222,40 @@ class Gaussian(object):
 
     @staticmethod
     def from_precision_mean(precision_mean, precision):
-        result = Gaussian()
+        result = Gaussian.__new__(Gaussian)
         result.precision = precision
         result.precision_mean = precision_mean
-
-        if precision != 0.0:
-            result.variance = 1.0 / precision
-            result.stdev = sqrt(result.variance)
-            result.mean = result.precision_mean / result.precision
-        else:
-            result.variance = float("inf")
-            result.stdev = float("inf")
-            result.mean = float("inf")
-
         return result
 
+    def update(self, precision_mean, precision):
+        '''
+        Sets the natural parameters in place and returns the absolute
+        difference to the old value, see __sub__
+        '''
+        delta = max(abs(precision_mean - self.precision_mean),
+                    sqrt(abs(precision - self.precision)))
+        self.precision_mean = precision_mean
+        self.precision = precision
+        if precision == float("inf"):
+            self.forget_point_mean()
+        return delta
+
+    def multiply(self, other):
+        '''In place version of self * other'''
+        self.precision_mean = self.precision_mean + other.precision_mean
+        self.precision = self.precision + other.precision
+        if other.precision == float("inf"):
+            self.forget_point_mean()
+        return self
+
+    def divide(self, other):
+        '''In place version of self / other'''
+        self.precision_mean = self.precision_mean - other.precision_mean
+        self.precision = self.precision - other.precision
+        if other.precision == float("inf"):
+            self.forget_point_mean()
+        return self
+
     def __mul__(self, other):
         return Gaussian.from_precision_mean(
             self.precision_mean + other.precision_mean,
@@ -168,46 +314,71 @@ class Gaussian(object):
         t = 2.0 / (2.0 + z)
         ty = 4.0 * t - 2.0
 
-        coefficients = [-1.3026537197817094,
-                        6.4196979235649026e-1,
-                        1.9476473204185836e-2,
-                        - 9.561514786808631e-3,
-                        - 9.46595344482036e-4,
-                        3.66839497852761e-4,
-                        4.2523324806907e-5,
-                        - 2.0278578112534e-5,
-                        - 1.624290004647e-6,
-                        1.303655835580e-6,
-                        1.5626441722e-8,
-                        - 8.5238095915e-8,
-                        6.529054439e-9,
-                        5.059343495e-9,
-                        - 9.91364156e-10,
-                        - 2.27365122e-10,
-                        9.6467911e-11,
-                        2.394038e-12,
-                        - 6.886027e-12,
-                        8.94487e-13,
-                        3.13092e-13,
-                        - 1.12708e-13,
-                        3.81e-16,
-                        7.106e-15,
-                        - 1.523e-15,
-                        - 9.4e-17,
-                        1.21e-16,
-                        - 2.8e-17]
-
         d = 0.0
         dd = 0.0
 
-        for coef in reversed(coefficients[1:]):
+        for coef in ERROR_FUNCTION_COEFFICIENTS_REVERSED:
             tmp = d
             d = ty * d - dd + coef
             dd = tmp
 
-        ans = t * exp(-z * z + 0.5 * (coefficients[0] + ty * d) - dd)
+        ans = t * exp(-z * z + 0.5 * (ERROR_FUNCTION_COEFFICIENTS[0] + ty * d) - dd)
         return ans if x >= 0.0 else 2.0 - ans
 
+    @staticmethod
+    def at_array(x, mean=0.0, stdev=1.0):
+        '''NumPy array version of at'''
+        x = numpy.asarray(x, dtype=float)
+        multiplier = 1.0 / (stdev * SQRT_2_PI)
+        return multiplier * numpy.exp((-1.0 * (x - mean) ** 2.0) / (2.0 * (stdev ** 2.0)))
+
+    @staticmethod
+    def cumulative_to_array(x, mean=0.0, stdev=1.0):
+        '''NumPy array version of cumulative_to'''
+        return 0.5 * Gaussian.error_function_cumulative_to_array(INV_SQRT_2 * numpy.asarray(x, dtype=float))
+
+    @staticmethod
+    def error_function_cumulative_to_array(x):
+        '''NumPy array version of error_function_cumulative_to'''
+        x = numpy.asarray(x, dtype=float)
+        z = numpy.abs(x)
+
+        t = 2.0 / (2.0 + z)
+        ty = 4.0 * t - 2.0
+
+        d = numpy.zeros_like(z)
+        dd = numpy.zeros_like(z)
+
+        for coef in ERROR_FUNCTION_COEFFICIENTS_REVERSED:
+            tmp = d
+            d = ty * d - dd + coef
+            dd = tmp
+
+        ans = t * numpy.exp(-z * z + 0.5 * (ERROR_FUNCTION_COEFFICIENTS[0] + ty * d) - dd)
+        return numpy.where(x >= 0.0, ans, 2.0 - ans)
+
+    @staticmethod
+    def inverse_error_function_cumulative_to_array(p):
+        '''NumPy array version of inverse_error_function_cumulative_to'''
+        p = numpy.asarray(p, dtype=float)
+        inside = (p > 0.0) & (p < 2.0)
+        # keep the logarithm finite where the result is clamped below
+        pp = numpy.where(inside, numpy.where(p < 1.0, p, 2.0 - p), 1.0)
+        t = numpy.sqrt(-2.0 * numpy.log(pp / 2.0))
+        x = -0.70711 * ((2.30753 + t * 0.27061) / (1.0 + t * (0.99229 + t * 0.04481)) - t)
+
+        for _ in range(2):
+            err = Gaussian.error_function_cumulative_to_array(x) - pp
+            x = x + err / (1.12837916709551257 * numpy.exp(-(x ** 2.0)) - x * err)
+
+        x = numpy.where(p < 1.0, x, -x)
+        return numpy.where(p >= 2.0, -100.0, numpy.where(p <= 0.0, 100.0, x))
+
+    @staticmethod
+    def inverse_cumulative_to_array(x, mean=0.0, stdev=1.0):
+        '''NumPy array version of inverse_cumulative_to'''
+        return mean - sqrt(2.0) * stdev * Gaussian.inverse_error_function_cumulative_to_array(2.0 * numpy.asarray(x, dtype=float))
+
     @staticmethod
     def inverse_error_function_cumulative_to(p):
         if p >= 2.0:
@@ -0,0 +1,387 @@
+'''
+Streaming replay of match logs into a RatingStore
+'''
+
+import csv
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+
+from skills import (
+    GaussianRating,
+    Match,
+    Player,
+    Team,
+    )
+
+from skills.glicko import GlickoCalculator
+
+
+# teams is a list of teams, each a list of (player_id, partial_play_percentage)
+MatchRecord = namedtuple('MatchRecord', ['teams', 'rank', 'rating_period'])
+
+
+class ReplayError(Exception):
+    pass
+
+
+def read_json_lines(path, offset=0):
+    '''
+    Reads a match log with one JSON object per line
+
+        {"teams": [[1, 2], [3, [4, 0.5]]], "rank": [1, 2], "rating_period": 7}
+
+    A player is a player id or a [player_id, partial_play_percentage] pair,
+    rating_period is optional.  Yields (MatchRecord, offset) pairs, offset
+    being where the next match starts, starting to read at offset.
+    '''
+    with open(path, 'rb') as log:
+        log.seek(offset)
+        while True:
+            line = log.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            data = json.loads(line.decode('utf-8'))
+            teams = [[(player, Player.DEFAULT_PARTIAL_PLAY_PERCENTAGE)
+                      if not isinstance(player, list) else tuple(player)
+                      for player in team]
+                     for team in data['teams']]
+            yield MatchRecord(teams, data['rank'], data.get('rating_period')), log.tell()
+
+
+def read_csv(path, offset=0):
+    '''
+    Reads a match log with one row per player of a match
+
+        match_id,player_id,team,rank[,rating_period][,partial_play]
+
+    The header row names the columns, the rows of a match are consecutive
+    and teams are ordered by their team number.  Yields (MatchRecord,
+    offset) pairs, offset being where the next match starts, starting to
+    read at offset.
+    '''
+    with open(path, 'rb') as log:
+        header = next(csv.reader([log.readline().decode('utf-8')]))
+        columns = dict((name.strip(), index) for index, name in enumerate(header))
+        for name in ('match_id', 'player_id', 'team', 'rank'):
+            if name not in columns:
+                raise ReplayError("%s has no %s column" % (path, name))
+        if offset > log.tell():
+            log.seek(offset)
+
+        rows = []
+        while True:
+            start = log.tell()
+            line = log.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            row = next(csv.reader([line.decode('utf-8')]))
+            if rows and row[columns['match_id']] != rows[0][columns['match_id']]:
+                yield csv_record(rows, columns), start
+                rows = []
+            rows.append(row)
+        if rows:
+            yield csv_record(rows, columns), log.tell()
+
+
+def csv_record(rows, columns):
+    teams = {}
+    ranks = {}
+    for row in rows:
+        team = int(row[columns['team']])
+        partial_play = (float(row[columns['partial_play']])
+                        if 'partial_play' in columns and row[columns['partial_play']]
+                        else Player.DEFAULT_PARTIAL_PLAY_PERCENTAGE)
+        teams.setdefault(team, []).append((int(row[columns['player_id']]), partial_play))
+        ranks[team] = int(row[columns['rank']])
+    rating_period = (int(rows[0][columns['rating_period']])
+                     if 'rating_period' in columns and rows[0][columns['rating_period']]
+                     else None)
+    order = sorted(teams)
+    return MatchRecord([teams[team] for team in order], [ranks[team] for team in order], rating_period)
+
+
+class Replay(object):
+    '''
+    Replays a match log through a calculator into a RatingStore
+
+    Matches are read one at a time and rated with the store's current
+    ratings, players not in the store start with initial_rating (the
+    game_info's default rating).  Glicko calculators rate every rating
+    period at once when the log moves on to the next period, so only one
+    period is held in memory.
+
+    With a checkpoint_path a copy of the store and the log position are
+    written every checkpoint_interval matches (at the end of a rating period
+    for Glicko) and run resumes from the last checkpoint.
+    '''
+
+    DEFAULT_CHECKPOINT_INTERVAL = 100000
+
+    def __init__(self, calculator, store, game_info, checkpoint_path=None,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, initial_rating=None):
+        self.calculator = calculator
+        self.store = store
+        self.game_info = game_info
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.initial_rating = initial_rating if initial_rating is not None else game_info.default_rating()
+        self.by_rating_period = isinstance(calculator, GlickoCalculator)
+
+        self.matches = 0
+        self.checkpoint_matches = 0
+        self.period_matches = []
+        self.period_ratings = {}
+        self.period_players = {}
+        self.rating_period = None
+
+    def run(self, path, resume=True):
+        '''
+        Replays a match log file, .csv files are read with read_csv and
+        anything else with read_json_lines.  Returns the number of matches
+        replayed in total.
+        '''
+        reader = read_csv if path.endswith('.csv') else read_json_lines
+        offset = 0
+        if resume and self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            offset = self.restore(path)
+        return self.replay(reader(path, offset), path)
+
+    def replay(self, entries, path=None):
+        '''
+        Replays (MatchRecord, offset) pairs as yielded by the readers
+        '''
+        offset = None
+        for record, next_offset in entries:
+            if self.by_rating_period:
+                if record.rating_period is None:
+                    raise ReplayError("rating_period is required to replay Glicko ratings")
+                if record.rating_period != self.rating_period:
+                    self.end_rating_period()
+                    if self.matches - self.checkpoint_matches >= self.checkpoint_interval:
+                        self.checkpoint(path, offset)
+                    self.rating_period = record.rating_period
+                self.period_matches.append(self.match(record, self.period_ratings, self.period_players))
+            else:
+                self.store.update(self.calculator.new_ratings(self.match(record), self.game_info))
+            self.matches += 1
+            offset = next_offset
+            if (not self.by_rating_period and
+                    self.matches - self.checkpoint_matches >= self.checkpoint_interval):
+                self.checkpoint(path, offset)
+
+        self.end_rating_period()
+        if offset is not None:
+            self.checkpoint(path, offset)
+        self.store.flush()
+        return self.matches
+
+    def match(self, record, ratings=None, players=None):
+        '''
+        Builds a Match with the store's ratings of the record's players
+
+        ratings and players cache the rating views and Player objects of a
+        Glicko rating period, which needs the same player and rating object
+        for a player in every match.
+        '''
+        match = Match(rank=list(record.rank))
+        for team in record.teams:
+            current_team = Team()
+            for player_id, partial_play_percentage in team:
+                if ratings is not None and player_id in ratings:
+                    rating = ratings[player_id]
+                else:
+                    if player_id not in self.store:
+                        self.store[player_id] = self.initial_rating
+                    rating = self.store[player_id]
+                    if ratings is not None:
+                        ratings[player_id] = rating
+                if players is None:
+                    player = Player(player_id, partial_play_percentage)
+                else:
+                    player = players.get(player_id)
+                    if player is None:
+                        player = players[player_id] = Player(player_id, partial_play_percentage)
+                current_team[player] = rating
+            match.append(current_team)
+        return match
+
+    def end_rating_period(self):
+        if self.period_matches:
+            self.store.update(self.calculator.new_ratings(self.period_matches,
+                                                          self.rating_period,
+                                                          self.game_info))
+        self.period_matches = []
+        self.period_ratings = {}
+        self.period_players = {}
+
+    def checkpoint(self, path, offset):
+        '''
+        Saves a copy of the store and the log position it was replayed to
+        '''
+        if self.checkpoint_path is None or path is None:
+            return
+        store_path = "%s.%d.store" % (self.checkpoint_path, self.matches)
+        self.store.save(store_path)
+
+        previous = self.read_checkpoint() if os.path.exists(self.checkpoint_path) else None
+        temporary_path = self.checkpoint_path + '.tmp'
+        with open(temporary_path, 'w') as checkpoint:
+            json.dump({'log': os.path.abspath(path),
+                       'offset': offset,
+                       'matches': self.matches,
+                       'rating_period': self.rating_period,
+                       'store': store_path}, checkpoint)
+        os.rename(temporary_path, self.checkpoint_path)
+
+        if previous is not None and previous['store'] != store_path and os.path.exists(previous['store']):
+            os.remove(previous['store'])
+        self.checkpoint_matches = self.matches
+
+    def read_checkpoint(self):
+        with open(self.checkpoint_path) as checkpoint:
+            return json.load(checkpoint)
+
+    def restore(self, path):
+        '''
+        Restores the store from the last checkpoint and returns the log offset
+        '''
+        checkpoint = self.read_checkpoint()
+        if checkpoint['log'] != os.path.abspath(path):
+            raise ReplayError("checkpoint %s is for %s" % (self.checkpoint_path, checkpoint['log']))
+        self.store.restore(checkpoint['store'])
+        self.matches = self.checkpoint_matches = checkpoint['matches']
+        self.rating_period = checkpoint['rating_period']
+        return checkpoint['offset']
+
+
+def match_waves(records):
+    '''
+    Splits MatchRecords into waves of matches without a player in common
+
+    A match goes in the wave after the last wave holding one of its
+    players, so every player's matches stay in log order and rating the
+    waves one after the other gives the same ratings as rating the matches
+    in order.  Returns a list of waves, each a list of records in log order.
+    '''
+    last_wave = {}
+    waves = []
+    for record in records:
+        player_ids = [player_id for team in record.teams for player_id, partial_play_percentage in team]
+        wave = max([last_wave.get(player_id, -1) for player_id in player_ids]) + 1
+        for player_id in player_ids:
+            last_wave[player_id] = wave
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(record)
+    return waves
+
+
+# calculator and game_info of a ParallelReplay worker process
+worker = {}
+
+
+def init_worker(calculator, game_info):
+    worker['calculator'] = calculator
+    worker['game_info'] = game_info
+
+
+def rate_matches(matches, calculator=None, game_info=None):
+    '''
+    Rates matches given as (teams, rank) with teams of (player_id,
+    partial_play_percentage, mean, stdev) tuples, using the worker's
+    calculator unless one is given.  Returns the (player_id, mean, stdev)
+    new ratings of every match.
+    '''
+    if calculator is None:
+        calculator = worker['calculator']
+        game_info = worker['game_info']
+    results = []
+    for teams, rank in matches:
+        match = Match([Team([(Player(player_id, partial_play_percentage), GaussianRating(mean, stdev))
+                             for player_id, partial_play_percentage, mean, stdev in team])
+                       for team in teams], rank)
+        results.append([(player.player_id, rating.mean, rating.stdev)
+                        for player, rating in calculator.new_ratings(match, game_info).player_rating()])
+    return results
+
+
+class ParallelReplay(Replay):
+    '''
+    Replays a match log through a TrueSkill calculator on a process pool
+
+    The log is read window matches at a time and each window is split into
+    match_waves.  The matches of a wave are rated in chunks of chunk_size
+    by the worker processes, which run copies of the calculator, so the
+    ratings are the same as a sequential Replay.  Waves smaller than
+    chunk_size are rated in this process.  Checkpoints are written between
+    windows.
+    '''
+
+    DEFAULT_WINDOW = 10000
+    DEFAULT_CHUNK_SIZE = 64
+
+    def __init__(self, calculator, store, game_info, checkpoint_path=None,
+                 checkpoint_interval=Replay.DEFAULT_CHECKPOINT_INTERVAL, initial_rating=None,
+                 processes=None, window=DEFAULT_WINDOW, chunk_size=DEFAULT_CHUNK_SIZE):
+        Replay.__init__(self, calculator, store, game_info, checkpoint_path,
+                        checkpoint_interval, initial_rating)
+        if self.by_rating_period:
+            raise ReplayError("Glicko ratings are replayed by rating period, use Replay")
+        if calculator.rating_class is not GaussianRating:
+            raise ReplayError("only calculators of GaussianRating are replayed in parallel, use Replay")
+        self.processes = processes
+        self.window = window
+        self.chunk_size = chunk_size
+
+    def replay(self, entries, path=None):
+        pool = multiprocessing.Pool(self.processes, init_worker, (self.calculator, self.game_info))
+        offset = None
+        try:
+            window = []
+            for entry in entries:
+                window.append(entry)
+                if len(window) == self.window:
+                    offset = self.replay_window(pool, window, path)
+                    window = []
+            if window:
+                offset = self.replay_window(pool, window, path)
+        finally:
+            pool.close()
+            pool.join()
+
+        if offset is not None:
+            self.checkpoint(path, offset)
+        self.store.flush()
+        return self.matches
+
+    def replay_window(self, pool, window, path):
+        for wave in match_waves([record for record, offset in window]):
+            matches = []
+            for record in wave:
+                match = self.match(record)
+                matches.append(([[(player.player_id, player.partial_play_percentage, rating.mean, rating.stdev)
+                                  for player, rating in team.player_rating()]
+                                 for team in match],
+                                match.rank))
+
+            if len(matches) < self.chunk_size:
+                results = [rate_matches(matches, self.calculator, self.game_info)]
+            else:
+                results = pool.map(rate_matches, [matches[start:start + self.chunk_size]
+                                                  for start in range(0, len(matches), self.chunk_size)])
+            for chunk in results:
+                for match in chunk:
+                    for player_id, mean, stdev in match:
+                        self.store.set(player_id, GaussianRating(mean, stdev))
+
+        self.matches += len(window)
+        offset = window[-1][1]
+        if self.matches - self.checkpoint_matches >= self.checkpoint_interval:
+            self.checkpoint(path, offset)
+        return offset
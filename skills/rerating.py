@@ -0,0 +1,273 @@
+'''
+Match histories that re-rate only what a corrected match changes
+'''
+
+import heapq
+from bisect import bisect_left, bisect_right, insort
+
+from skills import Match, Player, Team
+from skills.glicko import GlickoCalculator
+from skills.replay import ReplayError
+
+
+# rating attributes compared to tell whether a rating changed
+RATING_ATTRIBUTES = ('mean', 'stdev', 'k_factor', 'last_rating_period', 'volatility')
+
+
+def same_rating(rating, other, tolerance=0.0):
+    '''
+    Whether two ratings have the same values, numbers within tolerance
+    '''
+    if rating is other:
+        return True
+    if rating is None or other is None:
+        return False
+    for name in RATING_ATTRIBUTES:
+        value = getattr(rating, name, None)
+        other_value = getattr(other, name, None)
+        if value == other_value:
+            continue
+        if value is None or other_value is None or abs(value - other_value) > tolerance:
+            return False
+    return True
+
+
+class RatingHistory(object):
+    '''
+    Rated match history that can correct or void past matches
+
+    Matches are rated as they are added, in order, and every rating event
+    (a match, or a whole rating period for Glicko calculators) keeps the
+    ratings its players had before it.  A player's rating after an event is
+    then the prior of their next event, or their current rating, so any
+    event can be rated again on its own.
+
+    correct and void re-rate the changed event and follow a frontier of
+    events in history order: an event is re-rated only when one of its
+    players' prior changed, and a player whose new rating after an event is
+    the same as before (within tolerance) stops the change there.  Only the
+    matches downstream of the correction that involve a transitively
+    affected player are rated again, with any calculator the history was
+    built with.
+
+    Match numbers count the matches added, starting at 0.
+    '''
+
+    def __init__(self, calculator, game_info, initial_rating=None, tolerance=0.0):
+        self.calculator = calculator
+        self.game_info = game_info
+        self.initial_rating = initial_rating if initial_rating is not None else game_info.default_rating()
+        self.tolerance = tolerance
+        self.by_rating_period = isinstance(calculator, GlickoCalculator)
+
+        # per event, the MatchRecords of it, None for a voided match
+        self.events = []
+        self.event_rating_periods = []
+        # per event, player_id: rating before it, None while a rating period is open
+        self.priors = []
+        # per match number, (event, position in the event)
+        self.match_events = []
+        # player_id: events of the player in order
+        self.player_events = {}
+        # player_id: rating after their last rated event
+        self.ratings = {}
+        self.rerated_events = 0
+
+    def __len__(self):
+        return len(self.match_events)
+
+    def __getitem__(self, match_number):
+        event, position = self.match_events[match_number]
+        return self.events[event][position]
+
+    def rating(self, player_id):
+        '''
+        Returns a player's current rating, closing an open rating period
+        '''
+        self.end_rating_period()
+        return self.ratings.get(player_id, self.initial_rating)
+
+    def add(self, record):
+        '''
+        Rates a MatchRecord after the matches already added, returns its
+        match number
+
+        Glicko calculators rate every rating period at once when the next
+        period starts or end_rating_period is called.
+        '''
+        if self.by_rating_period:
+            if record.rating_period is None:
+                raise ReplayError("rating_period is required to rate Glicko ratings")
+            if self.events and record.rating_period < self.event_rating_periods[-1]:
+                raise ReplayError("rating period %s comes after %s" %
+                                  (record.rating_period, self.event_rating_periods[-1]))
+            if not self.events or record.rating_period != self.event_rating_periods[-1]:
+                self.end_rating_period()
+                self.start_event(record.rating_period)
+        else:
+            self.start_event(record.rating_period)
+
+        event = len(self.events) - 1
+        self.match_events.append((event, len(self.events[event])))
+        self.events[event].append(record)
+        for player_id in record_players(record):
+            events = self.player_events.setdefault(player_id, [])
+            if not events or events[-1] != event:
+                events.append(event)
+
+        if not self.by_rating_period:
+            self.end_rating_period()
+        return len(self.match_events) - 1
+
+    def start_event(self, rating_period):
+        self.events.append([])
+        self.event_rating_periods.append(rating_period)
+        self.priors.append(None)
+
+    def end_rating_period(self):
+        '''
+        Rates the open event, the current rating period for Glicko
+        '''
+        if not self.events or self.priors[-1] is not None:
+            return
+        event = len(self.events) - 1
+        self.priors[event] = dict((player_id, self.ratings.get(player_id, self.initial_rating))
+                                  for player_id in self.event_players(event))
+        for player_id, rating in self.rate(event).items():
+            self.ratings[player_id] = rating
+
+    def correct(self, match_number, record):
+        '''
+        Replaces a match with a corrected MatchRecord and re-rates what it
+        changes, returns the number of events rated again
+        '''
+        event, position = self.match_events[match_number]
+        if (self.by_rating_period and record is not None and
+                record.rating_period != self.event_rating_periods[event]):
+            raise ReplayError("a corrected match must stay in rating period %s" %
+                              self.event_rating_periods[event])
+        old_players = self.event_players(event)
+        self.events[event][position] = record
+        new_players = self.event_players(event)
+        for player_id in new_players - old_players:
+            if self.priors[event] is not None:
+                self.priors[event][player_id] = self.rating_after(player_id, event)
+            insort(self.player_events.setdefault(player_id, []), event)
+        frontier = [event]
+        for player_id in old_players - new_players:
+            events = self.player_events[player_id]
+            del events[bisect_left(events, event)]
+            if self.priors[event] is not None:
+                # the player's later events start from their rating before this one
+                next_event = self.carry(player_id, event, self.priors[event].pop(player_id))
+                if next_event is not None:
+                    frontier.append(next_event)
+
+        if self.priors[event] is None:
+            return 0
+        return self.rerate(frontier)
+
+    def void(self, match_number):
+        '''
+        Removes a match from the history, see correct
+        '''
+        return self.correct(match_number, None)
+
+    def rerate(self, frontier):
+        '''
+        Rates the frontier events again and every later event whose players'
+        ratings change, in history order
+        '''
+        heapq.heapify(frontier)
+        queued = set(frontier)
+        total = 0
+        while frontier:
+            event = heapq.heappop(frontier)
+            queued.discard(event)
+            total += 1
+            for player_id, rating in self.rate(event).items():
+                next_event = self.next_event(player_id, event)
+                if next_event is None:
+                    self.ratings[player_id] = rating
+                elif not same_rating(self.priors[next_event][player_id], rating, self.tolerance):
+                    self.priors[next_event][player_id] = rating
+                    if next_event not in queued:
+                        heapq.heappush(frontier, next_event)
+                        queued.add(next_event)
+        self.rerated_events += total
+        return total
+
+    def rate(self, event):
+        '''
+        Rates an event with its priors, returns player_id: new rating
+        '''
+        records = [record for record in self.events[event] if record is not None]
+        if not records:
+            return {}
+        priors = self.priors[event]
+        # a rating period needs the same player and rating object in every match
+        players = {}
+        matches = []
+        for record in records:
+            match = Match(rank=list(record.rank))
+            for team in record.teams:
+                current_team = Team()
+                for player_id, partial_play_percentage in team:
+                    player = players.get(player_id)
+                    if player is None:
+                        player = players[player_id] = Player(player_id, partial_play_percentage)
+                    current_team[player] = priors[player_id]
+                match.append(current_team)
+            matches.append(match)
+
+        if self.by_rating_period:
+            new_ratings = self.calculator.new_ratings(matches, self.event_rating_periods[event], self.game_info)
+        else:
+            new_ratings = self.calculator.new_ratings(matches[0], self.game_info)
+        return dict((player.player_id, rating) for player, rating in new_ratings.player_rating())
+
+    def event_players(self, event):
+        return set(player_id for record in self.events[event] if record is not None
+                   for player_id in record_players(record))
+
+    def next_event(self, player_id, event):
+        '''
+        Returns the player's first rated event after event, None if there is none
+        '''
+        events = self.player_events[player_id]
+        position = bisect_right(events, event)
+        if position < len(events) and self.priors[events[position]] is not None:
+            return events[position]
+        return None
+
+    def rating_after(self, player_id, event):
+        '''
+        Returns the player's rating after their events before event
+        '''
+        events = self.player_events.get(player_id, [])
+        position = bisect_left(events, event)
+        if position < len(events) and self.priors[events[position]] is not None:
+            return self.priors[events[position]][player_id]
+        return self.ratings.get(player_id, self.initial_rating)
+
+    def carry(self, player_id, event, rating):
+        '''
+        Makes rating the player's rating after event, returns their next
+        event that needs rating again
+        '''
+        next_event = self.next_event(player_id, event)
+        if next_event is None:
+            if len(self.player_events[player_id]) == 0:
+                del self.player_events[player_id]
+                self.ratings.pop(player_id, None)
+            else:
+                self.ratings[player_id] = rating
+            return None
+        if same_rating(self.priors[next_event][player_id], rating, self.tolerance):
+            return None
+        self.priors[next_event][player_id] = rating
+        return next_event
+
+
+def record_players(record):
+    return [player_id for team in record.teams for player_id, partial_play_percentage in team]
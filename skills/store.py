@@ -0,0 +1,348 @@
+'''
+Persistent storage for the ratings of many players
+'''
+
+from __future__ import division
+import mmap
+import os
+import struct
+
+from skills import GaussianRating
+from skills.numerics import numpy
+
+
+class RatingStoreError(Exception):
+    pass
+
+
+class RatingStore(object):
+    '''
+    Ratings of many players in fixed width columns of a memory mapped file
+
+    Every player gets a row holding its integer player id, mean, stdev,
+    k_factor, last_rating_period and Glicko-2 volatility.  Each column is a
+    contiguous block of 8 byte little endian values after a 64 byte header,
+    so the file is only read when a row is used.  An in memory index maps
+    player ids to rows.  Without a path the store lives in anonymous memory.
+
+    Player ids must be 64 bit integers, unlike in a Match, other ids raise
+    RatingStoreError.
+
+    Indexing the store by player id gives a StoredRating view of the row,
+    which reads and writes the columns directly, so calculators can be
+    handed ratings without creating objects for the players not involved.
+    Assigning a rating object to a player id stores its values, adding the
+    player if needed.
+
+    Values a rating does not have (an Elo rating's stdev, a TrueSkill
+    rating's k_factor or volatility) are stored as NaN, a missing
+    last_rating_period as NO_RATING_PERIOD.
+    '''
+
+    MAGIC = b'SKRS'
+    VERSION = 2
+    HEADER = struct.Struct('<4sIQQ')
+    HEADER_SIZE = 64
+    COLUMNS = ('player_ids', 'means', 'stdevs', 'k_factors', 'last_rating_periods', 'volatilities')
+    COLUMN_TYPES = ('q', 'd', 'd', 'd', 'q', 'd')
+    NUMPY_TYPES = ('<i8', '<f8', '<f8', '<f8', '<i8', '<f8')
+    COLUMN_WIDTH = 8
+    NO_RATING_PERIOD = -2 ** 63
+    DEFAULT_CAPACITY = 1024
+    COPY_SIZE = 1 << 20
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.capacity = max(int(capacity), 1)
+        self.index = {}
+        self.structs = [struct.Struct('<' + column_type) for column_type in RatingStore.COLUMN_TYPES]
+
+        if path is not None and os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            self.map = mmap.mmap(self.file.fileno(), 0)
+            try:
+                self.read_header()
+                self.build_index()
+            except RatingStoreError:
+                self.close()
+                raise
+        else:
+            if path is not None:
+                self.file = open(path, 'w+b')
+            self.map = self.create_map(self.capacity)
+            self.write_header()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, player_id):
+        return player_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, player_id):
+        return StoredRating(self, self.index[player_id])
+
+    def __setitem__(self, player_id, rating):
+        self.set(player_id, rating)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def size(self, capacity):
+        return RatingStore.HEADER_SIZE + len(RatingStore.COLUMNS) * capacity * RatingStore.COLUMN_WIDTH
+
+    def create_map(self, capacity):
+        if self.file is None:
+            return mmap.mmap(-1, self.size(capacity))
+        self.file.truncate(self.size(capacity))
+        return mmap.mmap(self.file.fileno(), self.size(capacity))
+
+    def read_header(self):
+        magic, version, self.count, self.capacity = RatingStore.HEADER.unpack_from(self.map, 0)
+        if magic != RatingStore.MAGIC:
+            raise RatingStoreError("%s is not a rating store" % self.path)
+        if version != RatingStore.VERSION:
+            raise RatingStoreError("%s has unsupported version %d" % (self.path, version))
+        if len(self.map) < self.size(self.capacity):
+            raise RatingStoreError("%s is truncated" % self.path)
+
+    def write_header(self):
+        RatingStore.HEADER.pack_into(self.map, 0, RatingStore.MAGIC, RatingStore.VERSION,
+                                     self.count, self.capacity)
+
+    def build_index(self):
+        player_ids = self.column('player_ids')
+        if numpy is not None:
+            player_ids = player_ids.tolist()
+        self.index = dict(zip(player_ids, range(self.count)))
+        if len(self.index) != self.count:
+            raise RatingStoreError("%s has duplicate player ids" % self.path)
+
+    def offset(self, column, row):
+        return (RatingStore.HEADER_SIZE +
+                (column * self.capacity + row) * RatingStore.COLUMN_WIDTH)
+
+    def get(self, column, row):
+        return self.structs[column].unpack_from(self.map, self.offset(column, row))[0]
+
+    def put(self, column, row, value):
+        self.structs[column].pack_into(self.map, self.offset(column, row), value)
+
+    def row(self, player_id):
+        '''
+        Returns the row of a player, adding the player with no rating if needed
+        '''
+        try:
+            return self.index[player_id]
+        except KeyError:
+            pass
+
+        try:
+            self.structs[0].pack(player_id)
+        except struct.error:
+            raise RatingStoreError("player id %r is not a 64 bit integer" % (player_id,))
+        if self.count == self.capacity:
+            self.grow(2 * self.capacity)
+        row = self.count
+        self.put(0, row, player_id)
+        self.put(1, row, float('nan'))
+        self.put(2, row, float('nan'))
+        self.put(3, row, float('nan'))
+        self.put(4, row, RatingStore.NO_RATING_PERIOD)
+        self.put(5, row, float('nan'))
+        self.count += 1
+        self.index[player_id] = row
+        self.write_header()
+        return row
+
+    def rows(self, player_ids):
+        '''
+        Returns the rows of many players, adding the ones not in the store
+        '''
+        return [self.row(player_id) for player_id in player_ids]
+
+    def set(self, player_id, rating):
+        '''
+        Stores the values of a rating object for a player
+        '''
+        row = self.row(player_id)
+        self.put(1, row, rating.mean)
+        stdev = getattr(rating, 'stdev', None)
+        self.put(2, row, float('nan') if stdev is None else stdev)
+        k_factor = getattr(rating, 'k_factor', None)
+        self.put(3, row, float('nan') if k_factor is None else k_factor)
+        last_rating_period = getattr(rating, 'last_rating_period', None)
+        self.put(4, row, RatingStore.NO_RATING_PERIOD if last_rating_period is None else last_rating_period)
+        volatility = getattr(rating, 'volatility', None)
+        self.put(5, row, float('nan') if volatility is None else volatility)
+        return row
+
+    def update(self, match):
+        '''
+        Stores every rating of a match, such as the result of new_ratings
+        '''
+        for player, rating in match.player_rating():
+            self.set(player.player_id, rating)
+
+    def grow(self, capacity):
+        '''
+        Moves the columns apart to make room for capacity rows
+
+        Column arrays returned by column must be released first.
+        '''
+        width = self.count * RatingStore.COLUMN_WIDTH
+        columns = [self.map[self.offset(column, 0):self.offset(column, 0) + width]
+                   for column in range(len(RatingStore.COLUMNS))]
+        self.map.close()
+        self.map = self.create_map(capacity)
+        self.capacity = capacity
+        for column, data in enumerate(columns):
+            start = self.offset(column, 0)
+            self.map[start:start + width] = data
+        self.write_header()
+
+    def column(self, name):
+        '''
+        Returns the values of a column for every row
+
+        With NumPy this is an array viewing the store, writes to it change
+        the store and it must be released before the store grows or closes.
+        Otherwise it is a copy in a list.
+        '''
+        column = RatingStore.COLUMNS.index(name)
+        start = self.offset(column, 0)
+        if numpy is not None:
+            return numpy.frombuffer(self.map, dtype=RatingStore.NUMPY_TYPES[column],
+                                    count=self.count, offset=start)
+        column_format = '<%d%s' % (self.count, RatingStore.COLUMN_TYPES[column])
+        return list(struct.unpack_from(column_format, self.map, start))
+
+    def set_column(self, name, values, start=0):
+        '''
+        Writes values to a column from row start onwards
+        '''
+        column = RatingStore.COLUMNS.index(name)
+        if start + len(values) > self.count:
+            raise RatingStoreError("column values past the last row")
+        for row, value in enumerate(values, start):
+            self.put(column, row, value)
+
+    def save(self, path):
+        '''
+        Writes a copy of the store to path, which can be opened as a store
+        or restored into one
+        '''
+        with open(path, 'wb') as copy:
+            for start in range(0, len(self.map), RatingStore.COPY_SIZE):
+                copy.write(self.map[start:start + RatingStore.COPY_SIZE])
+
+    def restore(self, path):
+        '''
+        Replaces the contents of the store with a copy written by save
+        '''
+        with open(path, 'rb') as copy:
+            magic, version, count, capacity = RatingStore.HEADER.unpack(copy.read(RatingStore.HEADER.size))
+            if magic != RatingStore.MAGIC:
+                raise RatingStoreError("%s is not a rating store" % path)
+            self.map.close()
+            self.map = self.create_map(capacity)
+            copy.seek(0)
+            for start in range(0, self.size(capacity), RatingStore.COPY_SIZE):
+                data = copy.read(RatingStore.COPY_SIZE)
+                self.map[start:start + len(data)] = data
+        self.read_header()
+        self.build_index()
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            if self.file is not None:
+                self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class StoredRating(GaussianRating):
+    '''
+    Rating viewing a row of a RatingStore
+
+    Attributes read and write the store's columns.  Like the rating classes
+    a missing stdev, k_factor or volatility is not an attribute, a missing
+    last_rating_period is None.
+    '''
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __repr__(self):
+        return "StoredRating(%s, %s)" % (self.player_id, self.mean)
+
+    def __str__(self):
+        return "mean=%.5f" % self.mean
+
+    @property
+    def player_id(self):
+        return self.store.get(0, self.row)
+
+    @property
+    def mean(self):
+        return self.store.get(1, self.row)
+
+    @mean.setter
+    def mean(self, value):
+        self.store.put(1, self.row, value)
+
+    @property
+    def stdev(self):
+        value = self.store.get(2, self.row)
+        if value != value:
+            raise AttributeError("player %s has no stdev" % self.player_id)
+        return value
+
+    @stdev.setter
+    def stdev(self, value):
+        self.store.put(2, self.row, value)
+
+    @property
+    def k_factor(self):
+        value = self.store.get(3, self.row)
+        if value != value:
+            raise AttributeError("player %s has no k_factor" % self.player_id)
+        return value
+
+    @k_factor.setter
+    def k_factor(self, value):
+        self.store.put(3, self.row, value)
+
+    @property
+    def last_rating_period(self):
+        value = self.store.get(4, self.row)
+        return None if value == RatingStore.NO_RATING_PERIOD else value
+
+    @last_rating_period.setter
+    def last_rating_period(self, value):
+        self.store.put(4, self.row, RatingStore.NO_RATING_PERIOD if value is None else value)
+
+    @property
+    def volatility(self):
+        value = self.store.get(5, self.row)
+        if value != value:
+            raise AttributeError("player %s has no volatility" % self.player_id)
+        return value
+
+    @volatility.setter
+    def volatility(self, value):
+        self.store.put(5, self.row, value)
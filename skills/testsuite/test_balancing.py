@@ -0,0 +1,64 @@
+import random
+import unittest
+from itertools import combinations
+
+from skills import GaussianRating, Player
+from skills.balancing import balance_teams, balanced_split
+from skills.trueskill import TrueSkillGameInfo, TwoTeamTrueSkillCalculator
+
+
+def difference(means, first, second):
+    return abs(sum(means[i] for i in first) - sum(means[i] for i in second))
+
+
+def best_difference(means, team_size):
+    total = sum(means)
+    return min(abs(total - 2.0 * sum(team)) for team in combinations(means, team_size))
+
+
+class BalancingTest(unittest.TestCase):
+
+    def test_balanced_split(self):
+        means = [30.0, 10.0, 20.0, 25.0, 15.0, 20.0]
+        first, second = balanced_split(means, 3)
+        self.assertEqual(0.0, difference(means, first, second))
+        self.assertEqual(list(range(6)), sorted(first + second))
+        self.assertRaises(ValueError, balanced_split, means, 0)
+        self.assertRaises(ValueError, balanced_split, means, 6)
+
+    def test_exact(self):
+        generator = random.Random(1)
+        for total_players, team_size in ((13, 6), (14, 7), (16, 8), (17, 5), (18, 9)):
+            means = [generator.gauss(25.0, 5.0) for i in range(total_players)]
+            first, second = balanced_split(means, team_size)
+            self.assertEqual((team_size, total_players - team_size), (len(first), len(second)))
+            self.assertAlmostEqual(best_difference(means, team_size), difference(means, first, second))
+
+    def test_large_pools(self):
+        generator = random.Random(2)
+        means = [generator.gauss(25.0, 5.0) for i in range(32)]
+        first, second = balanced_split(means)
+        self.assertEqual((16, 16), (len(first), len(second)))
+        self.assertTrue(difference(means, first, second) < 1e-3)
+        first, second = balanced_split(means, exact_limit=20)
+        self.assertEqual((16, 16), (len(first), len(second)))
+        self.assertTrue(difference(means, first, second) < 1.0)
+
+    def test_balance_teams(self):
+        generator = random.Random(3)
+        players = [(Player(i), GaussianRating(generator.gauss(25.0, 5.0), generator.uniform(1.0, 8.0)))
+                   for i in range(10)]
+        game_info = TrueSkillGameInfo()
+        quality, match = balance_teams(players, game_info=game_info)
+        self.assertEqual([5, 5], [len(team) for team in match])
+        self.assertEqual(set(player for player, rating in players), set(match.players()))
+        self.assertAlmostEqual(TwoTeamTrueSkillCalculator().match_quality(match, game_info), quality)
+
+        quality, match = balance_teams(dict((i, (25.0 + i, 8.0)) for i in range(10)))
+        self.assertEqual(list(range(10)), sorted(player.player_id for player in match.players()))
+        self.assertTrue(all(isinstance(rating, GaussianRating) for rating in match.ratings()))
+        self.assertAlmostEqual(TwoTeamTrueSkillCalculator().match_quality(match), quality)
+
+
+if __name__ == "__main__":
+    unittest.main()
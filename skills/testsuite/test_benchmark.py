@@ -0,0 +1,39 @@
+import json
+import unittest
+
+from skills import benchmark
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_run_case(self):
+        result = benchmark.run_case('TwoTeam', '5v5', 'new_ratings', iterations=5, warmup=1)
+        self.assertEqual('TwoTeam/5v5/new_ratings/%s' % ('pure' if benchmark.numpy is None else 'numpy'),
+                         result['key'])
+        self.assertEqual(5, result['iterations'])
+        latency = result['latency_us']
+        self.assertTrue(latency['min'] <= latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max'])
+        self.assertTrue(result['throughput'] > 0)
+        if benchmark.tracemalloc is not None:
+            self.assertTrue(result['allocations']['peak_bytes'] > 0)
+
+        # two teams only
+        self.assertEqual(None, benchmark.run_case('TwoTeam', 'ffa8', 'new_ratings', iterations=5))
+        # partial play needs the factor graph
+        self.assertEqual(None, benchmark.run_case('TwoTeam', 'partial', 'new_ratings', iterations=5))
+
+    def test_report(self):
+        results = benchmark.run(['Elo', 'Glicko', 'FactorGraph'], ['1v1', 'partial'], iterations=3, warmup=0)
+        self.assertEqual(8, len(results))
+        data = json.loads(json.dumps(benchmark.report(results, [benchmark.environment()])))
+        comparison = benchmark.compare(data, data)
+        self.assertEqual(sorted(result['key'] for result in results), [key for key, a, b, ratio in comparison])
+        self.assertTrue(all(ratio == 1.0 for key, a, b, ratio in comparison))
+
+    def test_percentile(self):
+        self.assertEqual(2.5, benchmark.percentile([1.0, 2.0, 3.0, 4.0], 0.5))
+        self.assertEqual(4.0, benchmark.percentile([1.0, 2.0, 3.0, 4.0], 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,22 @@
 import unittest
 
 from skills import (
+    GaussianRating,
     Match,
+    Team,
+    WIN,
+    DRAW,
+    LOSE,
     )
 
 from skills.elo import (
   EloCalculator,
-  EloGameInfo
+  EloGameInfo,
+  EloRating,
   )
 
+from skills.numerics import numpy
+
 
 class CalculatorTests(object):
 
@@ -45,6 +53,57 @@ class EloTests(unittest.TestCase, CalculatorTests):
         self.assertRating(1218.99, new_ratings.rating_by_id(1))
         self.assertRating(1381.01, new_ratings.rating_by_id(2))
 
+    def replay(self, ratings, games, game_info):
+        ratings = list(ratings)
+        for a, b, outcome, k in games:
+            rank = {WIN: [1, 2], DRAW: [1, 1], LOSE: [2, 1]}[outcome]
+            teams = Match([{a: (ratings[a], k)},
+                           {b: (ratings[b], k)}],
+                          rank)
+            new_ratings = self.calculator.new_ratings(teams, game_info)
+            ratings[a] = new_ratings.rating_by_id(a).mean
+            ratings[b] = new_ratings.rating_by_id(b).mean
+        return ratings
+
+    def batch_games(self):
+        return [(0, 1, WIN, 32.0),
+                (2, 3, DRAW, 16.0),
+                (1, 2, LOSE, 32.0),
+                (0, 3, DRAW, 24.0),
+                (3, 1, WIN, 32.0),
+                (4, 0, LOSE, 10.0)]
+
+    def test_new_ratings_batch(self):
+        game_info = EloGameInfo(1200, 200)
+        ratings = [1200.0, 1400.0, 1300.0, 1250.0, 1600.0]
+        games = self.batch_games()
+        expected = self.replay(ratings, games, game_info)
+        player_a, player_b, outcome, k_factor = map(list, zip(*games))
+        new_ratings, deltas = self.calculator.new_ratings_batch(ratings, player_a, player_b,
+                                                                outcome, k_factor, game_info,
+                                                                deltas=True)
+        self.assertEqual(len(games), len(deltas))
+        for expected_mean, actual_mean in zip(expected, new_ratings):
+            self.assertAlmostEqual(expected_mean, actual_mean, places=9)
+        self.assertRaises(ValueError, self.calculator.new_ratings_batch, ratings,
+                          [0, 2], [1, 2], [WIN, WIN], game_info=game_info)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_new_ratings_batch_vectorized(self):
+        game_info = EloGameInfo(1200, 200)
+        ratings = [1200.0, 1400.0, 1300.0, 1250.0, 1600.0]
+        player_a, player_b, outcome, k_factor = map(list, zip(*self.batch_games()))
+        sequential = self.calculator.new_ratings_batch(ratings, player_a, player_b,
+                                                       outcome, k_factor, game_info, deltas=True)
+        vectorized = self.calculator.new_ratings_batch(ratings, player_a, player_b,
+                                                       outcome, k_factor, game_info, deltas=True,
+                                                       vectorize=True)
+        for expected, actual in zip(sequential, vectorized):
+            for expected_value, actual_value in zip(expected, actual):
+                self.assertAlmostEqual(expected_value, actual_value, places=9)
+        self.assertRaises(ValueError, self.calculator.new_ratings_batch, ratings,
+                          [0, 2], [1, 2], [WIN, WIN], game_info=game_info, vectorize=True)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,14 +1,20 @@
 import unittest
 
 from skills import (
+    GaussianRating,
     Match,
     Matches,
     Team,
+    WIN,
+    LOSE,
     )
 
 from skills.glicko import (
   GlickoCalculator,
-  GlickoGameInfo
+  GlickoGameInfo,
+  Glicko2Calculator,
+  Glicko2GameInfo,
+  Glicko2Rating,
   )
 
 
@@ -53,6 +59,67 @@ class GlickoTests(unittest.TestCase, CalculatorTests):
         #self.assertMatchQuality(1.0, self.calculator.calculate_match_quality(matches, game_info))
         self.assertRating(1464.1, 151.4, new_ratings.rating_by_id(1))
 
+    def test_new_ratings_batch(self):
+        game_info = GlickoGameInfo()
+        means = [1500, 1400, 1550, 1700, 1800]
+        stdevs = [200, 30, 100, 300, 50]
+        new_means, new_stdevs = self.calculator.new_ratings_batch(
+            means, stdevs, [0, 0, 0], [1, 2, 3], [WIN, LOSE, LOSE],
+            game_info=game_info)
+        self.assertEqual(len(means), len(new_means))
+        self.assertRating(1464.1, 151.4, GaussianRating(new_means[0], new_stdevs[0]))
+        # player 4 did not play during the rating period
+        self.assertRating(1800, 50, GaussianRating(new_means[4], new_stdevs[4]))
+
+
+class Glicko2Tests(unittest.TestCase, CalculatorTests):
+
+    ERROR_TOLERANCE_VOLATILITY = 0.00001
+
+    def setUp(self):
+        self.calculator = Glicko2Calculator()
+
+    def assertVolatility(self, expected_volatility, actual):
+        self.assertAlmostEqual(expected_volatility, actual.volatility, None,
+                               "expected volatility of %.8f, got %.8f" % (expected_volatility, actual.volatility),
+                               Glicko2Tests.ERROR_TOLERANCE_VOLATILITY)
+
+    def test_one_on_one(self):
+        # example from http://www.glicko.net/glicko/glicko2.pdf
+        game_info = Glicko2GameInfo(tau=0.5)
+        player1 = Team({1: (1500, 200, None, 0.06)})
+        player2 = Team({2: (1400, 30, None, 0.06)})
+        player3 = Team({3: (1550, 100, None, 0.06)})
+        player4 = Team({4: (1700, 300, None, 0.06)})
+        matches = Matches([Match([player1, player2], [1, 2]),
+                           Match([player1, player3], [2, 1]),
+                           Match([player1, player4], [2, 1])])
+        new_ratings = self.calculator.new_ratings(matches, 1, game_info)
+        self.assertRating(1464.06, 151.52, new_ratings.rating_by_id(1))
+        self.assertVolatility(0.05999, new_ratings.rating_by_id(1))
+
+    def test_new_ratings_batch(self):
+        game_info = Glicko2GameInfo(tau=0.5)
+        new_means, new_stdevs, new_volatilities = self.calculator.new_ratings_batch(
+            [1500, 1400, 1550, 1700, 1800],
+            [200, 30, 100, 300, 50],
+            [0.06, 0.06, 0.06, 0.06, 0.06],
+            [0, 0, 0], [1, 2, 3], [WIN, LOSE, LOSE],
+            game_info=game_info)
+        self.assertRating(1464.06, 151.52, GaussianRating(new_means[0], new_stdevs[0]))
+        # player 4 did not play, only the deviation grows
+        self.assertRating(1800, 51.1, GaussianRating(new_means[4], new_stdevs[4]))
+        self.assertAlmostEqual(0.06, new_volatilities[4])
+
+    def test_rating(self):
+        # the arguments follow GlickoRating's, volatility comes last
+        rating = Glicko2Rating(1500, 200, 3)
+        self.assertEqual((3, Glicko2GameInfo.DEFAULT_INITIAL_VOLATILITY),
+                         (rating.last_rating_period, rating.volatility))
+        rating = Glicko2Rating.ensure_rating((1500, 200, None, 0.05))
+        self.assertEqual((None, 0.05), (rating.last_rating_period, rating.volatility))
+        self.assertEqual("Glicko2Rating(1500.0, 200.0, 3, 0.05)", repr(Glicko2Rating(1500, 200, 3, 0.05)))
+
 
 if __name__ == "__main__":
     unittest.main()
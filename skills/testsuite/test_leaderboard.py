@@ -0,0 +1,98 @@
+import random
+import unittest
+
+from skills import GaussianRating, Match, Player, Team
+from skills.elo import EloCalculator, EloRating
+from skills.leaderboard import Leaderboard, RankIndex, Standing
+from skills.trueskill import TrueSkillGameInfo, TwoPlayerTrueSkillCalculator
+
+
+class RankIndexTest(unittest.TestCase):
+
+    def test_against_sorted_list(self):
+        generator = random.Random(1)
+        for load in (2, 3, 16):
+            index = RankIndex(load=load)
+            keys = []
+            for step in range(2000):
+                if keys and generator.random() < 0.45:
+                    key = keys.pop(generator.randrange(len(keys)))
+                    index.remove(key)
+                else:
+                    key = generator.random()
+                    keys.append(key)
+                    index.insert(key)
+                if step % 101 == 0:
+                    keys.sort()
+                    self.assertEqual(keys, list(index))
+                    self.assertEqual(keys, [index[position] for position in range(len(index))])
+                    self.assertEqual(list(range(0, len(keys), 7)),
+                                     [index.rank(key) for key in keys[::7]])
+                    self.assertEqual(keys[5:], list(index.iterate(5)))
+        self.assertRaises(KeyError, index.remove, 2.0)
+        self.assertRaises(IndexError, index.__getitem__, len(index))
+        self.assertEqual(list(range(10)), list(RankIndex(reversed(range(10)), 3)))
+
+
+class LeaderboardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.game_info = TrueSkillGameInfo()
+        self.leaderboard = Leaderboard(self.game_info, load=4)
+        generator = random.Random(2)
+        for player_id in range(50):
+            self.leaderboard[player_id] = GaussianRating(generator.gauss(25.0, 5.0),
+                                                         generator.uniform(1.0, 8.0))
+
+    def expected(self):
+        return sorted(self.leaderboard,
+                      key=lambda player_id: -self.leaderboard[player_id].conservative_rating(self.game_info))
+
+    def test_queries(self):
+        leaderboard = self.leaderboard
+        expected = self.expected()
+        self.assertEqual(expected, list(leaderboard))
+        self.assertEqual(list(range(1, 51)), [leaderboard.rank(player_id) for player_id in expected])
+        best = expected[0]
+        self.assertEqual(Standing(1, best, leaderboard[best].conservative_rating(self.game_info)),
+                         leaderboard.at(1))
+        self.assertEqual(expected[:3], [standing.player_id for standing in leaderboard.top(3)])
+        page = leaderboard.page(3, 10)
+        self.assertEqual(list(range(21, 31)), [standing.rank for standing in page])
+        self.assertEqual(expected[20:30], [standing.player_id for standing in page])
+        self.assertEqual(5, len(leaderboard.page(6, 9)))
+        self.assertEqual([], leaderboard.page(9, 10))
+        self.assertRaises(ValueError, leaderboard.page, 0, 10)
+
+    def test_updates(self):
+        leaderboard = self.leaderboard
+        leaderboard[7] = GaussianRating(100.0, 1.0)
+        self.assertEqual(1, leaderboard.rank(7))
+        del leaderboard[7]
+        self.assertFalse(7 in leaderboard)
+        self.assertEqual(49, len(leaderboard))
+
+        calculator = TwoPlayerTrueSkillCalculator()
+        prior = leaderboard[1]
+        match = Match([Team({Player(1): prior}), Team({Player(2): leaderboard[2]})], [1, 2])
+        leaderboard.update_ratings(calculator.new_ratings(match, self.game_info))
+        self.assertTrue(leaderboard[1].mean > prior.mean)
+        self.assertEqual(self.expected(), list(leaderboard))
+
+        # equal scores rank in the order players were added
+        leaderboard[3] = leaderboard[4] = GaussianRating(200.0, 1.0)
+        self.assertEqual([3, 4], [standing.player_id for standing in leaderboard.top(2)])
+        self.assertRaises(ValueError, leaderboard.update, 5, GaussianRating(float('nan'), 1.0))
+
+    def test_elo(self):
+        leaderboard = Leaderboard()
+        leaderboard.update_ratings({'a': EloRating(1500.0), 'b': EloRating(1600.0)})
+        calculator = EloCalculator()
+        match = Match([Team({Player('a'): leaderboard['a']}), Team({Player('b'): leaderboard['b']})], [1, 2])
+        leaderboard.update_ratings(calculator.new_ratings(match))
+        self.assertEqual(['b', 'a'], list(leaderboard))
+        self.assertEqual(leaderboard['b'].mean, leaderboard.standing('b').score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import copy
+import pickle
+import unittest
+from threading import Thread
+
+from skills import (
+    GaussianRating,
+    Match,
+    Player,
+    RatingFactory,
+    Team,
+    )
+from skills.elo import EloCalculator, EloRating
+from skills.glicko import GlickoCalculator, GlickoRating
+from skills.numerics import numpy
+
+
+class MatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.alice = Player('alice')
+        self.bob = Player('bob', 0.5)
+        self.carol = Player('carol')
+        self.match = Match([Team({self.alice: GaussianRating(25.0, 8.0),
+                                  self.bob: GaussianRating(30.0, 3.0)}),
+                            Team({self.carol: GaussianRating(20.0, 5.0)})],
+                           [2, 1])
+
+    def test_lookup(self):
+        self.assertTrue(self.match.player_by_id('bob') is self.bob)
+        self.assertEqual(20.0, self.match.rating_by_id('carol').mean)
+        self.assertEqual((self.alice, self.match[0][self.alice]), self.match.player_rating_by_id('alice'))
+        self.assertEqual(None, self.match.player_by_id('dave'))
+        self.assertEqual(None, self.match.rating_by_id('dave'))
+        self.assertEqual(None, self.match[0].rating_by_id('carol'))
+
+    def test_index_updates(self):
+        match = self.match
+        match.sort()
+        self.assertTrue(match[0].player_by_id('carol') is self.carol)
+        self.assertTrue(match.player_by_id('alice') is self.alice)
+
+        dave = Player('dave')
+        match[1].add_player(dave, GaussianRating(22.0, 4.0))
+        self.assertEqual(22.0, match.rating_by_id('dave').mean)
+        match.add_team({'erin': (18.0, 6.0)})
+        self.assertEqual(18.0, match.rating_by_id('erin')[0])
+
+        del match[1][self.alice]
+        self.assertEqual(None, match.player_by_id('alice'))
+        self.assertEqual(30.0, match[1].pop(self.bob).mean)
+        self.assertEqual(None, match.player_by_id('bob'))
+
+        team = match.pop(0)
+        self.assertEqual(None, match.player_by_id('carol'))
+        match.insert(0, team)
+        self.assertTrue(match.player_by_id('carol') is self.carol)
+        match[0] = Team({'frank': (15.0, 2.0)})
+        self.assertEqual(None, match.player_by_id('carol'))
+        self.assertEqual('frank', match.player_by_id('frank').player_id)
+
+    def test_list_methods(self):
+        match = Match([{1: (25.0, 8.0)}, {2: (25.0, 8.0)}], [1, 2])
+        self.assertEqual(1, match.index(match[1]))
+        self.assertEqual(1, match.count(match[0]))
+        match = Match.from_arrays([1, 2], [25.0, 25.0], [8.0, 8.0], [0, 1, 2])
+        self.assertEqual(1, match.index(match[1]))
+
+    def test_order(self):
+        player_ids = [5, 3, 9, 1, 7, 2, 8]
+        team = Team([(Player(player_id), GaussianRating(25.0, 8.0)) for player_id in player_ids])
+        self.assertEqual(player_ids, [player.player_id for player in team.players()])
+        del team[team.player_by_id(9)]
+        team[Player(9)] = GaussianRating(20.0, 4.0)
+        self.assertEqual([5, 3, 1, 7, 2, 8, 9], [player.player_id for player in team.players()])
+        match = Match.from_arrays(player_ids, [25.0] * 7, [8.0] * 7, [0, 7])
+        self.assertEqual(player_ids, [player.player_id for player in match[0].players()])
+
+    def test_views(self):
+        team = self.match[0]
+        players = team.players()
+        team.add_player(Player('dave'), GaussianRating(22.0, 4.0))
+        self.assertEqual(3, len(players))
+        self.assertEqual(3, len(team.player_rating()))
+        self.assertEqual(4, len(list(self.match.ratings())))
+
+    def test_copy(self):
+        for match in (copy.deepcopy(self.match), pickle.loads(pickle.dumps(self.match))):
+            self.assertEqual([2, 1], match.rank)
+            self.assertEqual(0.5, match.player_by_id('bob').partial_play_percentage)
+            self.assertEqual(30.0, match.rating_by_id('bob').mean)
+
+    def test_from_arrays(self):
+        match = Match.from_arrays(['alice', 'bob', 'carol'], [25.0, 30.0, 20.0], [8.0, 3.0, 5.0],
+                                  [0, 2, 3], [2, 1], [1.0, 0.5, 1.0])
+        self.assertEqual(self.match.rank, match.rank)
+        for player_id in ('alice', 'bob', 'carol'):
+            expected_player, expected_rating = self.match.player_rating_by_id(player_id)
+            player, rating = match.player_rating_by_id(player_id)
+            self.assertEqual((repr(expected_player), repr(expected_rating)), (repr(player), repr(rating)))
+        self.assertEqual([2, 1], [len(team) for team in match])
+        self.assertEqual(0.5, match.player_by_id('bob').partial_play_percentage)
+        self.assertEqual(1.0, match.player_by_id('bob').partial_update_percentage)
+        match.sort()
+        self.assertEqual(20.0, match[0].rating_by_id('carol').mean)
+
+        elo = Match.from_arrays([1, 2], [1200.0, 1400.0], None, [0, 1, 2], [1, 2], rating_class=EloRating)
+        self.assertTrue(isinstance(elo.rating_by_id(2), EloRating))
+        self.assertEqual(vars(EloRating(1400.0)), vars(elo.rating_by_id(2)))
+        glicko = Match.from_arrays([1, 2], [1500.0, 1400.0], [350.0, 30.0], [0, 1, 2], [1, 2],
+                                   rating_class=GlickoRating)
+        self.assertEqual(vars(GlickoRating(1400.0, 30.0)), vars(glicko.rating_by_id(2)))
+        self.assertEqual("GlickoRating(1400.0, 30.0, None)", repr(glicko.rating_by_id(2)))
+        GlickoCalculator().new_ratings([glicko], 1)
+
+    def test_rating_context(self):
+        # values are kept until a calculator or context converts them
+        calculator = EloCalculator()
+        team = Team({1: (1200, 25)})
+        self.assertEqual((1200, 25), team.rating_by_id(1))
+        match = Match([team, {2: (1400, 25)}], [2, 1])
+        calculator.match_quality(match)
+        new_ratings = calculator.new_ratings(match)
+        self.assertTrue(new_ratings.rating_by_id(1).mean < 1200.0)
+        # the calculator converts a copy, the caller's teams are left as they are
+        self.assertEqual((1200, 25), team.rating_by_id(1))
+        self.assertTrue(match[0] is team)
+        self.assertEqual([2, 1], match.rank)
+
+        with calculator.rating_context():
+            self.assertTrue(isinstance(Team({1: 1200}).rating_by_id(1), EloRating))
+            with RatingFactory.context(GaussianRating):
+                self.assertTrue(isinstance(Team({1: (25.0, 8.3)}).rating_by_id(1), GaussianRating))
+            self.assertTrue(isinstance(Team({1: 1200}).rating_by_id(1), EloRating))
+        self.assertEqual(1200, Team({1: 1200}).rating_by_id(1))
+        self.assertEqual(1200.0, RatingFactory(1200).mean)
+        with calculator.rating_context():
+            self.assertTrue(isinstance(RatingFactory(1200), EloRating))
+
+        # contexts are per thread
+        results = []
+
+        def build(rating_class, rating):
+            with RatingFactory.context(rating_class):
+                for i in range(200):
+                    results.append(type(Team({1: rating}).rating_by_id(1)) is rating_class)
+
+        threads = [Thread(target=build, args=(EloRating, (1200, 32))),
+                   Thread(target=build, args=(GaussianRating, (25.0, 8.3)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(400, len(results))
+        self.assertTrue(all(results))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_from_numpy_arrays(self):
+        match = Match.from_arrays(numpy.array([1, 2]), numpy.array([25.0, 30.0]), numpy.array([8.0, 3.0]),
+                                  numpy.array([0, 1, 2]), [1, 2])
+        self.assertTrue(type(match.rating_by_id(2).mean) is float)
+        self.assertTrue(type(match.player_by_id(2).player_id) is int)
+
+
+if __name__ == "__main__":
+    unittest.main()
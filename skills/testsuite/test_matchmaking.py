@@ -0,0 +1,86 @@
+import random
+import unittest
+
+from skills import GaussianRating, Match
+from skills.matchmaking import Matchmaker
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    TwoPlayerTrueSkillCalculator,
+    TwoTeamTrueSkillCalculator,
+    )
+
+
+class MatchmakerTest(unittest.TestCase):
+
+    ERROR_TOLERANCE = 0.0000000001
+
+    def setUp(self):
+        generator = random.Random(5)
+        self.game_info = TrueSkillGameInfo()
+        self.matchmaker = Matchmaker(self.game_info)
+        self.ratings = {}
+        for player_id in range(500):
+            rating = GaussianRating(generator.gauss(25.0, 6.0), generator.uniform(0.5, 8.3))
+            self.ratings[player_id] = rating
+            self.matchmaker.add(player_id, rating)
+
+    def match(self, teams):
+        return Match([dict((player_id, self.ratings[player_id]) for player_id in team) for team in teams])
+
+    def test_one_on_one(self):
+        calculator = TwoPlayerTrueSkillCalculator()
+        for player_id in (3, 250, 499):
+            expected = sorted(((calculator.match_quality(self.match([[player_id], [opponent]]), self.game_info),
+                                opponent)
+                               for opponent in self.ratings if opponent != player_id), reverse=True)[:5]
+            lobbies = self.matchmaker.find(player_id, k=5)
+            self.assertEqual([[[player_id], [opponent]] for quality, opponent in expected],
+                             [lobby.teams for lobby in lobbies])
+            for (quality, opponent), lobby in zip(expected, lobbies):
+                self.assertAlmostEqual(quality, lobby.quality, None, None, MatchmakerTest.ERROR_TOLERANCE)
+
+        lobbies = self.matchmaker.find(3, k=500, min_quality=0.5)
+        self.assertTrue(lobbies)
+        self.assertTrue(all(lobby.quality >= 0.5 for lobby in lobbies))
+        self.assertEqual(len(lobbies), len([opponent for opponent in self.ratings if opponent != 3 and
+                                            calculator.match_quality(self.match([[3], [opponent]]), self.game_info) >= 0.5]))
+
+    def test_teams(self):
+        calculator = TwoTeamTrueSkillCalculator()
+        lobbies = self.matchmaker.find(42, teams=2, team_size=5, k=3)
+        self.assertEqual(3, len(lobbies))
+        self.assertTrue(lobbies[0].quality >= lobbies[-1].quality)
+        for lobby in lobbies:
+            self.assertEqual([5, 5], [len(team) for team in lobby.teams])
+            self.assertTrue(42 in lobby.teams[0] + lobby.teams[1])
+            self.assertEqual(10, len(set(lobby.teams[0] + lobby.teams[1])))
+            self.assertAlmostEqual(calculator.match_quality(self.match(lobby.teams), self.game_info),
+                                   lobby.quality, None, None, MatchmakerTest.ERROR_TOLERANCE)
+
+    def test_free_for_all(self):
+        calculator = FactorGraphTrueSkillCalculator()
+        lobbies = self.matchmaker.find(7, teams=8, team_size=1, k=2)
+        self.assertEqual(2, len(lobbies))
+        for lobby in lobbies:
+            self.assertEqual(8, len(lobby.teams))
+            self.assertAlmostEqual(calculator.match_quality(self.match(lobby.teams), self.game_info),
+                                   lobby.quality, None, None, MatchmakerTest.ERROR_TOLERANCE)
+
+    def test_queue(self):
+        self.matchmaker.remove(10)
+        self.assertFalse(10 in self.matchmaker)
+        self.assertEqual(499, len(self.matchmaker))
+        self.matchmaker.add(11, GaussianRating(30.0, 1.0))
+        self.assertEqual(499, len(self.matchmaker))
+        self.assertTrue(all(10 not in lobby.teams[1] for lobby in self.matchmaker.find(12, k=499)))
+        small = Matchmaker()
+        small.add(1, GaussianRating(25.0, 8.3))
+        small.add(2, (25.0, 8.3))
+        self.assertEqual([[[1], [2]]], [lobby.teams for lobby in small.find(1)])
+        self.assertEqual([], small.find(1, teams=2, team_size=2))
+        self.assertRaises(ValueError, small.find, 1, 1, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
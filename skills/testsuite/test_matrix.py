@@ -0,0 +1,77 @@
+from __future__ import division
+import unittest
+from skills.matrix import Matrix, MatrixError
+
+
+class MatrixTest(unittest.TestCase):
+
+    ERROR_TOLERANCE = 0.0000000001
+
+    def assertMatrix(self, expected, actual):
+        self.assertEqual(expected.shape, actual.shape)
+        for row in range(expected.shape[0]):
+            for col in range(expected.shape[1]):
+                self.assertAlmostEqual(expected[row][col], actual[row][col], None,
+                                       "expected %.15f at (%d, %d), got %.15f" % (expected[row][col], row, col, actual[row][col]),
+                                       MatrixTest.ERROR_TOLERANCE)
+
+    def testDeterminant(self):
+        a = Matrix([[1, 2, 3],
+                    [4, 5, 6],
+                    [7, 8, 10]])
+        self.assertAlmostEqual(-3.0, a.determinant(), None, None, MatrixTest.ERROR_TOLERANCE)
+
+        # requires pivoting, the leading entry is zero
+        b = Matrix([[0, 2, 1, 4],
+                    [1, 0, 3, 2],
+                    [2, 1, 0, 1],
+                    [3, 4, 2, 0]])
+        cofactor_sum = sum(b[0][col] * b.cofactor(0, col) for col in range(4))
+        self.assertAlmostEqual(cofactor_sum, b.determinant(), None, None, MatrixTest.ERROR_TOLERANCE)
+
+        singular = Matrix([[1, 2, 3],
+                           [2, 4, 6],
+                           [1, 1, 1]])
+        self.assertAlmostEqual(0.0, singular.determinant(), None, None, MatrixTest.ERROR_TOLERANCE)
+
+    def testInverse(self):
+        a = Matrix([[4, 7, 2],
+                    [3, 6, 1],
+                    [2, 5, 3]])
+        identity = Matrix([[1, 0, 0],
+                           [0, 1, 0],
+                           [0, 0, 1]])
+        self.assertMatrix(identity, a * a.inverse())
+        self.assertMatrix(identity, a.inverse() * a)
+
+        singular = Matrix([[1, 2, 3],
+                           [2, 4, 6],
+                           [1, 1, 1]])
+        self.assertRaises(MatrixError, singular.inverse)
+
+    def testAdjugate(self):
+        a = Matrix([[-3, 2, -5],
+                    [-1, 0, -2],
+                    [3, -4, 1]])
+        expected = Matrix([[-8, 18, -4],
+                           [-5, 12, -1],
+                           [4, -6, 2]])
+        self.assertMatrix(expected, a.adjugate())
+
+    def testSolve(self):
+        a = Matrix([[2, 1, -1],
+                    [-3, -1, 2],
+                    [-2, 1, 2]])
+        b = Matrix([[8], [-11], [-3]])
+        self.assertMatrix(Matrix([[2], [3], [-1]]), a.solve(b))
+
+    def testLargeDeterminant(self):
+        size = 16
+        tridiagonal = Matrix([[2.0 if row == col else -1.0 if abs(row - col) == 1 else 0.0
+                               for col in range(size)]
+                              for row in range(size)])
+        self.assertAlmostEqual(size + 1.0, tridiagonal.determinant(), None, None, MatrixTest.ERROR_TOLERANCE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 from __future__ import division
 import unittest
-from skills.numerics import Gaussian
+from skills.numerics import Gaussian, numpy
+from copy import copy
 from math import sqrt
 
 
@@ -110,6 +111,71 @@ class GaussianDistributionTest(unittest.TestCase):
                                "testAbsoluteDifference abs_diff2 expected %.15f, got %.15f" % (answer, abs_diff2),
                                GaussianDistributionTest.ERROR_TOLERANCE)
 
+    def testInPlace(self):
+        m4s5 = Gaussian(4.0, 5.0)
+        m6s7 = Gaussian(6.0, 7.0)
+        product = Gaussian(4.0, 5.0)
+        self.assertIs(product, product.multiply(m6s7))
+        expected = m4s5 * m6s7
+        self.assertEqual((expected.precision_mean, expected.precision),
+                         (product.precision_mean, product.precision))
+
+        product.divide(m6s7)
+        self.assertAlmostEqual(4.0, product.mean, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertAlmostEqual(5.0, product.stdev, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+
+        delta = product.update(m6s7.precision_mean, m6s7.precision)
+        self.assertAlmostEqual(m4s5 - m6s7, delta, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertAlmostEqual(6.0, product.mean, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertFalse(hasattr(product, '__dict__'))
+
+    def testPointMass(self):
+        for mean in (5.0, -3.0, 0.0):
+            point_mass = Gaussian(mean, 0.0)
+            self.assertEqual(mean, point_mass.mean)
+            self.assertEqual(0.0, point_mass.stdev)
+            self.assertEqual(mean, copy(point_mass).mean)
+        self.assertEqual(float("inf"), Gaussian.from_precision_mean(0.0, 0.0).mean)
+
+        point_mass = Gaussian(5.0, 0.0)
+        point_mass.multiply(Gaussian(2.0, 3.0))
+        self.assertEqual(5.0, point_mass.mean)
+        point_mass.update(float("inf"), float("inf"))
+        self.assertNotEqual(5.0, point_mass.mean)
+        point_mass = Gaussian(5.0, 0.0)
+        point_mass.multiply(Gaussian(2.0, 0.0))
+        self.assertNotEqual(5.0, point_mass.mean)
+
+    def testSetters(self):
+        gaussian = Gaussian(4.0, 5.0)
+        gaussian.mean = 6.0
+        self.assertAlmostEqual(6.0, gaussian.mean, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertAlmostEqual(5.0, gaussian.stdev, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        gaussian.stdev = 2.0
+        self.assertAlmostEqual(6.0, gaussian.mean, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertAlmostEqual(0.25, gaussian.precision, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        gaussian.variance = 0.0
+        self.assertEqual((6.0, 0.0), (gaussian.mean, gaussian.stdev))
+        gaussian.variance = 9.0
+        self.assertAlmostEqual(6.0, gaussian.mean, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+        self.assertAlmostEqual(3.0, gaussian.stdev, None, None, GaussianDistributionTest.ERROR_TOLERANCE)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testArrayFunctions(self):
+        xs = [x / 8.0 for x in range(-80, 81)]
+        for scalar_function, array_function in ((Gaussian.at, Gaussian.at_array),
+                                                (Gaussian.cumulative_to, Gaussian.cumulative_to_array),
+                                                (Gaussian.error_function_cumulative_to,
+                                                 Gaussian.error_function_cumulative_to_array)):
+            for x, answer in zip(xs, array_function(xs)):
+                self.assertAlmostEqual(scalar_function(x), answer, None, None, 1e-12)
+
+        ps = [0.0, 1e-300, 1e-12] + [p / 64.0 for p in range(1, 128)] + [2.0 - 1e-12, 2.0, 2.5]
+        for p, answer in zip(ps, Gaussian.inverse_error_function_cumulative_to_array(ps)):
+            self.assertAlmostEqual(Gaussian.inverse_error_function_cumulative_to(p), answer, None, None, 1e-12)
+        for p, answer in zip(ps[1:-3], Gaussian.inverse_cumulative_to_array([p / 2.0 for p in ps[1:-3]], 25.0, 3.0)):
+            self.assertAlmostEqual(Gaussian.inverse_cumulative_to(p / 2.0, 25.0, 3.0), answer, None, None, 1e-12)
+
 
 if __name__ == "__main__":
     unittest.main()
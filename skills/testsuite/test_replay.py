@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from skills import Match, Player, Team
+from skills.elo import EloCalculator, EloGameInfo
+from skills.glicko import GlickoCalculator, GlickoGameInfo
+from skills.replay import (
+    MatchRecord,
+    ParallelReplay,
+    Replay,
+    ReplayError,
+    match_waves,
+    read_csv,
+    read_json_lines,
+    )
+from skills.store import RatingStore
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    TwoPlayerTrueSkillCalculator,
+    TwoTeamTrueSkillCalculator,
+    )
+
+
+MATCHES = [
+    ([[1], [2]], [1, 2], 1),
+    ([[3], [1]], [1, 2], 1),
+    ([[2], [3]], [1, 1], 1),
+    ([[4], [1]], [2, 1], 2),
+    ([[2], [4]], [1, 2], 2),
+    ([[3], [2]], [2, 1], 3),
+    ([[1], [3]], [1, 2], 3),
+    ([[4], [2]], [1, 2], 3),
+    ]
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_json_lines(self, name='matches.jsonl'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as log:
+            for teams, rank, rating_period in MATCHES:
+                log.write(json.dumps({'teams': teams, 'rank': rank, 'rating_period': rating_period}) + '\n')
+        return path
+
+    def write_csv(self, name='matches.csv'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as log:
+            log.write('match_id,player_id,team,rank,rating_period\n')
+            for match_id, (teams, rank, rating_period) in enumerate(MATCHES):
+                for team, players in enumerate(teams):
+                    for player_id in players:
+                        log.write('%d,%d,%d,%d,%d\n' % (match_id, player_id, team, rank[team], rating_period))
+        return path
+
+    def expected_elo(self):
+        calculator = EloCalculator()
+        game_info = EloGameInfo()
+        ratings = {}
+        for teams, rank, rating_period in MATCHES:
+            match = Match([Team({Player(player_id): ratings.get(player_id, game_info.default_rating())})
+                           for team in teams for player_id in team], list(rank))
+            for player, rating in calculator.new_ratings(match, game_info).player_rating():
+                ratings[player.player_id] = rating
+        return ratings
+
+    def assertStore(self, expected, store):
+        self.assertEqual(sorted(expected), sorted(store))
+        for player_id, rating in expected.items():
+            self.assertAlmostEqual(rating.mean, store[player_id].mean, 10)
+
+    def test_readers(self):
+        json_records = list(read_json_lines(self.write_json_lines()))
+        csv_records = list(read_csv(self.write_csv()))
+        self.assertEqual([record for record, offset in json_records],
+                         [record for record, offset in csv_records])
+        self.assertEqual([[(3, 1.0)], [(1, 1.0)]], json_records[1][0].teams)
+
+        # reading from an offset continues with the next match
+        offset = csv_records[2][1]
+        self.assertEqual(csv_records[3:], list(read_csv(self.write_csv(), offset)))
+        offset = json_records[2][1]
+        self.assertEqual(json_records[3:], list(read_json_lines(self.write_json_lines(), offset)))
+
+    def test_elo(self):
+        expected = self.expected_elo()
+        for path in (self.write_json_lines(), self.write_csv()):
+            store = RatingStore()
+            self.assertEqual(len(MATCHES), Replay(EloCalculator(), store, EloGameInfo()).run(path))
+            self.assertStore(expected, store)
+
+    def test_glicko(self):
+        calculator = GlickoCalculator()
+        game_info = GlickoGameInfo()
+        ratings = {}
+        for period in (1, 2, 3):
+            period_ratings = {}
+            period_players = {}
+            matches = []
+            for teams, rank, rating_period in MATCHES:
+                if rating_period == period:
+                    for team in teams:
+                        for player_id in team:
+                            if player_id not in period_ratings:
+                                period_ratings[player_id] = ratings.get(player_id, game_info.default_rating())
+                                period_players[player_id] = Player(player_id)
+                    matches.append(Match([Team({period_players[player_id]: period_ratings[player_id]})
+                                          for team in teams for player_id in team], list(rank)))
+            for player, rating in calculator.new_ratings(matches, period, game_info).player_rating():
+                ratings[player.player_id] = rating
+
+        store = RatingStore()
+        Replay(GlickoCalculator(), store, game_info).run(self.write_csv())
+        self.assertStore(expected=ratings, store=store)
+        for player_id, rating in ratings.items():
+            self.assertAlmostEqual(rating.stdev, store[player_id].stdev, 10)
+
+        entries = [(record._replace(rating_period=None), offset) for record, offset in read_csv(self.write_csv())]
+        self.assertRaises(ReplayError, Replay(calculator, RatingStore(), game_info).replay, entries)
+
+    def test_resume(self):
+        path = self.write_json_lines()
+        checkpoint_path = os.path.join(self.directory, 'replay.checkpoint')
+
+        # replay only part of the log, as if interrupted
+        store = RatingStore(os.path.join(self.directory, 'ratings.store'))
+        replay = Replay(EloCalculator(), store, EloGameInfo(), checkpoint_path, checkpoint_interval=2)
+        entries = read_json_lines(path)
+        replay.replay([next(entries) for index in range(5)], path)
+        store.close()
+        with open(checkpoint_path) as checkpoint:
+            self.assertEqual(5, json.load(checkpoint)['matches'])
+        self.assertEqual(1, len([name for name in os.listdir(self.directory) if name.endswith('.store')
+                                 and name.startswith('replay')]))
+
+        store = RatingStore(os.path.join(self.directory, 'ratings.store'))
+        replay = Replay(EloCalculator(), store, EloGameInfo(), checkpoint_path, checkpoint_interval=2)
+        self.assertEqual(len(MATCHES), replay.run(path))
+        self.assertStore(self.expected_elo(), store)
+        store.close()
+
+        self.assertRaises(ReplayError, Replay(EloCalculator(), RatingStore(), EloGameInfo(),
+                                              checkpoint_path).run, self.write_csv())
+
+    def test_match_waves(self):
+        records = [MatchRecord([[(player_a, 1.0)], [(player_b, 1.0)]], [1, 2], None)
+                   for player_a, player_b in [(1, 2), (3, 4), (1, 3), (5, 6), (2, 4), (1, 5)]]
+        waves = match_waves(records)
+        self.assertEqual([[records[0], records[1], records[3]], [records[2], records[4]], [records[5]]], waves)
+
+    def test_parallel(self):
+        generator = random.Random(7)
+        path = os.path.join(self.directory, 'matches.jsonl')
+        shapes = [(TwoPlayerTrueSkillCalculator(), 1, 2),
+                  (TwoTeamTrueSkillCalculator(), 3, 2),
+                  (FactorGraphTrueSkillCalculator(), 2, 3)]
+        for calculator, team_size, teams in shapes:
+            with open(path, 'w') as log:
+                for index in range(120):
+                    players = generator.sample(range(40), team_size * teams)
+                    log.write(json.dumps({'teams': [players[team * team_size:(team + 1) * team_size]
+                                                    for team in range(teams)],
+                                          'rank': [generator.randint(1, teams) for team in range(teams)]}) + '\n')
+
+            expected = RatingStore()
+            Replay(calculator, expected, TrueSkillGameInfo()).run(path)
+            store = RatingStore()
+            replay = ParallelReplay(calculator, store, TrueSkillGameInfo(),
+                                    processes=2, window=50, chunk_size=4)
+            self.assertEqual(120, replay.run(path))
+            self.assertEqual(sorted(expected), sorted(store))
+            for player_id in expected:
+                self.assertEqual((expected[player_id].mean, expected[player_id].stdev),
+                                 (store[player_id].mean, store[player_id].stdev))
+
+        self.assertRaises(ReplayError, ParallelReplay, GlickoCalculator(), RatingStore(), GlickoGameInfo())
+        self.assertRaises(ReplayError, ParallelReplay, EloCalculator(), RatingStore(), EloGameInfo())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import random
+import unittest
+
+from skills.elo import EloCalculator, EloGameInfo
+from skills.glicko import Glicko2Calculator, Glicko2GameInfo, GlickoCalculator, GlickoGameInfo
+from skills.replay import MatchRecord, ReplayError
+from skills.rerating import RatingHistory, same_rating
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    TwoPlayerTrueSkillCalculator,
+    )
+
+
+def one_on_one(first, second, rank, rating_period=None):
+    return MatchRecord([[(first, 1.0)], [(second, 1.0)]], rank, rating_period)
+
+
+class RatingHistoryTest(unittest.TestCase):
+
+    def random_record(self, generator, rating_period, total_players=30):
+        first, second = generator.sample(range(total_players), 2)
+        return one_on_one(first, second, generator.choice([[1, 2], [2, 1], [1, 1]]), rating_period)
+
+    def assertCorrections(self, calculator, game_info, total_matches=200, matches_per_period=10):
+        generator = random.Random(1)
+        records = [self.random_record(generator, number // matches_per_period + 1)
+                   for number in range(total_matches)]
+        history = RatingHistory(calculator, game_info)
+        for record in records:
+            history.add(record)
+
+        for correction in range(10):
+            match_number = generator.randrange(total_matches)
+            rating_period = match_number // matches_per_period + 1
+            if correction % 3 == 0:
+                records[match_number] = None
+                history.void(match_number)
+            else:
+                records[match_number] = self.random_record(generator, rating_period)
+                history.correct(match_number, records[match_number])
+
+            expected = RatingHistory(calculator, game_info)
+            for record in records:
+                if record is not None:
+                    expected.add(record)
+            for player_id in range(30):
+                self.assertAlmostEqual(expected.rating(player_id).mean, history.rating(player_id).mean, 10)
+                self.assertTrue(same_rating(expected.rating(player_id), history.rating(player_id), 1e-10))
+
+    def test_elo(self):
+        self.assertCorrections(EloCalculator(), EloGameInfo())
+
+    def test_trueskill(self):
+        self.assertCorrections(TwoPlayerTrueSkillCalculator(), TrueSkillGameInfo())
+        self.assertCorrections(FactorGraphTrueSkillCalculator(), TrueSkillGameInfo(), total_matches=60)
+
+    def test_glicko(self):
+        self.assertCorrections(GlickoCalculator(), GlickoGameInfo())
+        self.assertCorrections(Glicko2Calculator(), Glicko2GameInfo())
+        history = RatingHistory(GlickoCalculator(), GlickoGameInfo())
+        history.add(one_on_one(1, 2, [1, 2], 1))
+        self.assertRaises(ReplayError, history.add, one_on_one(1, 2, [1, 2], None))
+        self.assertRaises(ReplayError, history.correct, 0, one_on_one(1, 2, [1, 2], 2))
+
+    def test_frontier(self):
+        history = RatingHistory(TwoPlayerTrueSkillCalculator(), TrueSkillGameInfo())
+        for first in range(0, 20, 2):
+            history.add(one_on_one(first, first + 1, [1, 2]))
+        history.add(one_on_one(0, 2, [1, 2]))
+        history.add(one_on_one(2, 4, [1, 2]))
+        history.add(one_on_one(8, 10, [1, 2]))
+        # only the corrected match, 0 v 2 and, through player 2, 2 v 4 are rated again
+        self.assertEqual(3, history.correct(0, one_on_one(0, 1, [2, 1])))
+        self.assertEqual(1, history.correct(12, one_on_one(8, 10, [2, 1])))
+        self.assertEqual(4, history.rerated_events)
+        self.assertTrue(history.rating(1).mean > history.rating(0).mean)
+        self.assertEqual(13, len(history))
+        self.assertEqual([2, 1], history[0].rank)
+
+
+if __name__ == "__main__":
+    unittest.main()
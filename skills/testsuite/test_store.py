@@ -0,0 +1,98 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from skills import Match
+from skills.elo import EloCalculator, EloGameInfo, EloRating
+from skills.glicko import GlickoRating, Glicko2Rating
+from skills.store import RatingStore, RatingStoreError
+
+
+class RatingStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ratings.store')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_views(self):
+        store = RatingStore(capacity=2)
+        store[10] = GlickoRating(1500.0, 350.0, 3)
+        store[20] = EloRating(1200.0, 32.0)
+        store[30] = EloRating(1300.0)
+        self.assertEqual(3, len(store))
+        self.assertTrue(20 in store)
+        self.assertFalse(40 in store)
+
+        glicko = store[10]
+        self.assertEqual((1500.0, 350.0, 3), (glicko.mean, glicko.stdev, glicko.last_rating_period))
+        self.assertFalse(hasattr(glicko, 'k_factor'))
+        self.assertEqual(32.0, store[20].k_factor)
+        self.assertFalse(hasattr(store[30], 'k_factor'))
+        self.assertFalse(hasattr(store[30], 'stdev'))
+        self.assertEqual(None, store[30].last_rating_period)
+
+        glicko.mean = 1510.0
+        self.assertEqual(1510.0, store[10].mean)
+        self.assertRaises(KeyError, lambda: store[40])
+        self.assertRaises(RatingStoreError, store.set, 'alice', EloRating(1200.0))
+        self.assertRaises(RatingStoreError, store.set, 2 ** 63, EloRating(1200.0))
+        self.assertEqual(3, len(store))
+
+    def test_persistence(self):
+        with RatingStore(self.path, capacity=1) as store:
+            for player_id in range(100):
+                store[player_id * 7] = GlickoRating(1500.0 + player_id, 50.0, player_id)
+
+        with RatingStore(self.path) as store:
+            self.assertEqual(100, len(store))
+            self.assertEqual(1542.0, store[42 * 7].mean)
+            self.assertEqual(42, store[42 * 7].last_rating_period)
+            self.assertEqual([player_id * 7 for player_id in range(100)],
+                             list(store.column('player_ids')))
+
+        # stores of version 1 have no volatilities column
+        with open(self.path, 'r+b') as store_file:
+            store_file.seek(4)
+            store_file.write(struct.pack('<I', 1))
+        self.assertRaises(RatingStoreError, RatingStore, self.path)
+        with open(self.path, 'r+b') as store_file:
+            store_file.write(b'JUNK')
+        self.assertRaises(RatingStoreError, RatingStore, self.path)
+
+    def test_save_restore(self):
+        store = RatingStore(self.path, capacity=2)
+        store[1] = Glicko2Rating(1500.0, 200.0, 1, 0.06)
+        store[2] = EloRating(1200.0)
+        copy_path = os.path.join(self.directory, 'copy.store')
+        store.save(copy_path)
+
+        for player_id in range(3, 10):
+            store[player_id] = EloRating(1000.0)
+        store[1].volatility = 0.07
+        store.restore(copy_path)
+        self.assertEqual([1, 2], sorted(store))
+        self.assertEqual(0.06, store[1].volatility)
+        self.assertFalse(hasattr(store[2], 'volatility'))
+        store.close()
+
+        with RatingStore(copy_path) as copy:
+            self.assertEqual(200.0, copy[1].stdev)
+
+    def test_calculator(self):
+        calculator = EloCalculator()
+        store = RatingStore()
+        store[1] = EloRating(1200.0)
+        store[2] = EloRating(1000.0)
+        new_ratings = calculator.new_ratings(Match([{1: store[1]}, {2: store[2]}], [1, 2]), EloGameInfo(1200, 200))
+        store.update(new_ratings)
+        self.assertEqual(new_ratings.rating_by_id(1).mean, store[1].mean)
+        self.assertEqual(new_ratings.rating_by_id(2).mean, store[2].mean)
+
+
+if __name__ == "__main__":
+    unittest.main()
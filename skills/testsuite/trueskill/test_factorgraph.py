@@ -1,6 +1,14 @@
 import unittest
 
-from skills.trueskill import FactorGraphTrueSkillCalculator
+from skills import Match
+
+from skills import factorgraph
+
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillFactorGraph,
+    TrueSkillGameInfo,
+    )
 
 from skills.testsuite.trueskill import (
     TwoPlayerCalculatorTests,
@@ -19,6 +27,148 @@ class FactorGraphTrueSkillCalculatorTest(unittest.TestCase,
     def setUp(self):
         self.calculator = FactorGraphTrueSkillCalculator()
 
+    def test_match_quality_matches_dense(self):
+        game_info = TrueSkillGameInfo()
+        teams = Match([{1: (25.0, 8.0),
+                        (2, 0.5): (30.0, 3.0)},
+                       {3: (20.0, 5.0)},
+                       {4: (28.0, 7.0),
+                        5: (22.0, 6.0),
+                        (6, 0.25): (35.0, 2.0)},
+                       {7: (18.0, 1.0)}],
+                      rank=[1, 2, 3, 4])
+        dense = self.calculator.dense_match_quality(teams, game_info)
+        self.assertAlmostEqual(self.calculator.match_quality(teams, game_info, dense=True),
+                               self.calculator.match_quality(teams, game_info),
+                               places=12)
+        self.assertAlmostEqual(dense, self.calculator.match_quality(teams, game_info), places=12)
+
+    def test_cached_graph_reuse(self):
+        game_info = TrueSkillGameInfo()
+        first = Match([{1: (25.0, 8.0), 2: (30.0, 3.0)},
+                       {3: (20.0, 5.0)},
+                       {4: (28.0, 7.0)}],
+                      rank=[1, 2, 2])
+        second = Match([{5: (18.0, 2.0), 6: (33.0, 6.0)},
+                        {7: (26.0, 4.0)},
+                        {8: (21.0, 8.0)}],
+                       rank=[1, 2, 2])
+        self.calculator.new_ratings(first, game_info)
+        reused = self.calculator.new_ratings(second, game_info)
+        fresh = FactorGraphTrueSkillCalculator().new_ratings(second, game_info)
+        for player_id in range(5, 9):
+            self.assertEqual(repr(fresh.rating_by_id(player_id)),
+                             repr(reused.rating_by_id(player_id)))
+
+    def test_compiled_schedule_matches_visit(self):
+        game_info = TrueSkillGameInfo()
+        teams = Match([{1: (25.0, 8.0)},
+                       {2: (30.0, 3.0)},
+                       {3: (20.0, 5.0)},
+                       {4: (28.0, 7.0)}],
+                      rank=[1, 2, 2, 3])
+        visited = TrueSkillFactorGraph(teams, teams.rank, game_info)
+        visited.build_graph()
+        visited.create_full_schedule().visit()
+        compiled = TrueSkillFactorGraph(teams, teams.rank, game_info)
+        compiled.build_graph()
+        compiled.run_schedule()
+        for player_id in range(1, 5):
+            self.assertEqual(repr(visited.updated_ratings().rating_by_id(player_id)),
+                             repr(compiled.updated_ratings().rating_by_id(player_id)))
+
+    def test_lazy_names(self):
+        game_info = TrueSkillGameInfo()
+        teams = Match([{1: (25.0, 8.0), (2, 0.5): (30.0, 3.0)},
+                       {3: (20.0, 5.0)},
+                       {4: (28.0, 7.0)}],
+                      rank=[1, 2, 2])
+
+        def graph_names():
+            factor_graph = TrueSkillFactorGraph(teams, teams.rank, game_info)
+            factor_graph.build_graph()
+            schedule = factor_graph.create_full_schedule()
+            factors = [factor for layer in factor_graph.layers for factor in layer.local_factors()]
+            lazy = [factor._name is None for factor in factors]
+            names = [str(factor) for factor in factors]
+            names.extend(str(message) for factor in factors for message in factor.messages)
+            names.extend(str(variable) for factor in factors for variable in factor.variables)
+            schedules = [schedule]
+            while schedules:
+                current = schedules.pop()
+                names.append(str(current))
+                schedules.extend(getattr(current, 'schedules', []))
+                if hasattr(current, 'schedule_to_loop'):
+                    schedules.append(current.schedule_to_loop)
+            return lazy, names
+
+        lazy, lazy_names = graph_names()
+        self.assertTrue(all(lazy))
+        factorgraph.set_eager_names()
+        try:
+            eager, eager_names = graph_names()
+        finally:
+            factorgraph.set_eager_names(False)
+        self.assertFalse(any(eager))
+        self.assertEqual(eager_names, lazy_names)
+        self.assertIn("Variable[Team[1, 2]'s performance] = 1.00*[Variable[1's performance]] + 0.50*[Variable[2's performance]]",
+                      lazy_names)
+
+    def test_new_ratings_batch(self):
+        game_info = TrueSkillGameInfo()
+
+        def matches():
+            return [Match([{1: (25.0, 8.0), 2: (30.0, 3.0)},
+                           {3: (20.0, 5.0)},
+                           {4: (28.0, 7.0)}],
+                          rank=[1, 2, 2]),
+                    Match([{5: (25.0, 8.333)}, {6: (25.0, 8.333)}], rank=[2, 1]),
+                    Match([{7: (18.0, 2.0), 8: (33.0, 6.0)},
+                           {9: (40.0, 4.0)},
+                           {10: (21.0, 8.0)}],
+                          rank=[1, 2, 2]),
+                    Match([{11: (10.0, 1.0)}, {12: (40.0, 1.0)}], rank=[1, 1])]
+
+        expected = [self.calculator.new_ratings(teams, game_info) for teams in matches()]
+        actual = self.calculator.new_ratings_batch(matches(), game_info)
+        self.assertEqual(len(expected), len(actual))
+        player_id = 1
+        for expected_ratings, actual_ratings in zip(expected, actual):
+            for _ in expected_ratings.player_rating():
+                self.assertAlmostEqual(expected_ratings.rating_by_id(player_id).mean,
+                                       actual_ratings.rating_by_id(player_id).mean, places=10)
+                self.assertAlmostEqual(expected_ratings.rating_by_id(player_id).stdev,
+                                       actual_ratings.rating_by_id(player_id).stdev, places=10)
+                player_id += 1
+
+
+
+class ArrayFactorGraphTrueSkillCalculatorTest(unittest.TestCase,
+                                              TwoPlayerCalculatorTests,
+                                              TwoTeamCalculatorTests,
+                                              MultipleTeamCalculatorTests,
+                                              PartialPlayCalculatorTests):
+
+    def setUp(self):
+        self.calculator = FactorGraphTrueSkillCalculator(FactorGraphTrueSkillCalculator.ARRAY_BACKEND)
+
+    def test_matches_object_backend(self):
+        game_info = TrueSkillGameInfo()
+        teams = Match([{1: (25.0, 8.0),
+                        (2, 0.5): (30.0, 3.0)},
+                       {3: (20.0, 5.0)},
+                       {4: (28.0, 7.0)},
+                       {5: (22.0, 6.0),
+                        6: (35.0, 2.0)}],
+                      rank=[1, 2, 2, 3])
+        expected = FactorGraphTrueSkillCalculator().new_ratings(teams, game_info)
+        actual = self.calculator.new_ratings(teams, game_info)
+        for player_id in range(1, 7):
+            self.assertAlmostEqual(expected.rating_by_id(player_id).mean,
+                                   actual.rating_by_id(player_id).mean, places=10)
+            self.assertAlmostEqual(expected.rating_by_id(player_id).stdev,
+                                   actual.rating_by_id(player_id).stdev, places=10)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+import random
+import unittest
+
+from skills import GaussianRating, Match, Player, Team
+from skills.replay import MatchRecord
+from skills.trueskill import (
+    FactorGraphTrueSkillCalculator,
+    TrueSkillGameInfo,
+    TwoPlayerTrueSkillCalculator,
+    )
+from skills.trueskill.history import HistoryError, TrueSkillThroughTime
+
+
+def one_on_one(winner, loser, rating_period=None):
+    return MatchRecord([[(winner, 1.0)], [(loser, 1.0)]], [1, 2], rating_period)
+
+
+def history(total_players=12, total_periods=20, matches_per_period=4, seed=1):
+    generator = random.Random(seed)
+    skills = [generator.gauss(25.0, 4.0) for player in range(total_players)]
+    records = []
+    for rating_period in range(total_periods):
+        for match in range(matches_per_period):
+            first, second = generator.sample(range(total_players), 2)
+            if generator.gauss(skills[first], 25.0 / 6) < generator.gauss(skills[second], 25.0 / 6):
+                first, second = second, first
+            records.append(one_on_one(first, second, rating_period))
+    return records
+
+
+class TrueSkillThroughTimeTest(unittest.TestCase):
+
+    def test_single_match(self):
+        ratings = TrueSkillThroughTime().run([one_on_one('a', 'b')])
+        game_info = TrueSkillGameInfo(dynamics_factor=0.0)
+        match = Match([Team({Player('a'): game_info.default_rating()}),
+                       Team({Player('b'): game_info.default_rating()})], [1, 2])
+        expected = FactorGraphTrueSkillCalculator().new_ratings(match, game_info)
+        for player_id in ('a', 'b'):
+            self.assertAlmostEqual(expected.rating_by_id(player_id).mean, ratings[player_id].mean)
+            self.assertAlmostEqual(expected.rating_by_id(player_id).stdev, ratings[player_id].stdev)
+
+    def test_smoothing(self):
+        # a beats b, b then beats c twice, so a's first rating rises in hindsight
+        records = [one_on_one('a', 'b', 1), one_on_one('b', 'c', 2), one_on_one('b', 'c', 3)]
+        smoothed = dict(((rating_period, player_id), rating) for rating_period, player_id, rating in
+                        TrueSkillThroughTime().smooth(records))
+        self.assertEqual([1, 1, 2, 2, 3, 3], sorted(rating_period for rating_period, player_id in smoothed))
+        online = TrueSkillThroughTime().run(records[:1])
+        self.assertTrue(smoothed[(1, 'a')].mean > online['a'].mean)
+        self.assertTrue(smoothed[(1, 'b')].mean > online['b'].mean)
+
+    def test_windows(self):
+        records = history()
+        full = TrueSkillThroughTime(max_iterations=100)
+        ratings = full.run(records)
+        self.assertEqual(1, len(full.iterations))
+        whole = TrueSkillThroughTime(window=20, overlap=0, max_iterations=100)
+        whole_ratings = whole.run(records)
+        self.assertEqual([(rating.mean, rating.stdev) for player_id, rating in sorted(ratings.items())],
+                         [(rating.mean, rating.stdev) for player_id, rating in sorted(whole_ratings.items())])
+
+        windowed = TrueSkillThroughTime(window=5, overlap=5, max_iterations=100)
+        windowed_ratings = windowed.run(records)
+        self.assertEqual(4, len(windowed.iterations))
+        self.assertEqual(sorted(ratings), sorted(windowed_ratings))
+        for player_id, rating in ratings.items():
+            self.assertAlmostEqual(rating.mean, windowed_ratings[player_id].mean, None, None, 2.0)
+
+    def test_calculators(self):
+        records = history(total_periods=5)
+        ratings = TrueSkillThroughTime().run(records)
+        two_player = TrueSkillThroughTime(calculator=TwoPlayerTrueSkillCalculator()).run(records)
+        for player_id, rating in ratings.items():
+            self.assertAlmostEqual(rating.mean, two_player[player_id].mean)
+            self.assertAlmostEqual(rating.stdev, two_player[player_id].stdev)
+
+    def test_teams_and_periods(self):
+        records = [MatchRecord([[(1, 1.0), (2, 0.5)], [(3, 1.0), (4, 1.0)], [(5, 1.0)]], [2, 1, 2], None),
+                   MatchRecord([[(1, 1.0)], [(5, 1.0)]], [1, 2], None)]
+        smoothed = list(TrueSkillThroughTime().smooth(records))
+        self.assertEqual([0] * 5 + [1] * 2, [rating_period for rating_period, player_id, rating in smoothed])
+        self.assertTrue(all(isinstance(rating, GaussianRating) for rating_period, player_id, rating in smoothed))
+        self.assertRaises(HistoryError, TrueSkillThroughTime().run, [one_on_one(1, 2, 5), one_on_one(1, 2, 4)])
+        self.assertRaises(ValueError, TrueSkillThroughTime, TrueSkillGameInfo(dynamics_factor=0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
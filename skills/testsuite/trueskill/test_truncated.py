@@ -0,0 +1,41 @@
+import unittest
+from skills.trueskill.truncated import (
+    TruncatedTable,
+    v_exceeds_margin,
+    v_within_margin,
+    w_exceeds_margin,
+    w_within_margin,
+    vw_exceeds_margin,
+    vw_within_margin,
+    )
+
+
+class TruncatedTest(unittest.TestCase):
+
+    POINTS = [(difference / 4.0, margin / 4.0)
+              for difference in range(-160, 161, 7)
+              for margin in range(0, 12, 3)]
+
+    def test_vw_exceeds_margin(self):
+        for difference, margin in TruncatedTest.POINTS:
+            self.assertEqual((v_exceeds_margin(difference, margin), w_exceeds_margin(difference, margin)),
+                             vw_exceeds_margin(difference, margin))
+
+    def test_vw_within_margin(self):
+        for difference, margin in TruncatedTest.POINTS:
+            self.assertEqual((v_within_margin(difference, margin), w_within_margin(difference, margin)),
+                             vw_within_margin(difference, margin))
+
+    def test_table(self):
+        table = TruncatedTable()
+        self.assertTrue(table.max_error < 1e-7)
+        for difference, margin in TruncatedTest.POINTS:
+            for expected, actual in zip(vw_exceeds_margin(difference, margin),
+                                        table.vw_exceeds_margin(difference, margin)):
+                self.assertAlmostEqual(expected, actual, None, None, table.max_error * 1.01)
+            self.assertEqual(vw_within_margin(difference, margin),
+                             table.vw_within_margin(difference, margin))
+
+
+if __name__ == "__main__":
+    unittest.main()
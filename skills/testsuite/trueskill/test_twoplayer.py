@@ -1,6 +1,11 @@
 import unittest
+from skills import Match
 from skills.testsuite.trueskill import TwoPlayerCalculatorTests
-from skills.trueskill import TwoPlayerTrueSkillCalculator
+from skills.trueskill import (
+    TrueSkillGameInfo,
+    TruncatedTable,
+    TwoPlayerTrueSkillCalculator,
+    )
 
 
 class TwoPlayerTrueSkillCalculatorTest(unittest.TestCase, TwoPlayerCalculatorTests):
@@ -8,6 +13,32 @@ class TwoPlayerTrueSkillCalculatorTest(unittest.TestCase, TwoPlayerCalculatorTes
     def setUp(self):
         self.calculator = TwoPlayerTrueSkillCalculator()
 
+    def test_match_quality_batch(self):
+        game_info = TrueSkillGameInfo()
+        ratings = [((25.0, 25.0 / 3), (25.0, 25.0 / 3)),
+                   ((25.0, 25.0 / 3), (50.0, 25.0 / 2)),
+                   ((30.0, 2.0), (20.0, 4.0))]
+        means = [rating[0] for match in ratings for rating in match]
+        stdevs = [rating[1] for match in ratings for rating in match]
+        qualities = self.calculator.match_quality_batch(means, stdevs, game_info=game_info)
+        self.assertEqual(len(ratings), len(qualities))
+        for (rating1, rating2), quality in zip(ratings, qualities):
+            teams = Match([{1: rating1}, {2: rating2}], [1, 2])
+            self.assertAlmostEqual(self.calculator.match_quality(teams, game_info), quality, places=12)
+
+    def test_truncation_table(self):
+        game_info = TrueSkillGameInfo()
+        table = TruncatedTable()
+        tabled_calculator = TwoPlayerTrueSkillCalculator(table)
+        for rank in ([1, 2], [1, 1]):
+            expected = self.calculator.new_ratings(Match([{1: (30.0, 6.0)}, {2: (20.0, 4.0)}], rank), game_info)
+            actual = tabled_calculator.new_ratings(Match([{1: (30.0, 6.0)}, {2: (20.0, 4.0)}], rank), game_info)
+            for player_id in (1, 2):
+                self.assertAlmostEqual(expected.rating_by_id(player_id).mean,
+                                       actual.rating_by_id(player_id).mean, places=6)
+                self.assertAlmostEqual(expected.rating_by_id(player_id).stdev,
+                                       actual.rating_by_id(player_id).stdev, places=6)
+
 
 if __name__ == "__main__":
     unittest.main()
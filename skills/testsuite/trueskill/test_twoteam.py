@@ -1,5 +1,9 @@
 import unittest
-from skills.trueskill import TwoTeamTrueSkillCalculator
+from skills import Match
+from skills.trueskill import (
+    TrueSkillGameInfo,
+    TwoTeamTrueSkillCalculator,
+    )
 
 from skills.testsuite.trueskill import (
     TwoPlayerCalculatorTests,
@@ -12,6 +16,30 @@ class TwoTeamTrueSkillCalculatorTest(unittest.TestCase, TwoPlayerCalculatorTests
     def setUp(self):
         self.calculator = TwoTeamTrueSkillCalculator()
 
+    def test_match_quality_batch(self):
+        game_info = TrueSkillGameInfo()
+        matches = [([(25.0, 8.0), (30.0, 3.0)], [(28.0, 5.0), (20.0, 6.0)]),
+                   ([(25.0, 25.0 / 3)], [(20.0, 2.0), (22.0, 3.0), (24.0, 4.0)]),
+                   ([(40.0, 1.0), (10.0, 1.0), (25.0, 1.0)], [(26.0, 9.0)])]
+        means, stdevs, team_offsets = [], [], [0]
+        for match in matches:
+            for team in match:
+                means.extend(rating[0] for rating in team)
+                stdevs.extend(rating[1] for rating in team)
+                team_offsets.append(len(means))
+        qualities = self.calculator.match_quality_batch(means, stdevs, team_offsets, game_info)
+        self.assertEqual(len(matches), len(qualities))
+        for (team1, team2), quality in zip(matches, qualities):
+            teams = Match([dict(enumerate(team1)), dict((i + 10, rating) for i, rating in enumerate(team2))],
+                          [1, 2])
+            self.assertAlmostEqual(self.calculator.match_quality(teams, game_info), quality, places=12)
+
+    def test_match_quality_batch_validates_offsets(self):
+        self.assertRaises(ValueError, self.calculator.match_quality_batch,
+                          [25.0, 25.0, 25.0], [8.0, 8.0, 8.0], [0, 1, 1, 3])
+        self.assertRaises(ValueError, self.calculator.match_quality_batch,
+                          [25.0, 25.0, 25.0], [8.0, 8.0, 8.0], [0, 1, 2, 3])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,12 @@
+from array import array
 from math import sqrt, exp
+from threading import local
 
-from collections import Sequence
+from collections import Sequence, OrderedDict
 
 from skills import (
     Calculator,
     Match,
-    RatingFactory,
     GaussianRating,
     Team,
     WIN,
@@ -18,9 +19,14 @@ from skills.numerics import (
     Gaussian,
     Matrix,
     DiagonalMatrix,
+    float_array,
+    index_array,
+    segment_sums,
+    numpy,
     )
 
 from skills.factorgraph import (
+    CompiledSchedule,
     FactorGraph,
     VariableFactory,
     FactorList,
@@ -37,11 +43,12 @@ from skills.trueskill.layers import (
     TeamPerformancesToTeamPerformanceDifferencesLayer,
     )
 
+from skills.trueskill.arraygraph import TrueSkillArrayGraph
+
 from skills.trueskill.truncated import (
-    v_exceeds_margin_scaled,
-    v_within_margin_scaled,
-    w_exceeds_margin_scaled,
-    w_within_margin_scaled,
+    TruncatedTable,
+    vw_exceeds_margin_scaled,
+    vw_within_margin_scaled,
     )
 
 
@@ -79,7 +86,9 @@ class TrueSkillGameInfo(object):
 
     @staticmethod
     def ensure_game_info(game_info):
-        if (not hasattr(game_info, 'initial_mean') or
+        if game_info is None:
+            return TrueSkillGameInfo()
+        elif (not hasattr(game_info, 'initial_mean') or
                 not hasattr(game_info, 'initial_stdev') or
                 not hasattr(game_info, 'beta') or
                 not hasattr(game_info, 'dynamics_factor') or
@@ -100,26 +109,88 @@ class TrueSkillGameInfo(object):
             return game_info
 
 
+def two_team_match_quality_batch(calculator, means, stdevs, team_offsets, game_info):
+    '''
+    Calculates the two team match quality of many matches at once
+
+    means and stdevs hold the ratings of every player laid out team after
+    team, team k being the players from team_offsets[k] up to
+    team_offsets[k + 1].  Match i is made of teams 2 * i and 2 * i + 1.
+    '''
+    game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+    means = float_array(means)
+    stdevs = float_array(stdevs)
+    team_offsets = index_array(team_offsets)
+
+    if len(team_offsets) % 2 != 1:
+        raise ValueError("team count is not in {0}"
+                         .format(calculator.total_teams_allowed))
+    if team_offsets[0] != 0 or team_offsets[-1] != len(means) or len(means) != len(stdevs):
+        raise ValueError("team_offsets do not match the number of ratings")
+
+    beta_squared = game_info.beta ** 2.0
+
+    if numpy is not None:
+        team_sizes = numpy.diff(team_offsets)
+        calculator.validate_batch_team_sizes(team_sizes)
+        team_mean_sums = segment_sums(means, team_offsets)
+        team_variance_sums = segment_sums(stdevs * stdevs, team_offsets)
+
+        total_players = team_sizes[0::2] + team_sizes[1::2]
+        performance_variance = total_players * beta_squared
+        denominator = (performance_variance +
+                       team_variance_sums[0::2] + team_variance_sums[1::2])
+        mean_difference = team_mean_sums[0::2] - team_mean_sums[1::2]
+
+        return (numpy.sqrt(performance_variance / denominator) *
+                numpy.exp(-1.0 * mean_difference ** 2.0 / (2.0 * denominator)))
+
+    team_sizes = index_array([team_offsets[k + 1] - team_offsets[k]
+                              for k in range(len(team_offsets) - 1)])
+    calculator.validate_batch_team_sizes(team_sizes)
+    team_mean_sums = segment_sums(means, team_offsets)
+    team_variance_sums = segment_sums(array('d', [stdev * stdev for stdev in stdevs]),
+                                      team_offsets)
+
+    result = array('d')
+    for i in range(0, len(team_sizes), 2):
+        performance_variance = (team_sizes[i] + team_sizes[i + 1]) * beta_squared
+        denominator = (performance_variance +
+                       team_variance_sums[i] + team_variance_sums[i + 1])
+        mean_difference = team_mean_sums[i] - team_mean_sums[i + 1]
+        result.append(sqrt(performance_variance / denominator) *
+                      exp(-1.0 * mean_difference ** 2.0 / (2.0 * denominator)))
+    return result
+
+
 class TwoPlayerTrueSkillCalculator(Calculator):
-    '''Implements TrueSkill calculations for one-on-one games'''
+    '''
+    Implements TrueSkill calculations for one-on-one games
+
+    truncation_table is an optional TruncatedTable used instead of the
+    exact v and w functions.
+    '''
 
     score = {WIN: 1.0,
              LOSE:-1.0,
              DRAW: 0.0}
 
-    def __init__(self):
+    rating_class = GaussianRating
+
+    def __init__(self, truncation_table=None):
         Calculator.__init__(self, Range.exactly(2), Range.exactly(1))
-        RatingFactory.rating_class = GaussianRating
+        self.truncation_table = truncation_table
 
     def new_ratings(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         # ensure sorted by rank
         teams.sort()
 
-        winner, winner_rating = teams[0].player_rating()[0]
-        loser, loser_rating = teams[1].player_rating()[0]
+        winner, winner_rating = next(iter(teams[0].items()))
+        loser, loser_rating = next(iter(teams[1].items()))
 
         return Match([Team({winner: self.new_rating(winner_rating,
                                                     loser_rating,
@@ -143,13 +214,18 @@ class TwoPlayerTrueSkillCalculator(Calculator):
             2.0 * game_info.beta ** 2.0
         )
 
+        truncation = self.truncation_table
         if comparison != DRAW:
-            v = v_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
-            w = w_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
+            if truncation is None:
+                v, w = vw_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
+            else:
+                v, w = truncation.vw_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
             rank_multiplier = TwoPlayerTrueSkillCalculator.score[comparison]
         else:
-            v = v_within_margin_scaled(mean_delta, game_info.draw_margin, c)
-            w = w_within_margin_scaled(mean_delta, game_info.draw_margin, c)
+            if truncation is None:
+                v, w = vw_within_margin_scaled(mean_delta, game_info.draw_margin, c)
+            else:
+                v, w = truncation.vw_within_margin_scaled(mean_delta, game_info.draw_margin, c)
             rank_multiplier = 1.0
 
         mean_multiplier = (self_rating.stdev ** 2.0 + game_info.dynamics_factor ** 2.0) / c
@@ -165,8 +241,9 @@ class TwoPlayerTrueSkillCalculator(Calculator):
     def match_quality(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
-        player1rating, player2rating = [team.ratings()[0] for team in teams]
+        player1rating, player2rating = [next(iter(team.values())) for team in teams]
 
         twice_beta_squared = 2.0 * game_info.beta ** 2.0
         player1sigma_squared = player1rating.stdev ** 2.0
@@ -183,24 +260,43 @@ class TwoPlayerTrueSkillCalculator(Calculator):
 
         return sqrt_part * exp_part
 
+    def match_quality_batch(self, means, stdevs, team_offsets=None, game_info=None):
+        '''
+        Calculates match quality for many one-on-one games at once
+
+        Match i is between the players at index 2 * i and 2 * i + 1 of the
+        means and stdevs arrays.  team_offsets may be given in the same layout
+        as TwoTeamTrueSkillCalculator.match_quality_batch.  Returns an array
+        with one match quality per match.
+        '''
+        if team_offsets is None:
+            team_offsets = range(len(means) + 1)
+        return two_team_match_quality_batch(self, means, stdevs, team_offsets, game_info)
+
 
 class TwoTeamTrueSkillCalculator(Calculator):
     '''
     Calculates new ratings for only two teams
     where each team has 1 or more players.
+
+    truncation_table is an optional TruncatedTable used instead of the
+    exact v and w functions.
     '''
 
     score = {WIN: 1.0,
              LOSE:-1.0,
              DRAW: 0.0}
 
-    def __init__(self):
+    rating_class = GaussianRating
+
+    def __init__(self, truncation_table=None):
         Calculator.__init__(self, Range.exactly(2), Range.at_least(1))
-        RatingFactory.rating_class = GaussianRating
+        self.truncation_table = truncation_table
 
     def new_ratings(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
         teams.sort()
 
         return Match([self.new_team_ratings(teams[0], teams[1],
@@ -225,13 +321,18 @@ class TwoTeamTrueSkillCalculator(Calculator):
         )
         tau_squared = game_info.dynamics_factor ** 2
 
+        truncation = self.truncation_table
         if self_to_other_team_comparison != DRAW:
-            v = v_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
-            w = w_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
+            if truncation is None:
+                v, w = vw_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
+            else:
+                v, w = truncation.vw_exceeds_margin_scaled(mean_delta, game_info.draw_margin, c)
             rank_multiplier = TwoTeamTrueSkillCalculator.score[self_to_other_team_comparison]
         else:
-            v = v_within_margin_scaled(mean_delta, game_info.draw_margin, c)
-            w = w_within_margin_scaled(mean_delta, game_info.draw_margin, c)
+            if truncation is None:
+                v, w = vw_within_margin_scaled(mean_delta, game_info.draw_margin, c)
+            else:
+                v, w = truncation.vw_within_margin_scaled(mean_delta, game_info.draw_margin, c)
             rank_multiplier = 1.0
 
         new_team_ratings = Team()
@@ -254,6 +355,7 @@ class TwoTeamTrueSkillCalculator(Calculator):
     def match_quality(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         team1ratings = teams[0].ratings()
         team2ratings = teams[1].ratings()
@@ -282,12 +384,25 @@ class TwoTeamTrueSkillCalculator(Calculator):
 
         return exp_part * sqrt_part
 
+    def match_quality_batch(self, means, stdevs, team_offsets, game_info=None):
+        '''
+        Calculates match quality for many two team matches at once
+
+        means and stdevs hold the ratings of every player laid out team after
+        team, team k being the players from team_offsets[k] up to
+        team_offsets[k + 1], and match i is teams 2 * i and 2 * i + 1.
+        Returns an array with one match quality per match.
+        '''
+        return two_team_match_quality_batch(self, means, stdevs, team_offsets, game_info)
+
 
 class TrueSkillFactorGraph(FactorGraph):
 
-    def __init__(self, teams, team_ranks, game_info):
+    def __init__(self, teams, team_ranks, game_info, truncation_table=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        teams = [team.ensure_ratings(GaussianRating) for team in teams]
         FactorGraph.__init__(self)
+        self.truncation_table = truncation_table
         self.prior_layer = PlayerPriorValuesToSkillsLayer(self, teams)
         self.game_info = game_info
         new_factory = VariableFactory(lambda: Gaussian.from_precision_mean(0.0, 0.0))
@@ -301,6 +416,8 @@ class TrueSkillFactorGraph(FactorGraph):
                                               TeamDifferencesComparisonLayer(self, team_ranks))
         ]
 
+        self.compiled_schedule = None
+
     def build_graph(self):
         last_output = None
 
@@ -310,9 +427,37 @@ class TrueSkillFactorGraph(FactorGraph):
             current_layer.build_layer()
             last_output = current_layer.output_variables_groups
 
+    def reset_priors(self, teams):
+        '''
+        Prepares an already built graph for another match of the same shape
+
+        Every message and variable goes back to its initial value, the prior
+        factors take the new ratings and the keyed variables the new players.
+        '''
+        dynamics_factor_squared = self.game_info.dynamics_factor ** 2
+        self.prior_layer.teams = teams
+        prior_factors = iter(self.prior_layer.local_factors())
+        skills_to_performances_layer = self.layers[1]
+        for current_team, skill_variables, performance_variables in zip(
+                teams,
+                self.prior_layer.output_variables_groups,
+                skills_to_performances_layer.output_variables_groups):
+            for current_player, skill_variable, performance_variable in zip(
+                    current_team.players(), skill_variables, performance_variables):
+                prior_rating = current_team[current_player]
+                next(prior_factors).reset_prior(prior_rating.mean,
+                                                prior_rating.stdev ** 2 + dynamics_factor_squared)
+                skill_variable.key = current_player
+                performance_variable.key = current_player
+
+        for current_layer in self.layers:
+            for local_factor in current_layer.local_factors():
+                local_factor.reset_messages()
+
     def run_schedule(self):
-        full_schedule = self.create_full_schedule()
-        full_schedule.visit()
+        if self.compiled_schedule is None:
+            self.compiled_schedule = CompiledSchedule(self.create_full_schedule())
+        self.compiled_schedule.run()
 
     def probability_of_ranking(self):
         factor_list = FactorList()
@@ -356,29 +501,193 @@ class TrueSkillFactorGraph(FactorGraph):
 class FactorGraphTrueSkillCalculator(Calculator):
     '''
     Calculates TrueSkill using a full factor graph.
+
+    Built factor graphs and their compiled schedules are cached by match
+    shape (team sizes, partial play, draws and game parameters) and reused
+    for later matches of the same shape.  The cache is kept per thread.
+
+    backend selects how messages are passed, OBJECT_BACKEND updates the
+    Gaussian objects of the factor graph and ARRAY_BACKEND runs the graph
+    over precision and precision mean arrays.  truncation_table is an
+    optional TruncatedTable used instead of the exact v and w functions.
     '''
 
-    def __init__(self):
+    MAX_CACHED_GRAPHS = 64
+    OBJECT_BACKEND = 'objects'
+    ARRAY_BACKEND = 'arrays'
+
+    rating_class = GaussianRating
+
+    def __init__(self, backend=OBJECT_BACKEND, truncation_table=None):
         Calculator.__init__(self, Range.at_least(2), Range.at_least(1), True, True)
-        RatingFactory.rating_class = GaussianRating
+        if backend not in (FactorGraphTrueSkillCalculator.OBJECT_BACKEND,
+                           FactorGraphTrueSkillCalculator.ARRAY_BACKEND):
+            raise ValueError("backend must be '%s' or '%s'" % (FactorGraphTrueSkillCalculator.OBJECT_BACKEND,
+                                                               FactorGraphTrueSkillCalculator.ARRAY_BACKEND))
+        self.backend = backend
+        self.truncation_table = truncation_table
+        self.graph_cache = local()
+
+    def __getstate__(self):
+        # cached graphs belong to the threads of this process
+        state = self.__dict__.copy()
+        del state['graph_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.graph_cache = local()
 
     def new_ratings(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
         self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
 
         # ensure sorted by rank
         teams.sort()
 
-        factor_graph = TrueSkillFactorGraph(teams, teams.rank, game_info)
-        factor_graph.build_graph()
+        factor_graph = self.factor_graph(teams, game_info)
+        if self.backend == FactorGraphTrueSkillCalculator.ARRAY_BACKEND:
+            return factor_graph.updated_ratings(teams)
+
         factor_graph.run_schedule()
 
         #probability_of_outcome = factor_graph.probability_of_ranking()
 
         return factor_graph.updated_ratings()
 
-    def match_quality(self, teams, game_info=None):
+    def new_ratings_batch(self, matches, game_info=None):
+        '''
+        Calculates new ratings for many independent matches
+
+        Matches are grouped by shape and each group runs the array graph of
+        its shape once, with one column per match, every match keeping its
+        own loop convergence.  Returns a Match of new ratings for every match
+        in matches, in order.  Without NumPy the matches are rated one at a
+        time.
+        '''
+        game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        for teams in matches:
+            self.validate_team_and_player_counts(teams)
+        matches = [self.ensure_ratings(teams) for teams in matches]
+        if numpy is None:
+            return [self.new_ratings(teams, game_info) for teams in matches]
+
+        groups = OrderedDict()
+        for index, teams in enumerate(matches):
+            # ensure sorted by rank
+            teams.sort()
+            groups.setdefault(self.match_shape(teams, game_info), []).append(index)
+
+        results = [None] * len(matches)
+        for indexes in groups.values():
+            group = [matches[index] for index in indexes]
+            factor_graph = self.factor_graph(group[0], game_info, FactorGraphTrueSkillCalculator.ARRAY_BACKEND)
+            for index, match_results in zip(indexes, factor_graph.updated_ratings_batch(group)):
+                results[index] = match_results
+
+        return results
+
+    def match_shape(self, teams, game_info):
+        return (tuple(tuple(player.partial_play_percentage for player in team.players())
+                      for team in teams),
+                tuple(teams.rank[i] == teams.rank[i + 1] for i in range(len(teams) - 1)),
+                game_info.beta,
+                game_info.dynamics_factor,
+                game_info.draw_margin)
+
+    def factor_graph(self, teams, game_info, backend=None):
+        '''
+        Returns a built factor graph for the sorted match
+
+        A cached graph of the same shape is reset with the match's priors,
+        otherwise a new graph is built and cached.  With the array backend
+        the graph is a TrueSkillArrayGraph, which takes the priors when run.
+        backend defaults to the calculator's backend.
+        '''
+        if backend is None:
+            backend = self.backend
+        try:
+            graphs = self.graph_cache.graphs
+        except AttributeError:
+            graphs = self.graph_cache.graphs = OrderedDict()
+
+        key = (backend, self.match_shape(teams, game_info))
+        factor_graph = graphs.pop(key, None)
+        if factor_graph is None:
+            factor_graph = TrueSkillFactorGraph(teams, teams.rank, game_info, self.truncation_table)
+            factor_graph.build_graph()
+            if backend == FactorGraphTrueSkillCalculator.ARRAY_BACKEND:
+                factor_graph = TrueSkillArrayGraph(factor_graph)
+            if len(graphs) >= FactorGraphTrueSkillCalculator.MAX_CACHED_GRAPHS:
+                graphs.popitem(last=False)
+        elif backend == FactorGraphTrueSkillCalculator.OBJECT_BACKEND:
+            factor_graph.reset_priors(teams)
+        graphs[key] = factor_graph
+        return factor_graph
+
+    def match_quality(self, teams, game_info=None, dense=False):
+        '''
+        Calculates match quality without building the dense matrices
+
+        The player-team assignment matrix A factors into E * B where E maps
+        players to their team with partial play weights and B takes the
+        difference of consecutive teams.  Every product of the dense formula
+        then reduces to per team sums, B' diag(c) B being the middle matrix.
+        Its determinant and quadratic form have closed forms, so the whole
+        calculation is O(players + teams).  Pass dense=True to use the
+        original matrix formulation.
+        '''
+        game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        self.validate_team_and_player_counts(teams)
+        teams = self.ensure_ratings(teams)
+        if dense:
+            return self.dense_match_quality(teams, game_info)
+
+        beta_squared = game_info.beta ** 2
+
+        team_mean_sums = []
+        team_performance_ratios = []
+        team_variance_inverses = []
+        for team in teams:
+            mean_sum = 0.0
+            weight_squared_sum = 0.0
+            variance_sum = 0.0
+            for player, rating in team.items():
+                weight = player.partial_play_percentage
+                weight_squared = weight * weight
+                mean_sum += weight * rating.mean
+                weight_squared_sum += weight_squared
+                variance_sum += weight_squared * (beta_squared + rating.stdev ** 2)
+            team_mean_sums.append(mean_sum)
+            team_performance_ratios.append(beta_squared * weight_squared_sum / variance_sum)
+            team_variance_inverses.append(1.0 / variance_sum)
+
+        # the quadratic form m' B (B' C B)^-1 B' m is the C^-1 weighted
+        # spread of the team mean sums around their weighted average
+        total_variance_inverse = sum(team_variance_inverses)
+        weighted_mean = sum(w * m for w, m in zip(team_variance_inverses, team_mean_sums)) / total_variance_inverse
+        exp_part = -0.5 * sum(w * (m - weighted_mean) ** 2
+                              for w, m in zip(team_variance_inverses, team_mean_sums))
+
+        # det(B' C B) = sum over t of the product of c_s for s != t, the ratio
+        # of determinants is built from the products of all other teams' ratios
+        total_teams = len(teams)
+        suffix_products = [1.0] * (total_teams + 1)
+        for t in reversed(range(total_teams)):
+            suffix_products[t] = suffix_products[t + 1] * team_performance_ratios[t]
+        prefix_product = 1.0
+        sqrt_part_numerator = 0.0
+        for t in range(total_teams):
+            sqrt_part_numerator += prefix_product * suffix_products[t + 1] * team_variance_inverses[t]
+            prefix_product *= team_performance_ratios[t]
+        sqrt_part = sqrt_part_numerator / total_variance_inverse
+
+        return exp(exp_part) * sqrt(sqrt_part)
+
+    def dense_match_quality(self, teams, game_info=None):
         game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        teams = self.ensure_ratings(teams)
         skills_matrix = DiagonalMatrix([rating.stdev ** 2
                                             for team in teams
                                                 for rating in team.ratings()])
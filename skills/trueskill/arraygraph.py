@@ -0,0 +1,412 @@
+'''
+TrueSkill factor graph stored as precision and precision mean arrays
+
+The graph of a match is built once with the object factor graph, then
+every variable marginal and every message gets a slot in parallel
+precision / precision mean arrays and the compiled schedule is lowered
+into index based operations on those arrays.  Running the graph for a
+match allocates the arrays and nothing else.
+'''
+
+from __future__ import division
+from math import sqrt
+
+from skills import (
+    GaussianRating,
+    Match,
+    Team,
+    )
+
+from skills.factorgraph import CompiledSchedule
+
+from skills.trueskill.factors import (
+    GaussianGreaterThanFactor,
+    GaussianLikelihoodFactor,
+    GaussianPriorFactor,
+    GaussianWeightedSumFactor,
+    GaussianWithinFactor,
+    )
+
+from skills.numerics import numpy
+
+from skills.trueskill.truncated import (
+    vw_exceeds_margin_array,
+    vw_within_margin_array,
+    )
+
+
+class TrueSkillArrayGraphError(Exception):
+    pass
+
+
+class TrueSkillArrayGraph(object):
+    '''
+    Array backed version of a built TrueSkillFactorGraph
+
+    The array graph only depends on the shape of the match it was built
+    from and can be run for any match of the same shape.
+    '''
+
+    LOOP_START = CompiledSchedule.LOOP_START
+    LOOP_END = CompiledSchedule.LOOP_END
+    PRIOR = 10
+    LIKELIHOOD = 11
+    WEIGHTED_SUM = 12
+    TRUNCATED = 13
+
+    def __init__(self, factor_graph):
+        self.game_info = factor_graph.game_info
+        self.variable_ids = {}
+        self.message_ids = {}
+        self.prior_slots = {}
+
+        for current_layer in factor_graph.layers:
+            for local_factor in current_layer.local_factors():
+                for message, variable in zip(local_factor.messages, local_factor.variables):
+                    self.message_ids.setdefault(id(message), len(self.message_ids))
+                    self.variable_ids.setdefault(id(variable), len(self.variable_ids))
+                if isinstance(local_factor, GaussianPriorFactor):
+                    self.prior_slots[id(local_factor)] = len(self.prior_slots)
+
+        self.skill_variables = [[self.variable_ids[id(variable)] for variable in team]
+                                for team in factor_graph.prior_layer.output_variables_groups]
+        self.total_variables = len(self.variable_ids)
+        self.total_messages = len(self.message_ids)
+        self.total_priors = len(self.prior_slots)
+
+        compiled_schedule = CompiledSchedule(factor_graph.create_full_schedule())
+        self.operations = [self.lower_operation(operation)
+                           for operation in compiled_schedule.operations]
+
+        # object ids are only meaningful while the object graph is alive
+        del self.variable_ids
+        del self.message_ids
+        del self.prior_slots
+
+    def lower_operation(self, operation):
+        if operation[0] != CompiledSchedule.STEP:
+            return operation
+
+        update_method, message_index = operation[1], operation[2]
+        factor = update_method.__self__
+        message_ids = [self.message_ids[id(message)] for message in factor.messages]
+        variable_ids = [self.variable_ids[id(variable)] for variable in factor.variables]
+
+        if isinstance(factor, GaussianPriorFactor):
+            return (TrueSkillArrayGraph.PRIOR,
+                    message_ids[message_index], variable_ids[message_index],
+                    self.prior_slots[id(factor)])
+        elif isinstance(factor, GaussianLikelihoodFactor):
+            i, j = message_index, 1 - message_index
+            return (TrueSkillArrayGraph.LIKELIHOOD,
+                    message_ids[i], variable_ids[i],
+                    message_ids[j], variable_ids[j],
+                    factor.precision)
+        elif isinstance(factor, GaussianWeightedSumFactor):
+            indexes = factor.variable_index_orders_for_weights[message_index]
+            return (TrueSkillArrayGraph.WEIGHTED_SUM,
+                    message_ids[indexes[0]], variable_ids[indexes[0]],
+                    tuple(message_ids[index] for index in indexes[1:]),
+                    tuple(variable_ids[index] for index in indexes[1:]),
+                    tuple(factor.weights[message_index]),
+                    tuple(factor.weights_squared[message_index]))
+        elif isinstance(factor, GaussianGreaterThanFactor):
+            return (TrueSkillArrayGraph.TRUNCATED,
+                    message_ids[message_index], variable_ids[message_index],
+                    factor.epsilon, factor.vw_function, vw_exceeds_margin_array)
+        elif isinstance(factor, GaussianWithinFactor):
+            return (TrueSkillArrayGraph.TRUNCATED,
+                    message_ids[message_index], variable_ids[message_index],
+                    factor.epsilon, factor.vw_function, vw_within_margin_array)
+        raise TrueSkillArrayGraphError("factor %s has no array implementation" % factor)
+
+    def priors(self, teams):
+        '''
+        Returns the prior precisions and precision means of the match's players
+        '''
+        dynamics_factor_squared = self.game_info.dynamics_factor ** 2
+        precisions = []
+        precision_means = []
+        for team in teams:
+            for player in team.players():
+                rating = team[player]
+                # matches the rounding of Gaussian(mean, sqrt(variance))
+                variance = sqrt(rating.stdev ** 2 + dynamics_factor_squared) ** 2.0
+                prior_precision = 1.0 / variance
+                precisions.append(prior_precision)
+                precision_means.append(prior_precision * rating.mean)
+        return precisions, precision_means
+
+    def run(self, prior_precisions, prior_precision_means):
+        '''
+        Runs the schedule and returns the marginal precision and precision mean arrays
+        '''
+        precision = [0.0] * self.total_variables
+        precision_mean = [0.0] * self.total_variables
+        message_precision = [0.0] * self.total_messages
+        message_precision_mean = [0.0] * self.total_messages
+
+        PRIOR = TrueSkillArrayGraph.PRIOR
+        LIKELIHOOD = TrueSkillArrayGraph.LIKELIHOOD
+        WEIGHTED_SUM = TrueSkillArrayGraph.WEIGHTED_SUM
+        TRUNCATED = TrueSkillArrayGraph.TRUNCATED
+        LOOP_START = TrueSkillArrayGraph.LOOP_START
+
+        operations = self.operations
+        total_operations = len(operations)
+        max_deltas = [0.0]
+        position = 0
+        while position < total_operations:
+            operation = operations[position]
+            kind = operation[0]
+
+            if kind == PRIOR:
+                _, m, v, slot = operation
+                old_precision = precision[v]
+                old_precision_mean = precision_mean[v]
+                new_precision = old_precision + prior_precisions[slot] - message_precision[m]
+                new_precision_mean = old_precision_mean + prior_precision_means[slot] - message_precision_mean[m]
+                message_precision[m] = prior_precisions[slot]
+                message_precision_mean[m] = prior_precision_means[slot]
+
+            elif kind == LIKELIHOOD:
+                _, m, v, other_m, other_v, factor_precision = operation
+                a = factor_precision / (factor_precision + precision[other_v] - message_precision[other_m])
+                new_message_precision_mean = a * (precision_mean[other_v] - message_precision_mean[other_m])
+                new_message_precision = a * (precision[other_v] - message_precision[other_m])
+                old_precision = precision[v]
+                old_precision_mean = precision_mean[v]
+                new_precision = old_precision - message_precision[m] + new_message_precision
+                new_precision_mean = old_precision_mean - message_precision_mean[m] + new_message_precision_mean
+                message_precision[m] = new_message_precision
+                message_precision_mean[m] = new_message_precision_mean
+
+            elif kind == WEIGHTED_SUM:
+                _, m, v, other_ms, other_vs, weights, weights_squared = operation
+                inverse_of_new_precision_sum = 0.0
+                weighted_mean_sum = 0.0
+                for other_m, other_v, weight, weight_squared in zip(other_ms, other_vs, weights, weights_squared):
+                    precision_difference = precision[other_v] - message_precision[other_m]
+                    inverse_of_new_precision_sum += weight_squared / precision_difference
+                    weighted_mean_sum += (weight *
+                                          (precision_mean[other_v] - message_precision_mean[other_m]) /
+                                          precision_difference)
+                new_message_precision = 1.0 / inverse_of_new_precision_sum
+                new_message_precision_mean = new_message_precision * weighted_mean_sum
+                old_precision = precision[v]
+                old_precision_mean = precision_mean[v]
+                new_precision = old_precision - message_precision[m] + new_message_precision
+                new_precision_mean = old_precision_mean - message_precision_mean[m] + new_message_precision_mean
+                message_precision[m] = new_message_precision
+                message_precision_mean[m] = new_message_precision_mean
+
+            elif kind == TRUNCATED:
+                _, m, v, epsilon, vw_function, _ = operation
+                old_precision = precision[v]
+                old_precision_mean = precision_mean[v]
+                c = old_precision - message_precision[m]
+                d = old_precision_mean - message_precision_mean[m]
+                sqrt_c = sqrt(c)
+                d_on_sqrt_c = d / sqrt_c
+                epsilon_times_sqrt_c = epsilon * sqrt_c
+                v_value, w_value = vw_function(d_on_sqrt_c, epsilon_times_sqrt_c)
+                denominator = 1.0 - w_value
+                new_precision = c / denominator
+                new_precision_mean = (d + sqrt_c * v_value) / denominator
+                message_precision[m] = message_precision[m] + new_precision - old_precision
+                message_precision_mean[m] = message_precision_mean[m] + new_precision_mean - old_precision_mean
+
+            elif kind == LOOP_START:
+                max_deltas.append(0.0)
+                position += 1
+                continue
+
+            else:
+                delta = max_deltas[-1]
+                if delta > operation[2]:
+                    max_deltas[-1] = 0.0
+                    position = operation[1] + 1
+                    continue
+                max_deltas.pop()
+                if delta > max_deltas[-1]:
+                    max_deltas[-1] = delta
+                position += 1
+                continue
+
+            precision[v] = new_precision
+            precision_mean[v] = new_precision_mean
+            delta = max(abs(new_precision_mean - old_precision_mean),
+                        sqrt(abs(new_precision - old_precision)))
+            if delta > max_deltas[-1]:
+                max_deltas[-1] = delta
+            position += 1
+
+        return precision, precision_mean
+
+    def run_batch(self, prior_precisions, prior_precision_means):
+        '''
+        Runs the schedule for many matches of the graph's shape in lockstep
+
+        The prior arrays have one row per prior and one column per match,
+        the returned marginal arrays one row per variable.  Every match
+        keeps its own loop convergence: a match whose loop delta is below the
+        loop's max_delta stops being updated while the others iterate.
+        The truncation functions are always evaluated exactly.
+        '''
+        total_matches = prior_precisions.shape[1]
+        precision = numpy.zeros((self.total_variables, total_matches))
+        precision_mean = numpy.zeros((self.total_variables, total_matches))
+        message_precision = numpy.zeros((self.total_messages, total_matches))
+        message_precision_mean = numpy.zeros((self.total_messages, total_matches))
+
+        PRIOR = TrueSkillArrayGraph.PRIOR
+        LIKELIHOOD = TrueSkillArrayGraph.LIKELIHOOD
+        WEIGHTED_SUM = TrueSkillArrayGraph.WEIGHTED_SUM
+        TRUNCATED = TrueSkillArrayGraph.TRUNCATED
+        LOOP_START = TrueSkillArrayGraph.LOOP_START
+
+        operations = self.operations
+        total_operations = len(operations)
+        max_deltas = [numpy.zeros(total_matches)]
+        # None while every match is being updated
+        active = None
+        active_stack = []
+        position = 0
+
+        with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            while position < total_operations:
+                operation = operations[position]
+                kind = operation[0]
+
+                if kind == PRIOR:
+                    _, m, v, slot = operation
+                    old_precision = precision[v]
+                    old_precision_mean = precision_mean[v]
+                    new_precision = old_precision + prior_precisions[slot] - message_precision[m]
+                    new_precision_mean = old_precision_mean + prior_precision_means[slot] - message_precision_mean[m]
+                    new_message_precision = prior_precisions[slot]
+                    new_message_precision_mean = prior_precision_means[slot]
+
+                elif kind == LIKELIHOOD:
+                    _, m, v, other_m, other_v, factor_precision = operation
+                    a = factor_precision / (factor_precision + precision[other_v] - message_precision[other_m])
+                    new_message_precision_mean = a * (precision_mean[other_v] - message_precision_mean[other_m])
+                    new_message_precision = a * (precision[other_v] - message_precision[other_m])
+                    old_precision = precision[v]
+                    old_precision_mean = precision_mean[v]
+                    new_precision = old_precision - message_precision[m] + new_message_precision
+                    new_precision_mean = old_precision_mean - message_precision_mean[m] + new_message_precision_mean
+
+                elif kind == WEIGHTED_SUM:
+                    _, m, v, other_ms, other_vs, weights, weights_squared = operation
+                    inverse_of_new_precision_sum = 0.0
+                    weighted_mean_sum = 0.0
+                    for other_m, other_v, weight, weight_squared in zip(other_ms, other_vs, weights, weights_squared):
+                        precision_difference = precision[other_v] - message_precision[other_m]
+                        inverse_of_new_precision_sum = inverse_of_new_precision_sum + weight_squared / precision_difference
+                        weighted_mean_sum = weighted_mean_sum + (weight *
+                                                                 (precision_mean[other_v] - message_precision_mean[other_m]) /
+                                                                 precision_difference)
+                    new_message_precision = 1.0 / inverse_of_new_precision_sum
+                    new_message_precision_mean = new_message_precision * weighted_mean_sum
+                    old_precision = precision[v]
+                    old_precision_mean = precision_mean[v]
+                    new_precision = old_precision - message_precision[m] + new_message_precision
+                    new_precision_mean = old_precision_mean - message_precision_mean[m] + new_message_precision_mean
+
+                elif kind == TRUNCATED:
+                    _, m, v, epsilon, _, vw_function = operation
+                    old_precision = precision[v]
+                    old_precision_mean = precision_mean[v]
+                    c = old_precision - message_precision[m]
+                    d = old_precision_mean - message_precision_mean[m]
+                    sqrt_c = numpy.sqrt(c)
+                    d_on_sqrt_c = d / sqrt_c
+                    epsilon_times_sqrt_c = epsilon * sqrt_c
+                    v_value, w_value = vw_function(d_on_sqrt_c, epsilon_times_sqrt_c)
+                    denominator = 1.0 - w_value
+                    new_precision = c / denominator
+                    new_precision_mean = (d + sqrt_c * v_value) / denominator
+                    new_message_precision = message_precision[m] + new_precision - old_precision
+                    new_message_precision_mean = message_precision_mean[m] + new_precision_mean - old_precision_mean
+
+                elif kind == LOOP_START:
+                    active_stack.append(active)
+                    max_deltas.append(numpy.zeros(total_matches))
+                    position += 1
+                    continue
+
+                else:
+                    delta = max_deltas[-1]
+                    repeat = delta > operation[2]
+                    if active is not None:
+                        repeat &= active
+                    if repeat.any():
+                        max_deltas[-1] = numpy.where(repeat, 0.0, delta)
+                        active = repeat
+                        position = operation[1] + 1
+                        continue
+                    max_deltas.pop()
+                    active = active_stack.pop()
+                    merged = numpy.maximum(max_deltas[-1], delta)
+                    max_deltas[-1] = merged if active is None else numpy.where(active, merged, max_deltas[-1])
+                    position += 1
+                    continue
+
+                delta = numpy.maximum(numpy.abs(new_precision_mean - old_precision_mean),
+                                      numpy.sqrt(numpy.abs(new_precision - old_precision)))
+                if active is None:
+                    max_deltas[-1] = numpy.maximum(max_deltas[-1], delta)
+                    message_precision[m] = new_message_precision
+                    message_precision_mean[m] = new_message_precision_mean
+                    precision[v] = new_precision
+                    precision_mean[v] = new_precision_mean
+                else:
+                    max_deltas[-1] = numpy.where(active, numpy.maximum(max_deltas[-1], delta), max_deltas[-1])
+                    message_precision[m] = numpy.where(active, new_message_precision, message_precision[m])
+                    message_precision_mean[m] = numpy.where(active, new_message_precision_mean, message_precision_mean[m])
+                    precision[v] = numpy.where(active, new_precision, old_precision)
+                    precision_mean[v] = numpy.where(active, new_precision_mean, old_precision_mean)
+                position += 1
+
+        return precision, precision_mean
+
+    def updated_ratings_batch(self, matches):
+        '''
+        Runs the graph for many sorted matches of the graph's shape at once
+        '''
+        priors = [self.priors(teams) for teams in matches]
+        prior_precisions = numpy.array([prior[0] for prior in priors]).T
+        prior_precision_means = numpy.array([prior[1] for prior in priors]).T
+        precision, precision_mean = self.run_batch(prior_precisions, prior_precision_means)
+        means = (precision_mean / precision).tolist()
+        stdevs = numpy.sqrt(1.0 / precision).tolist()
+
+        results = []
+        for column, teams in enumerate(matches):
+            match_results = Match()
+            for current_team, skill_variables in zip(teams, self.skill_variables):
+                team_results = Team()
+                for current_player, variable in zip(current_team.players(), skill_variables):
+                    team_results[current_player] = GaussianRating(means[variable][column],
+                                                                  stdevs[variable][column])
+                match_results.append(team_results)
+            results.append(match_results)
+
+        return results
+
+    def updated_ratings(self, teams):
+        '''
+        Runs the graph for a sorted match of the graph's shape and returns the new ratings
+        '''
+        precision, precision_mean = self.run(*self.priors(teams))
+
+        results = Match()
+        for current_team, skill_variables in zip(teams, self.skill_variables):
+            team_results = Team()
+            for current_player, variable in zip(current_team.players(), skill_variables):
+                team_results[current_player] = GaussianRating(precision_mean[variable] / precision[variable],
+                                                              sqrt(1.0 / precision[variable]))
+            results.append(team_results)
+
+        return results
@@ -1,6 +1,5 @@
 from __future__ import division
 from math import sqrt, log
-from copy import copy
 
 from skills.factorgraph import (
     Factor,
@@ -10,10 +9,8 @@ from skills.factorgraph import (
 from skills.numerics import Gaussian
 
 from skills.trueskill.truncated import (
-    v_exceeds_margin,
-    v_within_margin,
-    w_exceeds_margin,
-    w_within_margin,
+    vw_exceeds_margin,
+    vw_within_margin,
     )
 
 
@@ -40,16 +37,17 @@ class GaussianFactor(Factor):
             self,
             variable,
             Message(new_distribution,
-                    "message from %s to %s" % (self, variable))
+                    "message from %s to %s", self, variable)
                                                                          )
         return binding
 
 
 class GaussianGreaterThanFactor(GaussianFactor):
 
-    def __init__(self, epsilon, variable):
-        GaussianFactor.__init__(self, "%s > %.2f" % (variable, epsilon))
+    def __init__(self, epsilon, variable, vw_function=vw_exceeds_margin):
+        GaussianFactor.__init__(self, "%s > %.2f", variable, epsilon)
         self.epsilon = epsilon
+        self.vw_function = vw_function
         self.create_variable_to_message_binding(variable)
 
     def log_normalization(self):
@@ -62,31 +60,29 @@ class GaussianGreaterThanFactor(GaussianFactor):
                                                        / message_from_variable.stdev)))
 
     def update_message_variable(self, message, variable):
-        old_marginal = copy(variable.value)
-        old_message = copy(message.value)
-        message_from_var = old_marginal / old_message
+        marginal = variable.value
+        message_value = message.value
 
-        c = message_from_var.precision
-        d = message_from_var.precision_mean
+        # the message from the variable is marginal / message
+        c = marginal.precision - message_value.precision
+        d = marginal.precision_mean - message_value.precision_mean
 
         sqrt_c = sqrt(c)
         d_on_sqrt_c = d / sqrt_c
 
         epsilon_times_sqrt_c = self.epsilon * sqrt_c
-        d = message_from_var.precision_mean
 
-        denom = 1.0 - w_exceeds_margin(d_on_sqrt_c, epsilon_times_sqrt_c)
+        v, w = self.vw_function(d_on_sqrt_c, epsilon_times_sqrt_c)
+        denom = 1.0 - w
 
         new_precision = c / denom
-        new_precision_mean = (d + sqrt_c * v_exceeds_margin(d_on_sqrt_c, epsilon_times_sqrt_c)) / denom
-
-        new_marginal = Gaussian.from_precision_mean(new_precision_mean, new_precision)
-        new_message = (old_message * new_marginal) / old_marginal
+        new_precision_mean = (d + sqrt_c * v) / denom
 
-        message.value = new_message
-        variable.value = new_marginal
+        # new message is message * new marginal / marginal
+        message_value.precision_mean = message_value.precision_mean + new_precision_mean - marginal.precision_mean
+        message_value.precision = message_value.precision + new_precision - marginal.precision
 
-        return new_marginal - old_marginal
+        return marginal.update(new_precision_mean, new_precision)
 
 
 class GaussianLikelihoodFactor(GaussianFactor):
@@ -98,7 +94,7 @@ class GaussianLikelihoodFactor(GaussianFactor):
 
 
     def __init__(self, beta_squared, variable1, variable2):
-        GaussianFactor.__init__(self, "Likelihood of %s going to %s" % (variable2, variable1))
+        GaussianFactor.__init__(self, "Likelihood of %s going to %s", variable2, variable1)
         self.precision = 1.0 / beta_squared
         self.create_variable_to_message_binding(variable1)
         self.create_variable_to_message_binding(variable2)
@@ -110,26 +106,25 @@ class GaussianLikelihoodFactor(GaussianFactor):
         )
 
     def update_helper(self, message1, message2, variable1, variable2):
-        message1_value = copy(message1.value)
-        message2_value = copy(message2.value)
+        message1_value = message1.value
+        message2_value = message2.value
 
-        marginal1 = copy(variable1.value)
-        marginal2 = copy(variable2.value)
+        marginal1 = variable1.value
+        marginal2 = variable2.value
 
         a = self.precision / (self.precision + marginal2.precision - message2_value.precision)
 
-        new_message = Gaussian.from_precision_mean(
-            a * (marginal2.precision_mean - message2_value.precision_mean),
-            a * (marginal2.precision - message2_value.precision))
+        new_message_precision_mean = a * (marginal2.precision_mean - message2_value.precision_mean)
+        new_message_precision = a * (marginal2.precision - message2_value.precision)
 
-        old_marginal_without_message = marginal1 / message1_value
+        # new marginal is marginal / old message * new message
+        new_precision_mean = marginal1.precision_mean - message1_value.precision_mean + new_message_precision_mean
+        new_precision = marginal1.precision - message1_value.precision + new_message_precision
 
-        new_marginal = old_marginal_without_message * new_message
+        message1_value.precision_mean = new_message_precision_mean
+        message1_value.precision = new_message_precision
 
-        message1.value = new_message
-        variable1.value = new_marginal
-
-        return new_marginal - marginal1
+        return marginal1.update(new_precision_mean, new_precision)
 
     def update_message_index(self, message_index):
         if message_index not in (0, 1):
@@ -147,23 +142,27 @@ class GaussianPriorFactor(GaussianFactor):
 
 
     def __init__(self, mean, variance, variable):
-        GaussianFactor.__init__(self, "Prior value going to %s" % variable)
+        GaussianFactor.__init__(self, "Prior value going to %s", variable)
         self.new_message = Gaussian(mean, sqrt(variance))
         new_message = Message(Gaussian.from_precision_mean(0, 0),
-                              "message from %s to %s" % (self, variable))
+                              "message from %s to %s", self, variable)
         self.create_variable_to_message_binding_with_message(variable, new_message)
 
-    def update_message_variable(self, message, variable):
-        old_marginal = copy(variable.value)
-        old_message = message
-        new_marginal = Gaussian.from_precision_mean(
-            old_marginal.precision_mean + self.new_message.precision_mean - old_message.value.precision_mean,
-            old_marginal.precision + self.new_message.precision - old_message.value.precision)
+    def reset_prior(self, mean, variance):
+        self.new_message = Gaussian(mean, sqrt(variance))
 
-        variable.value = new_marginal
+    def update_message_variable(self, message, variable):
+        marginal = variable.value
+        message_value = message.value
         new_message = self.new_message
-        message.value = new_message
-        return old_marginal - new_marginal
+
+        new_precision_mean = marginal.precision_mean + new_message.precision_mean - message_value.precision_mean
+        new_precision = marginal.precision + new_message.precision - message_value.precision
+
+        message_value.precision_mean = new_message.precision_mean
+        message_value.precision = new_message.precision
+
+        return marginal.update(new_precision_mean, new_precision)
 
 
 class GaussianWeightedSumFactor(GaussianFactor):
@@ -172,9 +171,10 @@ class GaussianWeightedSumFactor(GaussianFactor):
     '''
 
     def __init__(self, sum_variable, variables_to_sum, variable_weights=None):
-        GaussianFactor.__init__(self, self.create_name(sum_variable, variables_to_sum, variable_weights))
+        GaussianFactor.__init__(self, self.create_name, sum_variable, variables_to_sum, variable_weights)
         self.weights = []
         self.weights_squared = []
+        self.updated_bindings = {}
 
         # the first weights are a straightforward copy
         self.weights.append(variable_weights[:])
@@ -233,59 +233,53 @@ class GaussianWeightedSumFactor(GaussianFactor):
         return result
 
     def update_helper(self, weights, weights_squared, messages, variables):
-        message0 = copy(messages[0].value)
-        marginal0 = copy(variables[0].value)
+        message0 = messages[0].value
+        marginal0 = variables[0].value
 
         inverse_of_new_precision_sum = 0.0
-        another_inverse_of_new_precision_sum = 0.0
         weighted_mean_sum = 0.0
-        another_weighted_mean_sum = 0.0
 
         for i in range(len(weights_squared)):
-            inverse_of_new_precision_sum += weights_squared[i] / (variables[i + 1].value.precision - messages[i + 1].value.precision)
-
-            diff = variables[i + 1].value / messages[i + 1].value
-            another_inverse_of_new_precision_sum += weights_squared[i] / diff.precision
+            marginal = variables[i + 1].value
+            message = messages[i + 1].value
+            precision_difference = marginal.precision - message.precision
+            inverse_of_new_precision_sum += weights_squared[i] / precision_difference
 
             weighted_mean_sum += (weights[i] *
-                                  (variables[i + 1].value.precision_mean - messages[i + 1].value.precision_mean) /
-                                  (variables[i + 1].value.precision - messages[i + 1].value.precision))
-            another_weighted_mean_sum += weights[i] * diff.precision_mean / diff.precision
+                                  (marginal.precision_mean - message.precision_mean) /
+                                  precision_difference)
 
         new_precision = 1.0 / inverse_of_new_precision_sum
-        #another_new_precision = 1.0 / another_inverse_of_new_precision_sum
-
         new_precision_mean = new_precision * weighted_mean_sum
-        #another_new_precision_mean = another_new_precision * another_weighted_mean_sum
 
-        new_message = Gaussian.from_precision_mean(new_precision_mean, new_precision)
-        old_marginal_without_message = marginal0 / message0
+        # new marginal is marginal / old message * new message
+        new_marginal_precision_mean = marginal0.precision_mean - message0.precision_mean + new_precision_mean
+        new_marginal_precision = marginal0.precision - message0.precision + new_precision
 
-        new_marginal = old_marginal_without_message * new_message
+        message0.precision_mean = new_precision_mean
+        message0.precision = new_precision
 
-        messages[0].value = new_message
-        variables[0].value = new_marginal
-
-        final_diff = new_marginal - marginal0
-        return final_diff
+        return marginal0.update(new_marginal_precision_mean, new_marginal_precision)
 
     def update_message_index(self, message_index):
         try:
-            updated_messages = []
-            updated_variables = []
-
             indexes_to_use = self.variable_index_orders_for_weights[message_index]
-            for i in range(len(self.messages)):
-                updated_messages.append(self.messages[indexes_to_use[i]])
-                updated_variables.append(self.variables[indexes_to_use[i]])
-
-            return self.update_helper(self.weights[message_index],
-                                      self.weights_squared[message_index],
-                                      updated_messages,
-                                      updated_variables)
         except IndexError:
             raise GaussianWeightedSumFactorError("message index is not in valid range")
 
+        # the reordered messages and variables are built once per message index
+        try:
+            updated_messages, updated_variables = self.updated_bindings[message_index]
+        except KeyError:
+            updated_messages = [self.messages[index] for index in indexes_to_use]
+            updated_variables = [self.variables[index] for index in indexes_to_use]
+            self.updated_bindings[message_index] = updated_messages, updated_variables
+
+        return self.update_helper(self.weights[message_index],
+                                  self.weights_squared[message_index],
+                                  updated_messages,
+                                  updated_variables)
+
     def create_name(self, sum_variable, variables_to_sum, weights):
         result = str(sum_variable)
         result += " = "
@@ -320,9 +314,10 @@ class GaussianWithinFactor(GaussianFactor):
     Factor representing a team difference that has not exceeded the draw margin
     '''
 
-    def __init__(self, epsilon, variable):
-        GaussianFactor.__init__(self, "%s <= %.2f" % (variable, epsilon))
+    def __init__(self, epsilon, variable, vw_function=vw_within_margin):
+        GaussianFactor.__init__(self, "%s <= %.2f", variable, epsilon)
         self.epsilon = epsilon
+        self.vw_function = vw_function
         self.create_variable_to_message_binding(variable)
 
     def log_normalization(self):
@@ -337,27 +332,25 @@ class GaussianWithinFactor(GaussianFactor):
         return -Gaussian.log_product_normalization(message_from_variable, message) + log(z)
 
     def update_message_variable(self, message, variable):
-        old_marginal = copy(variable.value)
-        old_message = copy(message.value)
-        message_from_variable = old_marginal / old_message
+        marginal = variable.value
+        message_value = message.value
 
-        c = message_from_variable.precision
-        d = message_from_variable.precision_mean
+        # the message from the variable is marginal / message
+        c = marginal.precision - message_value.precision
+        d = marginal.precision_mean - message_value.precision_mean
 
         sqrt_c = sqrt(c)
         d_on_sqrt_c = d / sqrt_c
 
         epsilon_times_sqrt_c = self.epsilon * sqrt_c
-        d = message_from_variable.precision_mean
 
-        denominator = 1.0 - w_within_margin(d_on_sqrt_c, epsilon_times_sqrt_c)
+        v, w = self.vw_function(d_on_sqrt_c, epsilon_times_sqrt_c)
+        denominator = 1.0 - w
         new_precision = c / denominator
-        new_precision_mean = (d + sqrt_c * v_within_margin(d_on_sqrt_c, epsilon_times_sqrt_c)) / denominator
-
-        new_marginal = Gaussian.from_precision_mean(new_precision_mean, new_precision)
-        new_message = (old_message * new_marginal) / old_marginal
+        new_precision_mean = (d + sqrt_c * v) / denominator
 
-        message.value = new_message
-        variable.value = new_marginal
+        # new message is message * new marginal / marginal
+        message_value.precision_mean = message_value.precision_mean + new_precision_mean - marginal.precision_mean
+        message_value.precision = message_value.precision + new_precision - marginal.precision
 
-        return new_marginal - old_marginal
+        return marginal.update(new_precision_mean, new_precision)
@@ -0,0 +1,275 @@
+'''
+TrueSkill Through Time, ratings smoothed over a whole match history
+
+Every player has a skill variable for each rating period they play in,
+chained to their previous period by the dynamics factor, so results of
+later matches flow back to earlier ratings instead of only forward as in
+the online calculators.
+'''
+
+from __future__ import division
+from collections import OrderedDict
+from math import sqrt
+
+from skills import GaussianRating, Match
+from skills.factorgraph import FactorGraph, VariableFactory
+from skills.numerics import Gaussian
+from skills.trueskill import FactorGraphTrueSkillCalculator, TrueSkillGameInfo
+from skills.trueskill.factors import GaussianLikelihoodFactor, GaussianPriorFactor
+
+
+class HistoryError(Exception):
+    pass
+
+
+class HistoryGraph(FactorGraph):
+    '''
+    Factor graph of the matches of consecutive rating periods
+
+    A player's skill in a period is a variable with a GaussianPriorFactor
+    from their prior in the first period they play in and a
+    GaussianLikelihoodFactor from their previous period in the later ones,
+    adding dynamics_factor^2 of variance for every period in between.  A
+    match sends a message to the skills of its players through its own
+    GaussianPriorFactor, the match's posterior divided by the player's
+    cavity, the skill without the match's message.  The posteriors come from
+    a TrueSkill calculator with the cavities as ratings and no dynamics.
+
+    run passes messages forward and backward through the periods, rating
+    every match again on the way, until no marginal moves more than
+    max_delta.
+    '''
+
+    def __init__(self, periods, priors, calculator, game_info):
+        FactorGraph.__init__(self)
+        self.variable_factory = VariableFactory(lambda: Gaussian.from_precision_mean(0.0, 0.0))
+        self.calculator = calculator
+        self.game_info = game_info
+        self.match_game_info = TrueSkillGameInfo(game_info.initial_mean, game_info.initial_stdev,
+                                                 game_info.beta, 0.0, game_info.draw_probability,
+                                                 game_info.conservative_stdev_multiplier)
+        dynamics_factor_squared = game_info.dynamics_factor ** 2.0
+
+        self.rating_periods = []
+        # per period, player_id: skill variable
+        self.skills = []
+        # per period, player_id: factor sending to the skill, 0 being its message to the skill
+        self.incoming = []
+        # per period, player_id: factor to the player's next period, 1 being its message to the skill
+        self.outgoing = []
+        # per period, (record, [GaussianPriorFactor of every player in team order])
+        self.matches = []
+        last = {}
+
+        for index, (rating_period, records) in enumerate(periods):
+            skills = OrderedDict()
+            incoming = OrderedDict()
+            matches = []
+            for record in records:
+                factors = []
+                for team in record.teams:
+                    for player_id, partial_play in team:
+                        skill = skills.get(player_id)
+                        if skill is None:
+                            skill = skills[player_id] = self.variable_factory.create_basic_variable(
+                                "%s's skill in %s", player_id, rating_period)
+                            previous = last.get(player_id)
+                            if previous is None:
+                                mean, variance, prior_period = priors(player_id)
+                                if prior_period is not None:
+                                    variance += (rating_period - prior_period) * dynamics_factor_squared
+                                incoming[player_id] = GaussianPriorFactor(mean, variance, skill)
+                            else:
+                                previous_index, previous_skill = previous
+                                elapsed = rating_period - self.rating_periods[previous_index]
+                                factor = GaussianLikelihoodFactor(elapsed * dynamics_factor_squared,
+                                                                  skill, previous_skill)
+                                incoming[player_id] = factor
+                                self.outgoing[previous_index][player_id] = factor
+                            last[player_id] = (index, skill)
+                        factors.append(GaussianPriorFactor(0.0, 1.0, skill))
+                matches.append((record, factors))
+            self.rating_periods.append(rating_period)
+            self.skills.append(skills)
+            self.incoming.append(incoming)
+            self.outgoing.append(OrderedDict())
+            self.matches.append(matches)
+
+        # no match has said anything yet
+        for matches in self.matches:
+            for record, factors in matches:
+                for factor in factors:
+                    factor.new_message = Gaussian.from_precision_mean(0.0, 0.0)
+
+    def run(self, max_delta, max_iterations):
+        '''
+        Passes messages until they converge, returns the number of iterations
+        '''
+        total_periods = len(self.skills)
+        for iteration in range(1, max_iterations + 1):
+            delta = 0.0
+            for index in range(total_periods):
+                for factor in self.incoming[index].values():
+                    delta = max(delta, factor.update_message_index(0))
+                delta = max(delta, self.rate_matches(index))
+            for index in reversed(range(total_periods)):
+                for factor in self.outgoing[index].values():
+                    delta = max(delta, factor.update_message_index(1))
+                delta = max(delta, self.rate_matches(index))
+            if delta <= max_delta:
+                break
+        return iteration
+
+    def rate_matches(self, index):
+        delta = 0.0
+        for record, factors in self.matches[index]:
+            cavities = [factor.variables[0].value / factor.messages[0].value for factor in factors]
+            player_ids = [player_id for team in record.teams for player_id, partial_play in team]
+            team_offsets = [0]
+            for team in record.teams:
+                team_offsets.append(team_offsets[-1] + len(team))
+            match = Match.from_arrays(player_ids,
+                                      [cavity.mean for cavity in cavities],
+                                      [cavity.stdev for cavity in cavities],
+                                      team_offsets, list(record.rank),
+                                      [partial_play for team in record.teams for player_id, partial_play in team])
+            posteriors = self.calculator.new_ratings(match, self.match_game_info)
+            for player_id, cavity, factor in zip(player_ids, cavities, factors):
+                posterior = posteriors.rating_by_id(player_id)
+                message = Gaussian(posterior.mean, posterior.stdev) / cavity
+                if message.precision <= 0.0:
+                    message = Gaussian.from_precision_mean(0.0, 0.0)
+                factor.new_message = message
+                delta = max(delta, factor.update_message_index(0))
+        return delta
+
+    def ratings(self, index):
+        '''
+        Returns the smoothed ratings of the players of period index
+        '''
+        return [(player_id, GaussianRating(skill.value.mean, skill.value.stdev))
+                for player_id, skill in self.skills[index].items()]
+
+    def filtered(self, index, player_id):
+        '''
+        Returns a player's skill in period index without the message from
+        their next period
+        '''
+        skill = self.skills[index][player_id].value
+        factor = self.outgoing[index].get(player_id)
+        if factor is None:
+            return skill
+        return skill / factor.messages[1].value
+
+
+class TrueSkillThroughTime(object):
+    '''
+    Smooths the ratings of a whole match history
+
+    The history is a sequence of MatchRecords (see skills.replay) in rating
+    period order, records without a rating period each being a period of
+    their own.  Players start with the game_info's default rating.
+
+    The history is read window periods at a time, plus overlap periods that
+    are smoothed with them but not returned, so the graph of only
+    window + overlap periods is in memory however long the history is.
+    Later windows start from every player's rating at the end of the
+    returned periods, so results after the overlap do not reach back into
+    earlier windows.  The overlap should cover the periods over which later
+    matches still move a rating, the smaller the dynamics_factor the more.
+    A window covering the whole history gives the exact TrueSkill Through
+    Time ratings.
+
+    The calculator rates single matches, the factor graph calculator by
+    default, any TrueSkill calculator supporting the match shapes will do.
+    '''
+
+    DEFAULT_WINDOW = 10000
+    DEFAULT_OVERLAP = 1000
+    DEFAULT_MAX_DELTA = 1e-3
+    DEFAULT_MAX_ITERATIONS = 30
+
+    def __init__(self, game_info=None, calculator=None, window=DEFAULT_WINDOW, overlap=DEFAULT_OVERLAP,
+                 max_delta=DEFAULT_MAX_DELTA, max_iterations=DEFAULT_MAX_ITERATIONS):
+        if window < 1 or overlap < 0:
+            raise ValueError("window must be at least 1 and overlap at least 0 rating periods")
+        self.game_info = TrueSkillGameInfo.ensure_game_info(game_info)
+        if self.game_info.dynamics_factor <= 0.0:
+            raise ValueError("skills only change between rating periods with a positive dynamics_factor")
+        self.calculator = calculator if calculator is not None else FactorGraphTrueSkillCalculator()
+        self.window = window
+        self.overlap = overlap
+        self.max_delta = max_delta
+        self.max_iterations = max_iterations
+        # player_id: (mean, variance, rating period) at the end of the returned periods
+        self.state = {}
+        self.iterations = []
+
+    def prior(self, player_id):
+        state = self.state.get(player_id)
+        if state is None:
+            return self.game_info.initial_mean, self.game_info.initial_stdev ** 2.0, None
+        return state
+
+    def periods(self, records):
+        '''
+        Groups the records into (rating_period, records) of each period
+        '''
+        rating_period = None
+        records_of_period = []
+        for record in records:
+            if record.rating_period is None:
+                next_period = 0 if rating_period is None else rating_period + 1
+            else:
+                next_period = record.rating_period
+                if rating_period is not None and next_period < rating_period:
+                    raise HistoryError("rating period %s comes after %s" % (next_period, rating_period))
+            if records_of_period and next_period != rating_period:
+                yield rating_period, records_of_period
+                records_of_period = []
+            rating_period = next_period
+            records_of_period.append(record)
+        if records_of_period:
+            yield rating_period, records_of_period
+
+    def smooth(self, records):
+        '''
+        Yields (rating_period, player_id, GaussianRating) for every player of
+        every period, in period order
+        '''
+        buffered = []
+        for period in self.periods(records):
+            buffered.append(period)
+            if len(buffered) == self.window + self.overlap:
+                for rating in self.smooth_window(buffered, self.window):
+                    yield rating
+                del buffered[:self.window]
+        while buffered:
+            for rating in self.smooth_window(buffered, min(self.window, len(buffered))):
+                yield rating
+            del buffered[:self.window]
+
+    def smooth_window(self, periods, total_returned):
+        graph = HistoryGraph(periods, self.prior, self.calculator, self.game_info)
+        self.iterations.append(graph.run(self.max_delta, self.max_iterations))
+        for index in range(total_returned):
+            rating_period = graph.rating_periods[index]
+            for player_id, rating in graph.ratings(index):
+                skill = graph.filtered(index, player_id)
+                self.state[player_id] = (skill.mean, skill.variance, rating_period)
+                yield rating_period, player_id, rating
+
+    def run(self, records):
+        '''
+        Smooths the history, returns every player's rating at the end of it
+        '''
+        for rating in self.smooth(records):
+            pass
+        return self.ratings()
+
+    def ratings(self):
+        '''
+        Returns every player's rating at the end of the periods smoothed so far
+        '''
+        return dict((player_id, GaussianRating(mean, sqrt(variance)))
+                    for player_id, (mean, variance, rating_period) in self.state.items())
@@ -13,6 +13,11 @@ from skills.trueskill.factors import (
     GaussianWithinFactor,
     )
 
+from skills.trueskill.truncated import (
+    vw_exceeds_margin,
+    vw_within_margin,
+    )
+
 
 class IteratedTeamDifferencesInnerLayerError(Exception):
     pass
@@ -65,8 +70,8 @@ class IteratedTeamDifferencesInnerLayer(TrueSkillFactorGraphLayer):
                 "team_performance_to_performance_difference_factors[0] @ 1",
                 first_differences_factor, 1),
              ScheduleStep(
-                "team_performance_to_performance_difference_factors[team_team_differences = %d - 1] @ 2" % total_team_differences,
-                last_differences_factor, 2)
+                "team_performance_to_performance_difference_factors[team_team_differences = %d - 1] @ 2",
+                last_differences_factor, 2, total_team_differences)
              ])
 
         return inner_schedule
@@ -97,18 +102,18 @@ class IteratedTeamDifferencesInnerLayer(TrueSkillFactorGraphLayer):
 
             current_forward_schedule_piece = self.schedule_sequence([
                 ScheduleStep(
-                    "team perf to perf diff %d" % i,
-                    current_team_perf_to_team_perf_diff, 0
+                    "team perf to perf diff %d",
+                    current_team_perf_to_team_perf_diff, 0, i
                 ),
                 ScheduleStep(
-                    "greater than or within result factor %d" % i,
-                    current_team_diff_comparison, 0
+                    "greater than or within result factor %d",
+                    current_team_diff_comparison, 0, i
                 ),
                 ScheduleStep(
-                    "team perf to perf diff factors [%d], 2" % i,
-                    current_team_perf_to_team_perf_diff, 2
+                    "team perf to perf diff factors [%d], 2",
+                    current_team_perf_to_team_perf_diff, 2, i
                 )
-            ], "current forward schedule piece %d" % i)
+            ], "current forward schedule piece %d", i)
 
             forward_schedule_list.append(current_forward_schedule_piece)
 
@@ -124,16 +129,16 @@ class IteratedTeamDifferencesInnerLayer(TrueSkillFactorGraphLayer):
                 "current backward schedule piece",
                 [
                  ScheduleStep(
-                    "team_performance_to_performance_difference_factors[total_team_differences - 1 - %d] @ 0" % i,
-                    differences_factor, 0
+                    "team_performance_to_performance_difference_factors[total_team_differences - 1 - %d] @ 0",
+                    differences_factor, 0, i
                 ),
                  ScheduleStep(
-                    "greater_than_or_within_result_factors[total_team_differences - 1 - %d] @ 0" % i,
-                    comparison_factor, 0
+                    "greater_than_or_within_result_factors[total_team_differences - 1 - %d] @ 0",
+                    comparison_factor, 0, i
                 ),
                  ScheduleStep(
-                    "team_performance_to_performance_difference_factors[total_team_differences - 1 - %d] @ 1" % i,
-                    performances_to_differences_factor, 1
+                    "team_performance_to_performance_difference_factors[total_team_differences - 1 - %d] @ 1",
+                    performances_to_differences_factor, 1, i
                 )
                 ]
             )
@@ -143,9 +148,9 @@ class IteratedTeamDifferencesInnerLayer(TrueSkillFactorGraphLayer):
 
         forward_backward_schedule_to_loop = ScheduleSequence("forward backward schedule to loop", [forward_schedule, backward_schedule])
         initial_max_delta = 0.0001
-        loop = ScheduleLoop("loop with max delta of %f" % initial_max_delta,
+        loop = ScheduleLoop("loop with max delta of %f",
                             forward_backward_schedule_to_loop,
-                            initial_max_delta)
+                            initial_max_delta, initial_max_delta)
 
         return loop
 
@@ -182,17 +187,20 @@ class PlayerPerformancesToTeamPerformancesLayer(TrueSkillFactorGraphLayer):
         all_factors = []
         for current_factor in self.local_factors():
             for current_iteration in range(1, len(current_factor.messages)):
-                all_factors.append(ScheduleStep("team sum perf @ %s" % current_iteration,
-                                                current_factor, current_iteration))
+                all_factors.append(ScheduleStep("team sum perf @ %s",
+                                                current_factor, current_iteration, current_iteration))
         return self.schedule_sequence(all_factors, "all of the team's sum iteractions")
 
     def create_output_variable(self, team):
-        member_names = [str(player.key) for player in team]
-        team_member_names = ", ".join(member_names)
         output_variable = self.parent_factor_graph.variable_factory.create_basic_variable(
-            "Team[%s]'s performance" % team_member_names)
+            self.create_output_variable_name, team)
         return output_variable
 
+    def create_output_variable_name(self, team):
+        member_names = [str(player.key) for player in team]
+        team_member_names = ", ".join(member_names)
+        return "Team[%s]'s performance" % team_member_names
+
 
 class PlayerPriorValuesToSkillsLayer(TrueSkillFactorGraphLayer):
 
@@ -223,7 +231,7 @@ class PlayerPriorValuesToSkillsLayer(TrueSkillFactorGraphLayer):
                                    skills_variable)
 
     def create_skill_output_variable(self, key):
-        return self.parent_factor_graph.variable_factory.create_keyed_variable(key, "%s's skill" % key)
+        return self.parent_factor_graph.variable_factory.create_keyed_variable(key, "%s's skill", key)
 
 
 class PlayerSkillsToPerformancesLayer(TrueSkillFactorGraphLayer):
@@ -247,7 +255,7 @@ class PlayerSkillsToPerformancesLayer(TrueSkillFactorGraphLayer):
                                         player_performance, player_skill)
 
     def create_output_variable(self, key):
-        return self.parent_factor_graph.variable_factory.create_keyed_variable(key, "%s's performance" % key)
+        return self.parent_factor_graph.variable_factory.create_keyed_variable(key, "%s's performance", key)
 
     def create_prior_schedule(self):
         return self.schedule_sequence(map(lambda likelihood: ScheduleStep("Skill to Perf step", likelihood, 0),
@@ -272,7 +280,13 @@ class TeamDifferencesComparisonLayer(TrueSkillFactorGraphLayer):
         for i in range(len(self.input_variables_groups)):
             is_draw = self.team_ranks[i] == self.team_ranks[i + 1]
             team_difference = self.input_variables_groups[i][0]
-            factor = GaussianWithinFactor(self.epsilon, team_difference) if is_draw else GaussianGreaterThanFactor(self.epsilon, team_difference)
+            truncation_table = self.parent_factor_graph.truncation_table
+            if is_draw:
+                vw_function = vw_within_margin if truncation_table is None else truncation_table.vw_within_margin
+                factor = GaussianWithinFactor(self.epsilon, team_difference, vw_function)
+            else:
+                vw_function = vw_exceeds_margin if truncation_table is None else truncation_table.vw_exceeds_margin
+                factor = GaussianGreaterThanFactor(self.epsilon, team_difference, vw_function)
             self.add_layer_factor(factor)
 
 
@@ -3,7 +3,9 @@ Truncated gaussian correction functions
 from the bottom of page 4 of the TrueSkill paper
 '''
 
-from skills.numerics import Gaussian
+from skills.numerics import Gaussian, numpy
+
+MIN_DENOMINATOR = 2.222758749e-162
 
 def v_exceeds_margin_scaled(team_performance_difference, draw_margin, c):
     return v_exceeds_margin(team_performance_difference / c, draw_margin / c)
@@ -67,3 +69,134 @@ def w_within_margin(team_performance_difference, draw_margin):
                 (-draw_margin - team_performance_difference_abs) *
                 Gaussian.at(-draw_margin - team_performance_difference_abs)) / denominator)
 
+def vw_exceeds_margin_scaled(team_performance_difference, draw_margin, c):
+    return vw_exceeds_margin(team_performance_difference / c, draw_margin / c)
+
+def vw_exceeds_margin(team_performance_difference, draw_margin):
+    x = team_performance_difference - draw_margin
+    denominator = Gaussian.cumulative_to(x)
+    if denominator < MIN_DENOMINATOR:
+        if team_performance_difference < 0.0:
+            return -x, 1.0
+        return -x, 0.0
+    v = Gaussian.at(x) / denominator
+    return v, v * (v + team_performance_difference - draw_margin)
+
+def vw_within_margin_scaled(team_performance_difference, draw_margin, c):
+    return vw_within_margin(team_performance_difference / c, draw_margin / c)
+
+def vw_within_margin(team_performance_difference, draw_margin):
+    team_performance_difference_abs = abs(team_performance_difference)
+    upper = draw_margin - team_performance_difference_abs
+    lower = -draw_margin - team_performance_difference_abs
+    denominator = Gaussian.cumulative_to(upper) - Gaussian.cumulative_to(lower)
+
+    if denominator < MIN_DENOMINATOR:
+        if team_performance_difference < 0.0:
+            return -team_performance_difference - draw_margin, 1.0
+        return -team_performance_difference + draw_margin, 1.0
+
+    at_upper = Gaussian.at(upper)
+    at_lower = Gaussian.at(lower)
+    vt = (at_lower - at_upper) / denominator
+    w = vt ** 2 + (upper * at_upper - lower * at_lower) / denominator
+
+    if team_performance_difference < 0.0:
+        return -vt, w
+    return vt, w
+
+
+class TruncatedTable(object):
+    '''
+    Interpolation table for the fused v and w functions
+
+    In the exceeds margin case v and w only depend on x = difference -
+    margin.  They are tabulated at every step between minimum and maximum
+    and interpolated with cubic Hermite polynomials using the exact
+    derivatives dv/dx = -w and dw/dx = v (1 - w) - w (v + x).  Outside the
+    table, and for the within margin case which depends on both arguments,
+    the exact functions are used.
+
+    max_error is the largest difference to the exact v and w measured
+    between the nodes when the table is built, about 1e-8 for the defaults.
+    '''
+
+    def __init__(self, minimum=-8.0, maximum=8.0, step=0.0625):
+        if not minimum < maximum or step <= 0.0:
+            raise ValueError("table needs minimum < maximum and a positive step")
+        self.minimum = minimum
+        self.step = step
+        self.intervals = int(round((maximum - minimum) / step))
+        self.maximum = minimum + self.intervals * step
+
+        nodes = []
+        for i in range(self.intervals + 1):
+            x = minimum + i * step
+            v, w = vw_exceeds_margin(x, 0.0)
+            nodes.append((v, w, -w * step, (v * (1.0 - w) - w * (v + x)) * step))
+
+        # polynomial coefficients of v and w in the position s within an interval
+        self.coefficients = []
+        for (v0, w0, dv0, dw0), (v1, w1, dv1, dw1) in zip(nodes, nodes[1:]):
+            self.coefficients.append((v0, dv0, 3.0 * (v1 - v0) - 2.0 * dv0 - dv1, 2.0 * (v0 - v1) + dv0 + dv1,
+                                      w0, dw0, 3.0 * (w1 - w0) - 2.0 * dw0 - dw1, 2.0 * (w0 - w1) + dw0 + dw1))
+
+        self.max_error = 0.0
+        for i in range(self.intervals):
+            for fraction in (0.25, 0.5, 0.75):
+                x = minimum + (i + fraction) * step
+                v, w = vw_exceeds_margin(x, 0.0)
+                table_v, table_w = self.vw_exceeds_margin(x, 0.0)
+                self.max_error = max(self.max_error, abs(v - table_v), abs(w - table_w))
+
+    def vw_exceeds_margin_scaled(self, team_performance_difference, draw_margin, c):
+        return self.vw_exceeds_margin(team_performance_difference / c, draw_margin / c)
+
+    def vw_exceeds_margin(self, team_performance_difference, draw_margin):
+        position = (team_performance_difference - draw_margin - self.minimum) / self.step
+        if not 0.0 <= position < self.intervals:
+            return vw_exceeds_margin(team_performance_difference, draw_margin)
+
+        interval = int(position)
+        s = position - interval
+        va, vb, vc, vd, wa, wb, wc, wd = self.coefficients[interval]
+        return (va + s * (vb + s * (vc + s * vd)),
+                wa + s * (wb + s * (wc + s * wd)))
+
+    def vw_within_margin_scaled(self, team_performance_difference, draw_margin, c):
+        return vw_within_margin(team_performance_difference / c, draw_margin / c)
+
+    def vw_within_margin(self, team_performance_difference, draw_margin):
+        return vw_within_margin(team_performance_difference, draw_margin)
+
+
+def vw_exceeds_margin_array(team_performance_difference, draw_margin):
+    x = team_performance_difference - draw_margin
+    denominator = Gaussian.cumulative_to_array(x)
+    small = denominator < MIN_DENOMINATOR
+    v = numpy.where(small, -x, Gaussian.at_array(x) / numpy.where(small, 1.0, denominator))
+    w = numpy.where(small,
+                    numpy.where(team_performance_difference < 0.0, 1.0, 0.0),
+                    v * (v + team_performance_difference - draw_margin))
+    return v, w
+
+def vw_within_margin_array(team_performance_difference, draw_margin):
+    team_performance_difference_abs = numpy.abs(team_performance_difference)
+    upper = draw_margin - team_performance_difference_abs
+    lower = -draw_margin - team_performance_difference_abs
+    denominator = Gaussian.cumulative_to_array(upper) - Gaussian.cumulative_to_array(lower)
+    small = denominator < MIN_DENOMINATOR
+    denominator = numpy.where(small, 1.0, denominator)
+
+    at_upper = Gaussian.at_array(upper)
+    at_lower = Gaussian.at_array(lower)
+    vt = (at_lower - at_upper) / denominator
+    negative = team_performance_difference < 0.0
+
+    v = numpy.where(small,
+                    numpy.where(negative,
+                                -team_performance_difference - draw_margin,
+                                -team_performance_difference + draw_margin),
+                    numpy.where(negative, -vt, vt))
+    w = numpy.where(small, 1.0, vt ** 2 + (upper * at_upper - lower * at_lower) / denominator)
+    return v, w